@@ -0,0 +1,138 @@
+"""
+Cross-request dynamic micro-batching.
+
+Concurrent requests submit preprocessed frames to a MicroBatcher; a single
+background thread collects them for up to max_batch_size frames or
+max_wait_ms, runs one batched inference and hands each result back to the
+request that submitted it.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """Queues frames from many callers and runs them through predict_batch together.
+
+    predict_batch(frames) must return one result per frame, in order; a
+    frame it returns no result for fails with RuntimeError. predict() waits
+    at most timeout seconds. The worker thread is started on first use, so a batcher created before a
+    fork (e.g. in a preloading Gunicorn master) is safe to use in the child.
+    """
+
+    def __init__(self, predict_batch, max_batch_size=8, max_wait_ms=5.0, latency_window=1024, timeout=60.0):
+        self.predict_batch = predict_batch
+        self.timeout = timeout
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+
+        # stats
+        self._batch_sizes = {}
+        self._batches = 0
+        self._frames = 0
+        self._queue_latencies = deque(maxlen=latency_window)
+        self._queue_latency_max = 0.0
+
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, frame):
+        """Queue a frame and return a Future resolving to its result"""
+        future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._queue.append((frame, future, time.perf_counter()))
+            self._cond.notify()
+        return future
+
+    def predict(self, frame, timeout=None):
+        """Blocking helper: submit a frame and wait for its result.
+
+        Raises TimeoutError after timeout seconds (default: the batcher's);
+        a frame still queued by then is dropped from its batch.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        future = self.submit(frame)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            future.cancel()
+            raise TimeoutError(f'No micro-batch result within {timeout:g}s') from None
+
+    def _collect(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0][2] + self.max_wait
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            n = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(n)]
+
+    def _run(self):
+        while True:
+            # skip frames whose caller gave up waiting before they ran
+            batch = [item for item in self._collect() if item[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            frames = [item[0] for item in batch]
+            futures = [item[1] for item in batch]
+            with self._cond:
+                self._batches += 1
+                self._frames += len(batch)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+                for _, _, queued in batch:
+                    waited = started - queued
+                    self._queue_latencies.append(waited)
+                    self._queue_latency_max = max(self._queue_latency_max, waited)
+            try:
+                results = list(self.predict_batch(frames))
+                error = None
+                if len(results) < len(frames):
+                    error = RuntimeError(f'predict_batch returned {len(results)} results for {len(frames)} frames')
+            except Exception as e:
+                results, error = [], e
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            for future in futures[len(results):]:
+                future.set_exception(error)
+
+    def stats(self):
+        """Queue depth, achieved batch sizes and queueing latency (ms)"""
+        with self._cond:
+            latencies = np.asarray(self._queue_latencies, dtype=np.float64) * 1000.0
+            histogram = dict(sorted(self._batch_sizes.items()))
+            stats = {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': len(self._queue),
+                'batches': self._batches,
+                'frames': self._frames,
+                'mean_batch_size': (self._frames / self._batches) if self._batches else 0.0,
+                'batch_size_histogram': {str(k): v for k, v in histogram.items()},
+                'queue_latency_ms': {
+                    'window': int(latencies.size),
+                    'mean': float(latencies.mean()) if latencies.size else 0.0,
+                    'p50': float(np.percentile(latencies, 50)) if latencies.size else 0.0,
+                    'p99': float(np.percentile(latencies, 99)) if latencies.size else 0.0,
+                    'max': self._queue_latency_max * 1000.0,
+                },
+            }
+        return stats
@@ -0,0 +1,266 @@
+"""
+Offline benchmark for the detection pipeline.
+
+Builds deterministic synthetic thermal frames at several resolutions and
+object densities, then times each stage (preprocess_thermal_image,
+ModelWrapper.predict, draw_detections, encode_image_to_base64 and the full
+/detect route through the Flask test client) for every requested engine.
+Reports throughput, p50/p95/p99 latency and peak RSS per stage (plus bytes
+allocated per /detect request with --trace-allocations). The 'cascade'
+stage times ModelWrapper.predict_cascade and reports its recall against
+the full-frame predictions and the fraction of pixels it sent to the
+model. The results are written
+as JSON and can fail when they regress against a stored baseline:
+
+    python benchmark.py --output bench.json
+    python benchmark.py --baseline bench.json --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+STAGES = ('preprocess', 'predict', 'cascade', 'draw', 'encode', 'detect')
+ENGINES = ('blob', 'onnx', 'yolo')
+
+
+def synthetic_frame(width, height, objects, seed=0):
+    """A thermal-looking 8-bit BGR frame: warm gradient, sensor noise and
+    `objects` bright person-sized ellipses at seeded random positions."""
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    frame = 40 + 50 * y + 20 * x
+    frame = frame + rng.normal(0, 4, (height, width)).astype(np.float32)
+    scale = min(width, height)
+    for _ in range(objects):
+        axes = (int(scale * rng.uniform(0.015, 0.04)), int(scale * rng.uniform(0.04, 0.1)))
+        center = (int(rng.uniform(axes[0], width - axes[0])), int(rng.uniform(axes[1], height - axes[1])))
+        cv2.ellipse(frame, center, axes, 0, 0, 360, float(rng.uniform(180, 250)), -1)
+    frame = cv2.GaussianBlur(np.clip(frame, 0, 255).astype(np.uint8), (5, 5), 0)
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def current_rss_bytes():
+    """Resident set size now (Linux /proc), falling back to the process peak"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def time_stage(fn, iterations, warmup):
+    """Run fn warmup + iterations times; returns latency/throughput/RSS stats"""
+    for _ in range(warmup):
+        fn()
+    latencies = np.empty(iterations, dtype=np.float64)
+    peak_rss = current_rss_bytes()
+    start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies[i] = time.perf_counter() - t0
+        peak_rss = max(peak_rss, current_rss_bytes())
+    wall = time.perf_counter() - start
+    ms = latencies * 1000.0
+    return {
+        'iterations': iterations,
+        'throughput_per_s': iterations / wall if wall > 0 else 0.0,
+        'mean_ms': float(ms.mean()),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'peak_rss_mb': peak_rss / (1024 * 1024),
+    }
+
+
+def detection_recall(reference, candidate, iou=0.5):
+    """Fraction of reference boxes matched by a candidate box at IoU >= iou"""
+    from ops import box_iou
+    if not len(reference):
+        return 1.0
+    if not len(candidate):
+        return 0.0
+    return sum(box_iou(box, candidate.boxes).max() >= iou for box in reference.boxes) / len(reference)
+
+
+def load_engine(engine, models_dir):
+    """ModelWrapper forced to engine, or None if that engine cannot load here"""
+    from model import ModelWrapper
+    wrapper = ModelWrapper(models_dir=models_dir, engine=engine)
+    return wrapper if wrapper.mode == engine else None
+
+
+def run_benchmark(engines, stages, resolutions, densities, iterations, warmup, models_dir, response_mode='full',
+                  cascade_sensitivity=1.0):
+    # Keep the server quiet and measure real work, not cache hits
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('RESULT_CACHE_MAX_BYTES', '0')
+    import server
+    from cascade import HotRegionFilter
+
+    results, skipped = [], []
+    for engine in engines:
+        wrapper = load_engine(engine, models_dir)
+        if wrapper is None:
+            skipped.append(engine)
+            print(f"skipping engine '{engine}': not available", file=sys.stderr)
+            continue
+        wrapper.warm_up()
+        server.model_registry.register(server.ModelRegistry.DEFAULT, wrapper)
+        server.model_ready = True
+        client = server.app.test_client()
+
+        for width, height in resolutions:
+            for objects in densities:
+                frame = synthetic_frame(width, height, objects, seed=width * 31 + height * 17 + objects)
+                preprocessed = server.preprocess_thermal_image(frame)
+                detections = wrapper.predict(preprocessed, enhanced=True)
+                annotated = server.draw_detections(frame, detections)
+                prefilter = HotRegionFilter(sensitivity=cascade_sensitivity)
+                png = cv2.imencode('.png', frame)[1].tobytes()
+                allocated = []
+
+                def detect():
+                    response = client.post(f'/detect?response={response_mode}', data=png,
+                                           content_type='application/octet-stream')
+                    if response.status_code != 200:
+                        raise RuntimeError(f"/detect returned {response.status_code}: {response.get_data(as_text=True)}")
+                    if 'X-Allocated-Bytes' in response.headers:
+                        allocated.append(int(response.headers['X-Allocated-Bytes']))
+
+                fns = {
+                    'preprocess': lambda: server.preprocess_thermal_image(frame),
+                    'predict': lambda: wrapper.predict(preprocessed, enhanced=True),
+                    'cascade': lambda: wrapper.predict_cascade(preprocessed, prefilter, enhanced=True),
+                    'draw': lambda: server.draw_detections(frame, detections),
+                    'encode': lambda: server.encode_image_to_base64(annotated),
+                    'detect': detect,
+                }
+                for stage in stages:
+                    stats = time_stage(fns[stage], iterations, warmup)
+                    if stage == 'detect' and allocated:
+                        stats['allocated_bytes'] = float(np.median(allocated))
+                    if stage == 'cascade':
+                        cascaded = wrapper.predict_cascade(preprocessed, prefilter, enhanced=True)
+                        counts = prefilter.stats()
+                        stats['recall'] = detection_recall(detections, cascaded)
+                        stats['pixels_inferred'] = counts['pixels_inferred'] / counts['pixels'] if counts['pixels'] else 1.0
+                    results.append({
+                        'engine': engine,
+                        'stage': stage,
+                        'resolution': f'{width}x{height}',
+                        'objects': objects,
+                        'detections': len(detections),
+                        **stats,
+                    })
+                    print(f"{engine:5s} {stage:10s} {width}x{height} objects={objects:<3d} "
+                          f"p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms "
+                          f"{stats['throughput_per_s']:.1f}/s rss={stats['peak_rss_mb']:.0f}MB", file=sys.stderr)
+    return results, skipped
+
+
+def result_key(result):
+    return f"{result['engine']}/{result['stage']}/{result['resolution']}/{result['objects']}"
+
+
+def compare_to_baseline(results, baseline, threshold, metric='p50_ms'):
+    """Entries whose metric grew by more than threshold (a fraction) over the baseline"""
+    previous = {result_key(r): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        base = previous.get(result_key(result))
+        if base is None or not base.get(metric):
+            continue
+        change = result[metric] / base[metric] - 1
+        if change > threshold:
+            regressions.append({'key': result_key(result), 'metric': metric, 'baseline': base[metric],
+                                'current': result[metric], 'change': change})
+    return regressions
+
+
+def parse_resolutions(text):
+    return [tuple(int(v) for v in item.lower().split('x')) for item in text.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the thermal detection pipeline")
+    parser.add_argument('--engines', default=','.join(ENGINES), help="comma-separated: blob, onnx, yolo")
+    parser.add_argument('--stages', default=','.join(STAGES), help="comma-separated: " + ', '.join(STAGES))
+    parser.add_argument('--resolutions', default='320x256,640x512,1280x1024')
+    parser.add_argument('--densities', default='1,8,32', help="objects per frame")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--response-mode', default='full', help="response mode used for /detect")
+    parser.add_argument('--cascade-sensitivity', type=float, default=1.0,
+                        help="pre-filter sensitivity for the cascade stage")
+    parser.add_argument('--models-dir', default=str(Path.cwd()))
+    parser.add_argument('--threads', type=int, default=None, help="cv2.setNumThreads for stable numbers")
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help="record bytes allocated per /detect request (slower; see TRACE_ALLOCATIONS)")
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="fail if the metric grows by more than this fraction over the baseline")
+    parser.add_argument('--metric', default='p50_ms', choices=('mean_ms', 'p50_ms', 'p95_ms', 'p99_ms'))
+    args = parser.parse_args(argv)
+
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    if args.trace_allocations:
+        os.environ['TRACE_ALLOCATIONS'] = '1'
+
+    results, skipped = run_benchmark(
+        [e for e in args.engines.split(',') if e], stages, parse_resolutions(args.resolutions),
+        [int(d) for d in args.densities.split(',') if d], args.iterations, args.warmup,
+        Path(args.models_dir), args.response_mode, args.cascade_sensitivity)
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'skipped_engines': skipped,
+        },
+        'results': results,
+    }
+
+    status = 0
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare_to_baseline(results, baseline, args.threshold, args.metric)
+        report['regressions'] = regressions
+        for r in regressions:
+            print(f"REGRESSION {r['key']}: {r['metric']} {r['baseline']:.2f} -> {r['current']:.2f} "
+                  f"({r['change'] * 100:+.0f}%)", file=sys.stderr)
+        status = 1 if regressions else 0
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        sys.stdout.write(text + '\n')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
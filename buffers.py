@@ -0,0 +1,58 @@
+"""
+Pool of reusable frame buffers.
+
+Preprocessing writes its output into a buffer leased from here instead of a
+fresh array, so steady-state requests of the same frame size stop
+allocating (and page-faulting) full-size images. A buffer is owned by one
+request from acquire() until release(), which keeps it safe when stages run
+on different threads or several frames of a batch are alive at once.
+"""
+
+import threading
+
+import numpy as np
+
+
+class BufferPool:
+    """Free lists of arrays keyed by (shape, dtype).
+
+    At most max_per_shape idle buffers are kept per key; extra released
+    buffers are dropped for the garbage collector.
+    """
+
+    def __init__(self, max_per_shape=4):
+        self.max_per_shape = int(max_per_shape)
+        self._free = {}
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.allocated = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """An uninitialized array of shape/dtype, reused when one is free"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            if free:
+                self.reused += 1
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def release(self, array):
+        """Return a buffer obtained from acquire(); it must no longer be used"""
+        if array is None or self.max_per_shape <= 0:
+            return
+        key = (array.shape, array.dtype.str)
+        with self._lock:
+            free = self._free.setdefault(key, [])
+            if len(free) < self.max_per_shape:
+                free.append(array)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'reused': self.reused,
+                'allocated': self.allocated,
+                'idle_buffers': sum(len(v) for v in self._free.values()),
+                'idle_bytes': sum(a.nbytes for v in self._free.values() for a in v),
+            }
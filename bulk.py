@@ -0,0 +1,303 @@
+"""
+Offline bulk detection over an archive of thermal images.
+
+Runs ModelWrapper directly, without the HTTP layer, over directories, glob
+patterns and tar/zip archives:
+
+    python bulk.py /data/night-0412 --output night.jsonl
+    python bulk.py 'captures/**/*.png' frames.tar.gz --output out.csv --annotate-dir annotated/
+    python bulk.py /data/night-0412 --output night.jsonl --resume
+
+A process pool loads the model once per worker (one inference thread each,
+so --workers equal to the core count keeps every core busy). The main
+process only reads inputs and keeps at most --read-ahead of them in flight,
+so memory stays bounded for any archive size; workers decode, preprocess,
+detect and optionally write annotated images. Results are written as they
+finish: one JSON line per image, or one CSV row per detection (a single
+row with empty detection fields for images without any).
+
+Each written result is recorded in <output>.checkpoint together with the
+output size after it. --resume truncates the output to the last recorded
+result and skips every image already listed, so an interrupted run
+continues without losing or duplicating rows.
+"""
+
+import argparse
+import csv
+import glob
+import io
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+CSV_FIELDS = ('name', 'success', 'error', 'model_mode', 'label', 'confidence',
+              'x', 'y', 'width', 'height', 'temperature')
+
+
+def _is_image(name):
+    return name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def iter_inputs(sources):
+    """Yield (name, payload) for every image in sources.
+
+    payload is the file path for plain files (workers read it themselves)
+    or the bytes of an archive member. Archive members are named
+    <archive>/<member>.
+    """
+    for source in sources:
+        path = Path(source)
+        if not path.exists() and glob.has_magic(source):
+            yield from iter_inputs(sorted(glob.glob(source, recursive=True)))
+        elif path.is_dir():
+            for p in sorted(path.rglob('*')):
+                if p.is_file() and _is_image(p.name):
+                    yield str(p), str(p)
+        elif _is_image(path.name):
+            yield str(path), str(path)
+        elif path.is_file() and zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir() and _is_image(info.filename):
+                        yield f'{path}/{info.filename}', archive.read(info)
+        elif path.is_file() and tarfile.is_tarfile(path):
+            # streaming mode: members are read in archive order, compressed or not
+            with tarfile.open(path, 'r|*') as archive:
+                for member in archive:
+                    if member.isfile() and _is_image(member.name):
+                        yield f'{path}/{member.name}', archive.extractfile(member).read()
+        else:
+            print(f"skipping '{source}': not an image, directory or tar/zip archive", file=sys.stderr)
+
+
+def annotated_path(root, name):
+    """Where the annotated copy of name goes under root (mirrors its relative path)"""
+    parts = [part for part in Path(name).parts if part not in ('..', '.') and part != Path(name).anchor]
+    return Path(root, *parts)
+
+
+_worker = {}
+
+
+def _init_worker(models_dir, engine, threads, options):
+    """Pool initializer: load and warm up the model once per worker process"""
+    cv2.setNumThreads(threads)
+    os.environ.setdefault('ONNX_INTRA_OP_THREADS', str(threads))
+    from cascade import HotRegionFilter
+    from model import ModelWrapper
+    model = ModelWrapper(models_dir=Path(models_dir), engine=engine)
+    model.warm_up()
+    _worker.update(model=model, options=options, cascade_filter=HotRegionFilter.from_env())
+
+
+def _process(name, payload):
+    """Detect on one image in a worker; returns the result record"""
+    import imaging
+    model, options = _worker['model'], _worker['options']
+    try:
+        data = Path(payload).read_bytes() if isinstance(payload, str) else payload
+        image = imaging.process_image(data, imaging.decode_flags({}))
+        preprocessed = imaging.preprocess_thermal_image(image)
+        if options['tiled']:
+            detections = model.predict_tiled(preprocessed, options['tile_size'], options['tile_overlap'],
+                                             options['tile_max_batch'], enhanced=True)
+        elif options['cascade']:
+            detections = model.predict_cascade(preprocessed, _worker['cascade_filter'], enhanced=True,
+                                               sensitivity=options['cascade_sensitivity'])
+        else:
+            detections = model.predict(preprocessed, enhanced=True)
+        result = {
+            'name': name,
+            'success': True,
+            'width': image.shape[1],
+            'height': image.shape[0],
+            'detections': imaging.format_detections(detections, image.shape),
+            'detection_count': len(detections),
+            'model_mode': model.mode,
+        }
+        if options['annotate_dir']:
+            target = annotated_path(options['annotate_dir'], name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if not cv2.imwrite(str(target), imaging.draw_detections(image, detections, in_place=True)):
+                raise ValueError(f"Could not write annotated image {target}")
+            result['annotated'] = str(target)
+        return result
+    except Exception as e:
+        return {'name': name, 'success': False, 'error': str(e)}
+
+
+def read_checkpoint(path):
+    """(names done, output size after the last of them), dropping a partial last line"""
+    try:
+        with open(path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                f.truncate(end)
+    except FileNotFoundError:
+        return set(), 0
+    done, offset = set(), 0
+    for line in data[:end].decode('utf-8').splitlines():
+        size, _, name = line.partition('\t')
+        done.add(name)
+        offset = int(size)
+    return done, offset
+
+
+class ResultWriter:
+    """Appends results to the output file and records each one in the checkpoint"""
+
+    def __init__(self, output, fmt, resume=False):
+        self.output = Path(output)
+        self.fmt = fmt
+        self.checkpoint_path = Path(f'{output}.checkpoint')
+        self.done, offset = read_checkpoint(self.checkpoint_path) if resume else (set(), 0)
+        size = self.output.stat().st_size if self.output.exists() else 0
+        if offset > size:
+            # the output was removed or cut short: its results are gone, so
+            # the checkpoint no longer describes it
+            print(f"{self.output} is missing or shorter than its checkpoint; starting over", file=sys.stderr)
+            self.done, offset, resume = set(), 0, False
+        if self.output.parent != Path(''):
+            self.output.parent.mkdir(parents=True, exist_ok=True)
+        self.out = open(self.output, 'r+b' if resume and self.output.exists() else 'wb')
+        self.out.truncate(offset)
+        self.out.seek(offset)
+        self.checkpoint = open(self.checkpoint_path, 'a' if resume else 'w', encoding='utf-8')
+        if fmt == 'csv' and offset == 0:
+            self.out.write(self._csv([CSV_FIELDS]))
+
+    @staticmethod
+    def _csv(rows):
+        text = io.StringIO()
+        csv.writer(text, lineterminator='\n').writerows(rows)
+        return text.getvalue().encode('utf-8')
+
+    def _rows(self, result):
+        base = [result['name'], int(result['success']), result.get('error', ''), result.get('model_mode', '')]
+        detections = result.get('detections') or []
+        if not detections:
+            return [base + [''] * 7]
+        return [base + [d['label'], d['confidence'], d['bbox']['x'], d['bbox']['y'],
+                        d['bbox']['width'], d['bbox']['height'], d['temperature']] for d in detections]
+
+    def write(self, result):
+        if self.fmt == 'csv':
+            self.out.write(self._csv(self._rows(result)))
+        else:
+            self.out.write((json.dumps(result) + '\n').encode('utf-8'))
+        self.out.flush()
+        self.checkpoint.write(f"{self.out.tell()}\t{result['name']}\n")
+        self.checkpoint.flush()
+
+    def close(self):
+        self.out.close()
+        self.checkpoint.close()
+
+
+def run(items, writer, workers, read_ahead, init_args, progress_interval=5.0):
+    """Process items on a worker pool with at most read_ahead in flight; returns counts"""
+    counts = {'processed': 0, 'failed': 0, 'skipped': 0}
+    start = last_report = time.perf_counter()
+
+    def collect(futures):
+        nonlocal last_report
+        for future in futures:
+            result = future.result()
+            writer.write(result)
+            counts['processed'] += 1
+            counts['failed'] += not result['success']
+        now = time.perf_counter()
+        if now - last_report >= progress_interval:
+            last_report = now
+            print(f"{counts['processed']} processed ({counts['failed']} failed, {counts['skipped']} skipped), "
+                  f"{counts['processed'] / (now - start):.1f} images/s", file=sys.stderr)
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init_args) as pool:
+        pending = set()
+        try:
+            for name, payload in items:
+                if name in writer.done:
+                    counts['skipped'] += 1
+                    continue
+                while len(pending) >= read_ahead:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                pending.add(pool.submit(_process, name, payload))
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+        except KeyboardInterrupt:
+            # Everything written so far is checkpointed; --resume picks up from there
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    counts['seconds'] = time.perf_counter() - start
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run thermal detection over directories, globs and tar/zip archives")
+    parser.add_argument('inputs', nargs='+', help="image files, directories, glob patterns or tar/zip archives")
+    parser.add_argument('--output', required=True, help="results file (.jsonl or .csv)")
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help="default: from the output extension")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--threads', type=int, default=1, help="inference/OpenCV threads per worker")
+    parser.add_argument('--read-ahead', type=int, default=None,
+                        help="images read and queued ahead of the workers (default 4 per worker)")
+    parser.add_argument('--annotate-dir', help="also write annotated images here")
+    parser.add_argument('--engine', default=None, help="auto, yolo, onnx or blob (default MODEL_ENGINE)")
+    parser.add_argument('--models-dir', default=str(Path.cwd()))
+    parser.add_argument('--tiled', action='store_true', help="tiled inference at native resolution")
+    parser.add_argument('--tile-size', type=int, default=int(os.environ.get('TILE_SIZE', 640)),
+                        help="tile side for --tiled (default TILE_SIZE or 640)")
+    parser.add_argument('--tile-overlap', type=float, default=float(os.environ.get('TILE_OVERLAP', 0.2)),
+                        help="tile overlap fraction for --tiled (default TILE_OVERLAP or 0.2)")
+    parser.add_argument('--cascade', action='store_true', help="run the model only on hot regions")
+    parser.add_argument('--cascade-sensitivity', type=float, default=None)
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted run from its checkpoint")
+    parser.add_argument('--overwrite', action='store_true', help="replace an existing output file")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ('csv' if args.output.lower().endswith('.csv') else 'jsonl')
+    if Path(args.output).exists() and not (args.resume or args.overwrite):
+        parser.error(f"{args.output} exists; pass --resume to continue it or --overwrite to start over")
+    if args.workers < 1:
+        parser.error("--workers must be >= 1")
+
+    if args.tile_size < 32 or not 0 <= args.tile_overlap < 1:
+        parser.error("--tile-size must be >= 32 and --tile-overlap in [0, 1)")
+
+    options = {
+        'tiled': args.tiled,
+        'tile_size': args.tile_size,
+        'tile_overlap': args.tile_overlap,
+        'tile_max_batch': int(os.environ.get('TILE_MAX_BATCH', 16)),
+        'cascade': args.cascade,
+        'cascade_sensitivity': args.cascade_sensitivity,
+        'annotate_dir': args.annotate_dir,
+    }
+    init_args = (args.models_dir, args.engine, args.threads, options)
+    writer = ResultWriter(args.output, fmt, resume=args.resume)
+    try:
+        counts = run(iter_inputs(args.inputs), writer, args.workers, args.read_ahead or 4 * args.workers, init_args)
+    except KeyboardInterrupt:
+        print(f"interrupted; rerun with --resume to continue {args.output}", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+    rate = counts['processed'] / counts['seconds'] if counts['seconds'] > 0 else 0.0
+    print(f"{counts['processed']} processed ({counts['failed']} failed), {counts['skipped']} already done, "
+          f"{counts['seconds']:.1f}s, {rate:.1f} images/s", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Content-addressed cache for /detect responses.
+
+Entries are keyed by a hash of the uploaded bytes plus the model identity,
+the output-affecting server settings and request options, and hold the
+serialized response body (JSON or .npz). A size-bounded
+in-memory LRU sits in front of an optional on-disk tier that survives
+restarts.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Disk entries hold whatever the response was (JSON or .npz), so the file
+# suffix says nothing about the layout
+DISK_SUFFIX = '.body'
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of response bodies.
+
+    max_bytes bounds the memory tier; disk_dir enables the disk tier, which
+    is bounded by disk_max_bytes (oldest files are removed first).
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, disk_max_bytes=1024 * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.disk_max_bytes = int(disk_max_bytes)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self._disk_bytes = 0
+        if self.disk_dir is not None:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+    @staticmethod
+    def key(data, *parts):
+        """Hash the uploaded bytes together with model identity and options"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(data.encode() if isinstance(data, str) else data)
+        for part in parts:
+            h.update(b'\0')
+            h.update(str(part).encode())
+        return h.hexdigest()
+
+    def _disk_path(self, key):
+        return self.disk_dir / key[:2] / f'{key}{DISK_SUFFIX}'
+
+    def _disk_entries(self):
+        """(path, mtime, size) of each disk entry; files another process
+        removed mid-scan are skipped"""
+        entries = []
+        for path in self.disk_dir.glob(f'*/*{DISK_SUFFIX}'):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def get(self, key):
+        """Return the cached body (bytes) or None"""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return body
+        if self.disk_dir is not None:
+            try:
+                body = self._disk_path(key).read_bytes()
+            except OSError:
+                body = None
+            if body is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self.hits += 1
+                self._put_memory(key, body)
+                return body
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, body):
+        """Store a serialized response body in both tiers.
+
+        Caching is best effort: a failure is logged, never raised to the
+        request that produced the body.
+        """
+        try:
+            self._put_memory(key, body)
+            if self.disk_dir is not None:
+                self._put_disk(key, body)
+        except Exception as e:
+            logger.warning("Error caching result: %s", e)
+
+    def _put_memory(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def _put_disk(self, key, body):
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            existed = path.exists()
+            tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Error writing result cache entry: %s", e)
+            return
+        with self._lock:
+            if not existed:
+                self._disk_bytes += len(body)
+            over = self._disk_bytes > self.disk_max_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+        with self._lock:
+            for path, _, size in entries:
+                if self._disk_bytes <= self.disk_max_bytes * 0.9:
+                    break
+                try:
+                    path.unlink()
+                except OSError:
+                    continue
+                self._disk_bytes -= size
+                self.disk_evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'disk_dir': str(self.disk_dir) if self.disk_dir else None,
+                'disk_bytes': self._disk_bytes if self.disk_dir else 0,
+            }
@@ -0,0 +1,168 @@
+"""
+Cheap hot-region pre-filter for two-stage (cascade) detection.
+
+Uses the blob engine's threshold (mean + max(30, 1.2 * std), at most 240,
+then a morphological opening) on a downscaled copy of the frame to find
+candidate hot regions. Frames without any skip the full model entirely;
+otherwise only padded crops around the candidates are sent to it, or the
+whole frame when the crops would cover most of it anyway.
+
+The filter only ever removes work: a person the threshold misses is a
+detection the full model never sees, so check skipped frames against
+missed detections (benchmark.py reports recall of the 'cascade' stage).
+"""
+
+import math
+import os
+import threading
+
+import numpy as np
+import cv2
+
+_OPEN_KERNEL = np.ones((3, 3), np.uint8)
+
+
+def merge_overlapping(boxes):
+    """Union x1,y1,x2,y2 boxes until no two of them overlap"""
+    boxes = [list(box) for box in boxes]
+    merged = True
+    while merged:
+        merged = False
+        out = []
+        for box in boxes:
+            for other in out:
+                if box[0] < other[2] and other[0] < box[2] and box[1] < other[3] and other[1] < box[3]:
+                    other[:] = [min(box[0], other[0]), min(box[1], other[1]),
+                                max(box[2], other[2]), max(box[3], other[3])]
+                    merged = True
+                    break
+            else:
+                out.append(box)
+        boxes = out
+    return boxes
+
+
+class HotRegionFilter:
+    """Finds candidate hot regions and plans the crops the full model runs on.
+
+    sensitivity: divides the margin above the frame mean a pixel needs to
+    count as hot; 1.0 is the blob engine's threshold, 2.0 halves the margin
+    (more candidates, fewer misses, less skipped).
+    min_area: smallest candidate region kept, in full-resolution pixels.
+    max_side: the frame is analysed with its longer side at most this long
+    (0 keeps full resolution).
+    padding: context added around each region, as a fraction of its longer side.
+    crop_size: crops are grown to at least this size (the model input size),
+    so objects are not upscaled relative to a full-frame pass.
+    max_coverage / max_crops: above this fraction of the frame or number of
+    crops, the whole frame is run instead.
+    """
+
+    def __init__(self, sensitivity=1.0, min_area=64, max_side=320, padding=0.5,
+                 crop_size=640, max_coverage=0.6, max_crops=8):
+        self.sensitivity = float(sensitivity)
+        self.min_area = min_area
+        self.max_side = int(max_side)
+        self.padding = float(padding)
+        self.crop_size = int(crop_size)
+        self.max_coverage = float(max_coverage)
+        self.max_crops = int(max_crops)
+        self._lock = threading.Lock()
+        self._stats = {'frames': 0, 'frames_skipped': 0, 'frames_cropped': 0, 'frames_full': 0,
+                       'regions': 0, 'crops': 0, 'pixels': 0, 'pixels_inferred': 0}
+
+    @classmethod
+    def from_env(cls):
+        """A filter configured by the CASCADE_* environment variables"""
+        return cls(
+            sensitivity=float(os.environ.get('CASCADE_SENSITIVITY', 1.0)),
+            min_area=int(os.environ.get('CASCADE_MIN_AREA', 64)),
+            max_side=int(os.environ.get('CASCADE_MAX_SIDE', 320)),
+            padding=float(os.environ.get('CASCADE_PADDING', 0.5)),
+            crop_size=int(os.environ.get('CASCADE_CROP_SIZE', 640)),
+            max_coverage=float(os.environ.get('CASCADE_MAX_COVERAGE', 0.6)),
+            max_crops=int(os.environ.get('CASCADE_MAX_CROPS', 8)),
+        )
+
+    def settings(self):
+        """The parameters above, e.g. for cache keys"""
+        return {'sensitivity': self.sensitivity, 'min_area': self.min_area, 'max_side': self.max_side,
+                'padding': self.padding, 'crop_size': self.crop_size, 'max_coverage': self.max_coverage,
+                'max_crops': self.max_crops}
+
+    def regions(self, image, sensitivity=None):
+        """Candidate hot regions as an (N, 4) int array of x1,y1,x2,y2 in frame pixels.
+
+        image is expected CLAHE-enhanced (imaging.preprocess_thermal_image),
+        grayscale or BGR.
+        """
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        h, w = gray.shape[:2]
+        small = gray
+        if self.max_side > 0 and max(h, w) > self.max_side:
+            factor = self.max_side / max(h, w)
+            small = cv2.resize(gray, (max(1, round(w * factor)), max(1, round(h * factor))),
+                               interpolation=cv2.INTER_AREA)
+        sx, sy = w / small.shape[1], h / small.shape[0]
+
+        mean, std = cv2.meanStdDev(small)
+        margin = max(30.0, 1.2 * float(std[0, 0])) / (sensitivity or self.sensitivity)
+        threshold = min(240, int(float(mean[0, 0]) + margin))
+        _, mask = cv2.threshold(small, threshold, 255, cv2.THRESH_BINARY)
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, _OPEN_KERNEL)
+
+        n, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        if n <= 1:
+            return np.empty((0, 4), dtype=np.int64)
+        x, y, bw, bh = (stats[1:, k].astype(np.float64) for k in range(4))
+        keep = bw * bh * sx * sy >= self.min_area
+        boxes = np.stack([x * sx, y * sy, (x + bw) * sx, (y + bh) * sy], axis=1)[keep]
+        boxes = np.stack([np.floor(boxes[:, 0]), np.floor(boxes[:, 1]),
+                          np.ceil(boxes[:, 2]), np.ceil(boxes[:, 3])], axis=1)
+        return np.minimum(boxes, [w, h, w, h]).astype(np.int64)
+
+    def crops(self, shape, regions):
+        """Non-overlapping crop boxes covering regions ([] if there are none),
+        or None when the full frame should be run instead"""
+        h, w = shape[:2]
+        if len(regions) == 0:
+            return []
+        boxes = []
+        for x1, y1, x2, y2 in regions.tolist():
+            pad = self.padding * max(x2 - x1, y2 - y1)
+            cw = min(w, max(math.ceil(x2 - x1 + 2 * pad), self.crop_size))
+            ch = min(h, max(math.ceil(y2 - y1 + 2 * pad), self.crop_size))
+            # centre the crop on the region, shifted back inside the frame
+            cx = int(min(max((x1 + x2 - cw) / 2, 0), w - cw))
+            cy = int(min(max((y1 + y2 - ch) / 2, 0), h - ch))
+            boxes.append([cx, cy, cx + cw, cy + ch])
+        boxes = merge_overlapping(boxes)
+        covered = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in boxes)
+        if len(boxes) > self.max_crops or covered > self.max_coverage * w * h:
+            return None
+        return boxes
+
+    def plan(self, image, sensitivity=None):
+        """crops() for image, recording the outcome in stats()"""
+        regions = self.regions(image, sensitivity)
+        crops = self.crops(image.shape, regions)
+        h, w = image.shape[:2]
+        if crops is None:
+            outcome, inferred = 'frames_full', w * h
+        elif not crops:
+            outcome, inferred = 'frames_skipped', 0
+        else:
+            outcome, inferred = 'frames_cropped', sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in crops)
+        with self._lock:
+            stats = self._stats
+            stats['frames'] += 1
+            stats[outcome] += 1
+            stats['regions'] += len(regions)
+            stats['crops'] += len(crops or ())
+            stats['pixels'] += w * h
+            stats['pixels_inferred'] += inferred
+        return crops
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,71 @@
+"""
+Columnar container for the detections of one image.
+
+Engines return Detections instead of one dict per box, so merging, NMS,
+temperature lookups and response formatting work on whole arrays. For code
+that still expects the old shape, a Detections object also behaves as a
+sequence of {'label', 'score', 'box'} dicts.
+"""
+
+import numpy as np
+
+
+class Detections:
+    """Parallel arrays: boxes (N, 4) x1,y1,x2,y2, scores (N,) and labels (N,) of str.
+
+    Boxes and scores are float64 so values round-trip exactly from the
+    engines' float32/int outputs and match the previous per-box floats.
+    """
+
+    __slots__ = ('boxes', 'scores', 'labels')
+
+    def __init__(self, boxes=None, scores=None, labels=None):
+        self.boxes = np.asarray(boxes if boxes is not None else np.empty((0, 4)), dtype=np.float64).reshape(-1, 4)
+        n = len(self.boxes)
+        self.scores = np.asarray(scores if scores is not None else np.empty(0), dtype=np.float64).reshape(n)
+        if labels is None or isinstance(labels, str):
+            self.labels = np.full(n, labels or '', dtype=object)
+        else:
+            self.labels = np.asarray(labels, dtype=object).reshape(n)
+
+    @classmethod
+    def from_dicts(cls, detections):
+        """Build from a list of {'label', 'score', 'box'} dicts (or return Detections unchanged)"""
+        if isinstance(detections, cls):
+            return detections
+        detections = list(detections)
+        if not detections:
+            return cls()
+        return cls([d['box'] for d in detections], [d['score'] for d in detections],
+                   [d['label'] for d in detections])
+
+    @classmethod
+    def concatenate(cls, items):
+        items = [cls.from_dicts(item) for item in items]
+        if not items:
+            return cls()
+        return cls(np.concatenate([d.boxes for d in items]), np.concatenate([d.scores for d in items]),
+                   np.concatenate([d.labels for d in items]))
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __bool__(self):
+        return len(self.scores) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return {'label': self.labels[index], 'score': float(self.scores[index]),
+                    'box': self.boxes[index].tolist()}
+        return Detections(self.boxes[index], self.scores[index], self.labels[index])
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def __repr__(self):
+        return f'Detections(n={len(self)})'
+
+    def to_dicts(self):
+        """The legacy list-of-dicts form"""
+        return [{'label': label, 'score': score, 'box': box}
+                for label, score, box in zip(self.labels.tolist(), self.scores.tolist(), self.boxes.tolist())]
@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration for the detection backend.
+
+With PRELOAD_MODEL=1 (the default) the model is loaded once in the master
+before workers are forked, so its weights are shared copy-on-write instead
+of being loaded N times. onnxruntime sessions cannot be shared across fork:
+the master only reads the .onnx bytes and each worker builds its own
+session. Each worker then runs a warm-up inference before it starts
+accepting requests; /health reports 'ready' once that has finished.
+"""
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+# Threaded workers let one process serve concurrent requests, which is what
+# the /detect micro-batcher (MICROBATCH_ENABLED=1) needs to form batches
+# and SERVING_MODE=threaded needs to overlap stages across requests.
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+preload_app = os.environ.get('PRELOAD_MODEL', '1') == '1'
+
+
+def on_starting(server):
+    # Models hot-swapped through POST /models last until the server restarts:
+    # forget the previous run's swaps (see MODEL_STATE_FILE in server.py)
+    state = os.environ.get('MODEL_STATE_FILE', os.path.join(os.getcwd(), '.model_state.json'))
+    if state and os.path.exists(state):
+        os.remove(state)
+
+
+def when_ready(server):
+    # Move everything allocated so far (model included) out of the GC's
+    # tracked generations so collections in workers don't touch, and thereby
+    # copy, the pages shared with the master.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    import server as detection_server
+    detection_server.prepare_worker()
@@ -0,0 +1,303 @@
+"""
+Image decoding, preprocessing and response formatting for thermal frames.
+
+Plain functions shared by the HTTP server and the offline tools (bulk.py,
+stream.py), so those do not have to import the Flask app.
+"""
+
+import base64
+import logging
+import os
+from io import BytesIO
+
+import numpy as np
+import cv2
+
+from detections import Detections
+from ops import thread_clahe
+from radiometry import RadiometricInputError, raw_to_celsius, to_display_8bit, box_temperature_stats
+
+logger = logging.getLogger(__name__)
+
+# GRAYSCALE_DECODE=1 decodes uploads straight to single-channel grayscale.
+# Thermal frames carry one channel of information, so this skips BGR<->gray
+# round trips, but colour-palette uploads then come back gray in the
+# returned input/annotated images (which the frontend displays). Enable it
+# where clients send grayscale frames or only use response=detections.
+GRAYSCALE_DECODE = os.environ.get('GRAYSCALE_DECODE', '0') == '1'
+
+# With radiometric input, detections whose measured maximum reaches this
+# temperature are reported as 'hot'
+HOT_TEMPERATURE_C = float(os.environ.get('HOT_TEMPERATURE_C', 35.0))
+
+
+def process_image(image_data, read_flags=cv2.IMREAD_COLOR):
+    """
+    Convert image data to numpy array (BGR format for OpenCV)
+    Supports: File upload, base64 string, PIL Image
+    Pass read_flags=cv2.IMREAD_UNCHANGED to keep 16-bit radiometric data
+    """
+    try:
+        # If it's a file from form
+        if hasattr(image_data, 'read'):
+            image_bytes = image_data.read()
+            nparr = np.frombuffer(image_bytes, np.uint8)
+            img = cv2.imdecode(nparr, read_flags)
+        # If it's base64
+        elif isinstance(image_data, str):
+            # Remove data URL prefix if present
+            if image_data.startswith('data:image'):
+                image_data = image_data.split(',')[1]
+            image_bytes = base64.b64decode(image_data)
+            nparr = np.frombuffer(image_bytes, np.uint8)
+            img = cv2.imdecode(nparr, read_flags)
+        # If it's bytes
+        elif isinstance(image_data, bytes):
+            nparr = np.frombuffer(image_data, np.uint8)
+            img = cv2.imdecode(nparr, read_flags)
+        else:
+            raise ValueError(f"Unsupported image data type: {type(image_data)}")
+        
+        if img is None:
+            raise ValueError("Failed to decode image")
+        
+        return img
+    except Exception as e:
+        logger.warning("Error processing image: %s", e)
+        raise
+
+
+RAW_DTYPES = {'uint8': np.uint8, 'uint16': np.uint16}
+
+
+def check_raw_frame_size(nbytes, raw_params):
+    """Raise ValueError unless nbytes matches the declared raw frame shape"""
+    h, w = raw_params['height'], raw_params['width']
+    expected = h * w * np.dtype(RAW_DTYPES[raw_params['dtype']]).itemsize
+    if nbytes != expected:
+        raise ValueError(f"Raw frame is {nbytes} bytes, expected {expected} for {w}x{h} {raw_params['dtype']}")
+
+
+def decode_flags(options):
+    """cv2.imdecode flags for the request: 16-bit as-is, grayscale or BGR"""
+    if options.get('radiometric'):
+        return cv2.IMREAD_UNCHANGED
+    return cv2.IMREAD_GRAYSCALE if GRAYSCALE_DECODE else cv2.IMREAD_COLOR
+
+
+def decode_binary_upload(buffer, raw_params=None, read_flags=cv2.IMREAD_COLOR):
+    """
+    Decode an application/octet-stream body without copying it first.
+    Encoded images (PNG/JPEG/TIFF...) go straight to cv2.imdecode; raw
+    arrays are viewed in place with np.frombuffer and reshaped.
+    With IMREAD_UNCHANGED, 16-bit data is returned as-is for radiometric
+    mode; with IMREAD_GRAYSCALE a raw 8-bit frame is returned as the view.
+    """
+    if raw_params is None:
+        img = cv2.imdecode(np.frombuffer(buffer, np.uint8), read_flags)
+        if img is None:
+            raise ValueError("Failed to decode image")
+        return img
+    
+    check_raw_frame_size(len(buffer), raw_params)
+    dtype = np.dtype(RAW_DTYPES[raw_params['dtype']]).newbyteorder('<')
+    frame = np.frombuffer(buffer, dtype).reshape(raw_params['height'], raw_params['width'])
+    if read_flags == cv2.IMREAD_UNCHANGED:
+        return frame
+    if frame.dtype != np.uint8:
+        # Stretch the sensor range to 8 bits for the detector
+        frame = cv2.normalize(frame, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+    if read_flags == cv2.IMREAD_GRAYSCALE:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def split_radiometric_frame(frame, options):
+    """
+    Turn a decoded radiometric frame into (8-bit image, Celsius map).
+    The image is grayscale or BGR following GRAYSCALE_DECODE.
+    Without radiometric mode the frame is returned unchanged with no map.
+    """
+    if not options.get('radiometric'):
+        return frame, None
+    channels = frame.shape[2] if frame.ndim == 3 else 1
+    if channels not in (1, 3):
+        raise RadiometricInputError(f"Radiometric mode needs 1 or 3 channels, got {channels}")
+    if frame.ndim == 2:
+        raw = frame
+    elif channels == 1:
+        raw = frame[:, :, 0]
+    else:
+        raw = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    if raw.dtype != np.uint16:
+        raise RadiometricInputError(f"Radiometric mode needs 16-bit input, got {raw.dtype}")
+    celsius = raw_to_celsius(raw, options['gain'], options['offset'])
+    image = to_display_8bit(raw)
+    if not GRAYSCALE_DECODE:
+        image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+    return image, celsius
+
+
+def decode_source(image_data, options):
+    """Decode one uploaded image into (8-bit image, Celsius map or None)"""
+    return split_radiometric_frame(process_image(image_data, decode_flags(options)), options)
+
+
+def preprocess_thermal_image(image, out=None):
+    """
+    Preprocess thermal image similar to the notebook:
+    - Convert to grayscale if needed
+    - Apply CLAHE enhancement
+    Returns the single-channel enhanced image; the model converts it only if
+    its engine needs 3 channels. With out (a uint8 array of the frame's
+    height x width, e.g. from frame_buffers) CLAHE writes straight into it.
+    """
+    try:
+        # Ensure grayscale
+        if image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        else:
+            gray = image
+        
+        # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
+        return thread_clahe().apply(gray, out)
+    except Exception as e:
+        logger.warning("Error preprocessing image: %s", e)
+        return image  # Return original if preprocessing fails
+
+
+def draw_detections(image, detections, in_place=False):
+    """
+    Draw bounding boxes and labels on the image
+    Grayscale input is expanded to BGR (that copy replaces image.copy());
+    with in_place, a BGR image the caller no longer needs is drawn on directly.
+    """
+    try:
+        if image.ndim == 2:
+            result_image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        elif in_place:
+            result_image = image
+        else:
+            result_image = image.copy()
+        
+        detections = Detections.from_dicts(detections)
+        boxes = detections.boxes.astype(np.int64).tolist()  # [x1, y1, x2, y2]
+        for (x1, y1, x2, y2), label, score in zip(boxes, detections.labels.tolist(), detections.scores.tolist()):
+            # Draw bounding box
+            color = (0, 255, 0)  # Green for YOLO detections
+            thickness = 2
+            cv2.rectangle(result_image, (x1, y1), (x2, y2), color, thickness)
+            
+            # Draw label with confidence
+            label_text = f"{label}: {score:.2f}"
+            font = cv2.FONT_HERSHEY_SIMPLEX
+            font_scale = 0.6
+            font_thickness = 1
+            text_size = cv2.getTextSize(label_text, font, font_scale, font_thickness)[0]
+            
+            # Background for text
+            cv2.rectangle(result_image, 
+                         (x1, y1 - text_size[1] - 4),
+                         (x1 + text_size[0], y1),
+                         color, -1)
+            
+            # Text
+            cv2.putText(result_image, label_text, 
+                       (x1, y1 - 2),
+                       font, font_scale, (255, 255, 255), font_thickness)
+        
+        return result_image
+    except Exception as e:
+        logger.warning("Error drawing detections: %s", e)
+        return image
+
+
+# Image encodings supported in responses: format -> (extension, mime type, quality flag)
+IMAGE_FORMATS = {
+    'png': ('.png', 'image/png', None),
+    'jpeg': ('.jpg', 'image/jpeg', cv2.IMWRITE_JPEG_QUALITY),
+    'webp': ('.webp', 'image/webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+
+def encode_image_to_base64(image, image_format='png', quality=None):
+    """Convert numpy image array to a base64 data URL (png, jpeg or webp)"""
+    try:
+        ext, mime, quality_flag = IMAGE_FORMATS[image_format]
+        params = [quality_flag, int(quality)] if quality_flag is not None and quality is not None else []
+        _, buffer = cv2.imencode(ext, image, params)
+        image_base64 = base64.b64encode(buffer).decode('utf-8')
+        return f"data:{mime};base64,{image_base64}"
+    except Exception as e:
+        logger.warning("Error encoding image: %s", e)
+        return None
+
+
+def detection_columns(detections, image_shape, celsius=None):
+    """
+    Response fields of every detection as arrays: label, confidence, the
+    bbox in percent of the frame (x, y, width, height) and temperature.
+    With a Celsius map, detections also get temperature_c_max/mean and are
+    classed 'hot' from the measured maximum instead of the score.
+    """
+    detections = Detections.from_dicts(detections)
+    h, w = image_shape[:2]
+    boxes = detections.boxes
+    columns = {
+        'label': detections.labels,
+        'confidence': detections.scores,
+        'x': boxes[:, 0] / w * 100,  # Convert to percentage
+        'y': boxes[:, 1] / h * 100,
+        'width': (boxes[:, 2] - boxes[:, 0]) / w * 100,
+        'height': (boxes[:, 3] - boxes[:, 1]) / h * 100,
+    }
+    if celsius is not None:
+        t_max, t_mean = box_temperature_stats(celsius, boxes)
+        columns['temperature'] = np.where(t_max.astype(np.float64) >= HOT_TEMPERATURE_C, 'hot', 'warm')
+        columns['temperature_c_max'] = t_max
+        columns['temperature_c_mean'] = t_mean
+    else:
+        columns['temperature'] = np.where(detections.scores > 0.7, 'hot', 'warm')
+    return columns
+
+
+def format_detections(detections, image_shape, celsius=None, layout='objects'):
+    """
+    Convert model detections to the response shape (bbox in percent):
+    a list of objects, or with layout='columnar' a dict of parallel lists.
+    """
+    columns = {key: value.tolist() for key, value in detection_columns(detections, image_shape, celsius).items()}
+    if layout == 'columnar':
+        return columns
+    formatted_detections = [
+        {'label': label, 'confidence': score, 'bbox': {'x': x, 'y': y, 'width': bw, 'height': bh},
+         'temperature': temperature}
+        for label, score, x, y, bw, bh, temperature in zip(
+            columns['label'], columns['confidence'], columns['x'], columns['y'],
+            columns['width'], columns['height'], columns['temperature'])
+    ]
+    if 'temperature_c_max' in columns:
+        for formatted, t_max, t_mean in zip(formatted_detections, columns['temperature_c_max'], columns['temperature_c_mean']):
+            formatted['temperature_c'] = {'max': t_max, 'mean': t_mean}
+    return formatted_detections
+
+
+def detections_npz(columns_list, image_indexes=None, extra=None):
+    """
+    Serialize detection columns (one dict per image, see detection_columns)
+    as a compressed .npz body. Labels and temperatures become fixed-width
+    unicode arrays, numbers float32, and image_index says which input image
+    each row belongs to.
+    """
+    image_indexes = image_indexes if image_indexes is not None else range(len(columns_list))
+    counts = [len(columns['confidence']) for columns in columns_list]
+    arrays = {'image_index': np.repeat(np.asarray(list(image_indexes), dtype=np.int32), counts)}
+    keys = columns_list[0].keys() if columns_list else ('label', 'confidence', 'x', 'y', 'width', 'height', 'temperature')
+    for key in keys:
+        parts = [np.asarray(columns[key]) for columns in columns_list]
+        values = np.concatenate(parts) if parts else np.empty(0)
+        arrays[key] = values.astype(str) if key in ('label', 'temperature') else values.astype(np.float32)
+    arrays.update(extra or {})
+    buffer = BytesIO()
+    np.savez_compressed(buffer, **arrays)
+    return buffer.getvalue()
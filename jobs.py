@@ -0,0 +1,343 @@
+"""
+Durable background jobs for large detection workloads.
+
+Uploads are spooled to <root>/<job id>/inputs/ and the job is recorded in a
+SQLite queue (<root>/jobs.db), so queued and half-finished jobs survive a
+restart. A small pool of worker threads claims jobs by priority, processes
+their images in chunks and appends one NDJSON line per image to
+<root>/<job id>/results.ndjson.
+
+Claims are leases, renewed by a heartbeat thread while the job runs: a
+running job whose heartbeat is older than lease_seconds (its worker died
+or hung) is put back in the queue and resumes after the last result line
+written. A runner checks that it still holds the lease before appending
+each chunk, so a job taken over by another runner is never written by two.
+Several processes may share one root; run them with worker.py.
+"""
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ('queued', 'running', 'done', 'failed', 'cancelled')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL,
+    done_count INTEGER NOT NULL DEFAULT 0,
+    options TEXT NOT NULL,
+    model TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    heartbeat REAL,
+    worker TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, created);
+"""
+
+
+class JobQueue:
+    """SQLite-backed job queue plus the on-disk input/result files of each job.
+
+    The directory and database are created on first use.
+    """
+
+    def __init__(self, root, lease_seconds=300, max_attempts=3):
+        self.root = Path(root)
+        self.db_path = self.root / 'jobs.db'
+        self.lease_seconds = float(lease_seconds)
+        self.max_attempts = int(max_attempts)
+        self._local = threading.local()
+
+    def _conn(self):
+        # sqlite3 connections must not cross threads or fork()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            self.root.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def job_dir(self, job_id):
+        return self.root / job_id
+
+    def input_path(self, job_id, index):
+        return self.job_dir(job_id) / 'inputs' / f'{index:06d}'
+
+    def results_path(self, job_id):
+        return self.job_dir(job_id) / 'results.ndjson'
+
+    def new_job_dir(self):
+        """Create the spool directory for a new job; returns (job_id, inputs dir)"""
+        job_id = uuid.uuid4().hex
+        inputs = self.job_dir(job_id) / 'inputs'
+        inputs.mkdir(parents=True)
+        return job_id, inputs
+
+    def discard(self, job_id):
+        shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+
+    def submit(self, job_id, item_count, options, model=None, priority=0):
+        """Queue a job whose inputs are already spooled"""
+        self._conn().execute(
+            'INSERT INTO jobs (id, status, priority, item_count, options, model, created) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, 'queued', int(priority), int(item_count), json.dumps(options), model, time.time()))
+
+    def claim(self, worker):
+        """Atomically take the highest-priority queued job (requeueing expired leases first)"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat < ?",
+                         (now - self.lease_seconds,))
+            conn.execute("UPDATE jobs SET status = 'failed', finished = ?, error = 'Too many attempts' "
+                         "WHERE status = 'queued' AND attempts >= ?", (now, self.max_attempts))
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', started = COALESCE(started, ?), heartbeat = ?, "
+                             "worker = ?, attempts = attempts + 1 WHERE id = ?", (now, now, worker, row['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return self._to_dict(row) if row is not None else None
+
+    def heartbeat(self, job_id, worker):
+        """Renew the lease; False if the job was cancelled or taken over"""
+        cur = self._conn().execute(
+            "UPDATE jobs SET heartbeat = ? WHERE id = ? AND status = 'running' AND worker = ?",
+            (time.time(), job_id, worker))
+        return cur.rowcount == 1
+
+    def release(self, job_id, worker):
+        """Put a running job back in the queue without counting the attempt (e.g. on shutdown)"""
+        self._conn().execute(
+            "UPDATE jobs SET status = 'queued', worker = NULL, heartbeat = NULL, attempts = attempts - 1 "
+            "WHERE id = ? AND status = 'running' AND worker = ?", (job_id, worker))
+
+    def progress(self, job_id, done_count, worker):
+        """Record progress and renew the lease; False if the job was cancelled or taken over"""
+        cur = self._conn().execute(
+            "UPDATE jobs SET done_count = ?, heartbeat = ? WHERE id = ? AND status = 'running' AND worker = ?",
+            (done_count, time.time(), job_id, worker))
+        return cur.rowcount == 1
+
+    def finish(self, job_id, worker, status='done', error=None):
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ? AND status = 'running' AND worker = ?",
+            (status, time.time(), error, job_id, worker))
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it already ended or does not exist"""
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+            (time.time(), job_id))
+        return cur.rowcount == 1
+
+    def delete(self, job_id):
+        self._conn().execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+        self.discard(job_id)
+
+    def purge(self, older_than_seconds):
+        """Delete finished jobs (and their files) that ended more than older_than_seconds ago"""
+        cutoff = time.time() - older_than_seconds
+        rows = self._conn().execute(
+            "SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND finished < ?", (cutoff,)).fetchall()
+        for row in rows:
+            self.delete(row['id'])
+        return len(rows)
+
+    def get(self, job_id):
+        row = self._conn().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    def list(self, limit=50, status=None):
+        if status:
+            rows = self._conn().execute('SELECT * FROM jobs WHERE status = ? ORDER BY created DESC LIMIT ?',
+                                        (status, limit)).fetchall()
+        else:
+            rows = self._conn().execute('SELECT * FROM jobs ORDER BY created DESC LIMIT ?', (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def counts(self):
+        """Number of jobs per state; empty until the queue has been used"""
+        if not self.db_path.exists():
+            return {}
+        rows = self._conn().execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status').fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    @staticmethod
+    def _to_dict(row):
+        job = dict(row)
+        job['options'] = json.loads(job['options'])
+        return job
+
+
+def read_lines(path, offset=0, limit=None):
+    """Complete lines offset..offset+limit of an NDJSON file, parsed"""
+    out = []
+    try:
+        with open(path, 'rb') as f:
+            for i, line in enumerate(f):
+                if i < offset or not line.endswith(b'\n'):
+                    continue
+                if limit is not None and len(out) >= limit:
+                    break
+                out.append(json.loads(line))
+    except FileNotFoundError:
+        pass
+    return out
+
+
+def completed_lines(path):
+    """Count complete NDJSON lines in path, truncating a partial last line"""
+    try:
+        with open(path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                f.truncate(end)
+            return data.count(b'\n')
+    except FileNotFoundError:
+        return 0
+
+
+class JobRunner:
+    """Worker threads that claim jobs from a JobQueue and process them.
+
+    handler(job, indexes, payloads) receives a chunk of input indexes and
+    their bytes and returns one JSON-serializable result per input.
+    workers bounds how many jobs this process runs at once. Threads start on
+    first start() in each process, so a runner created before fork is safe;
+    stop() makes them hand their jobs back to the queue after the current
+    chunk.
+    """
+
+    def __init__(self, queue, handler, workers=1, chunk_size=16, poll_interval=2.0, retention_seconds=7 * 24 * 3600):
+        self.queue = queue
+        self.handler = handler
+        self.workers = int(workers)
+        self.chunk_size = max(1, int(chunk_size))
+        self.poll_interval = float(poll_interval)
+        self.retention_seconds = float(retention_seconds)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_purge = 0.0
+
+    def start(self):
+        with self._lock:
+            if self.workers <= 0 or self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._stopping = threading.Event()
+            self._threads = []
+            for i in range(self.workers):
+                worker = f'{os.getpid()}-{i}-{uuid.uuid4().hex[:8]}'
+                thread = threading.Thread(target=self._loop, args=(worker,), name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Stop the threads, releasing running jobs after their current chunk"""
+        self._stopping.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def notify(self):
+        """Wake idle workers after a submission"""
+        self._wake.set()
+
+    def _loop(self, worker):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim(worker)
+            except Exception:
+                logger.exception('Error claiming job')
+                job = None
+            if job is None:
+                self._maybe_purge()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self.run(job, worker)
+
+    def _maybe_purge(self):
+        now = time.time()
+        if self.retention_seconds > 0 and now - self._last_purge > 3600:
+            self._last_purge = now
+            try:
+                removed = self.queue.purge(self.retention_seconds)
+                if removed:
+                    logger.info('Purged %d expired jobs', removed)
+            except Exception:
+                logger.exception('Error purging jobs')
+
+    def _heartbeat(self, job_id, worker, finished, lost):
+        """Renew the lease every third of lease_seconds until finished is set"""
+        while not finished.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(job_id, worker):
+                    lost.set()
+                    return
+            except Exception:
+                logger.exception('Error renewing the lease of job %s', job_id)
+
+    def run(self, job, worker):
+        """Process a claimed job from where it left off"""
+        job_id, total = job['id'], job['item_count']
+        results_path = self.queue.results_path(job_id)
+        done = completed_lines(results_path)
+        logger.info('Job %s started (%d/%d done, attempt %d)', job_id, done, total, job['attempts'] + 1)
+        # A chunk may take longer than the lease, so renew it from its own thread
+        finished, lost = threading.Event(), threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, worker, finished, lost),
+                         name=f'job-heartbeat-{job_id[:8]}', daemon=True).start()
+        try:
+            with open(results_path, 'a') as out:
+                while done < total:
+                    if self._stopping.is_set():
+                        self.queue.release(job_id, worker)
+                        logger.info('Job %s released at %d/%d on shutdown', job_id, done, total)
+                        return
+                    indexes = list(range(done, min(done + self.chunk_size, total)))
+                    payloads = [self.queue.input_path(job_id, i).read_bytes() for i in indexes]
+                    lines = ''.join(json.dumps(result) + '\n' for result in self.handler(job, indexes, payloads))
+                    # Only the lease holder may append: after a takeover the file is another runner's
+                    if lost.is_set() or not self.queue.heartbeat(job_id, worker):
+                        logger.info('Job %s stopped: cancelled or lease lost', job_id)
+                        return
+                    out.write(lines)
+                    out.flush()
+                    done += len(indexes)
+                    self.queue.progress(job_id, done, worker)
+        except Exception as e:
+            logger.exception('Job %s failed', job_id)
+            self.queue.finish(job_id, worker, 'failed', str(e))
+            return
+        finally:
+            finished.set()
+        self.queue.finish(job_id, worker, 'done')
+        logger.info('Job %s done (%d items)', job_id, total)
@@ -0,0 +1,167 @@
+"""
+Synthetic load generator for /detect, to exercise overload control.
+
+Sends synthetic thermal frames (benchmark.synthetic_frame) either to a
+running server or, without --url, to the app in-process through the Flask
+test client. With --rate, requests arrive at a fixed rate however slowly
+they are answered (open loop, like a real burst), with at most
+--concurrency outstanding and the rest waiting client-side. Without
+--rate, --concurrency clients send back to back (closed loop).
+
+    OVERLOAD_CONTROL=1 python loadgen.py --rate 40 --concurrency 16 --duration 20
+    python loadgen.py --url http://localhost:5000/detect --rate 10 --duration 60
+
+Every request carries X-Request-Start with its arrival time, so waiting in
+the client queue counts as queueing delay on the server (in-process the
+header is trusted; a running server needs TRUST_REQUEST_START=1). Reports status
+codes, the X-Quality-Tier of the responses and latency percentiles per
+tier as JSON.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+from benchmark import parse_resolutions, synthetic_frame
+
+
+def http_sender(url):
+    """send(body, headers) -> (status, quality tier) against a running server"""
+    def send(body, headers):
+        req = urllib.request.Request(url, data=body, method='POST',
+                                     headers={'Content-Type': 'application/octet-stream', **headers})
+        try:
+            with urllib.request.urlopen(req, timeout=300) as response:
+                response.read()
+                return response.status, response.headers.get('X-Quality-Tier')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('X-Quality-Tier')
+    return send
+
+
+def in_process_sender(path):
+    """send(body, headers) -> (status, quality tier) through the Flask test client"""
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('RESULT_CACHE_MAX_BYTES', '0')
+    # the X-Request-Start headers come from this process
+    os.environ.setdefault('TRUST_REQUEST_START', '1')
+    import server
+    local = threading.local()
+
+    def send(body, headers):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = server.app.test_client()
+        response = client.post(path, data=body, content_type='application/octet-stream', headers=headers)
+        return response.status_code, response.headers.get('X-Quality-Tier')
+    return send
+
+
+def run_load(send, bodies, duration, concurrency, rate=0.0):
+    """Drive send() for duration seconds; returns one (status, tier, latency) per request"""
+    records = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def one(index, arrival):
+        # arrival: perf_counter time the request was due; latency includes client-side waiting
+        wall_arrival = time.time() - (time.perf_counter() - arrival)
+        status, tier = send(bodies[index % len(bodies)], {'X-Request-Start': f't={wall_arrival:.6f}'})
+        with lock:
+            records.append((status, tier, time.perf_counter() - arrival))
+
+    if rate > 0:
+        with ThreadPoolExecutor(concurrency) as pool:
+            start = time.perf_counter()
+            i = 0
+            while True:
+                arrival = start + i / rate
+                if arrival >= deadline:
+                    break
+                time.sleep(max(0.0, arrival - time.perf_counter()))
+                pool.submit(one, i, arrival)
+                i += 1
+    else:
+        def client(worker):
+            i = worker
+            while time.perf_counter() < deadline:
+                one(i, time.perf_counter())
+                i += concurrency
+        threads = [threading.Thread(target=client, args=(w,)) for w in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    return records
+
+
+def summarize(records, seconds):
+    def latency_stats(values):
+        ms = np.array(values) * 1000.0
+        return {'count': len(ms), 'p50_ms': float(np.percentile(ms, 50)),
+                'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99))}
+
+    by_tier = defaultdict(list)
+    for status, tier, latency in records:
+        by_tier[tier or 'none'].append(latency)
+    return {
+        'requests': len(records),
+        'throughput_per_s': len(records) / seconds if seconds > 0 else 0.0,
+        'status': dict(Counter(str(status) for status, _, _ in records)),
+        'tiers': {tier: latency_stats(values) for tier, values in sorted(by_tier.items())},
+        'latency': latency_stats([latency for _, _, latency in records]) if records else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic load generator for /detect")
+    parser.add_argument('--url', help="detect URL of a running server (default: in-process test client)")
+    parser.add_argument('--response-mode', default='full')
+    parser.add_argument('--rate', type=float, default=0.0, help="requests per second (open loop); 0 = closed loop")
+    parser.add_argument('--concurrency', type=int, default=8, help="maximum outstanding requests")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds")
+    parser.add_argument('--resolution', default='640x512')
+    parser.add_argument('--objects', type=int, default=4, help="objects per synthetic frame")
+    parser.add_argument('--frames', type=int, default=8, help="distinct frames to cycle through")
+    parser.add_argument('--output', help="write the summary JSON here")
+    args = parser.parse_args(argv)
+
+    (width, height), = parse_resolutions(args.resolution)
+    bodies = [cv2.imencode('.png', synthetic_frame(width, height, args.objects, seed=i))[1].tobytes()
+              for i in range(args.frames)]
+    if args.url:
+        sep = '&' if '?' in args.url else '?'
+        send = http_sender(f'{args.url}{sep}response={args.response_mode}')
+    else:
+        send = in_process_sender(f'/detect?response={args.response_mode}')
+        send(bodies[0], {})  # load and warm up the model outside the measurement
+
+    start = time.perf_counter()
+    records = run_load(send, bodies, args.duration, args.concurrency, args.rate)
+    report = summarize(records, time.perf_counter() - start)
+    for tier, stats in report['tiers'].items():
+        print(f"{tier:20s} {stats['count']:6d} p50={stats['p50_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms", file=sys.stderr)
+    print(f"status {report['status']}, {report['throughput_per_s']:.1f} req/s", file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text)
+    else:
+        sys.stdout.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Low-overhead request metrics rendered in the Prometheus text format.
+
+Stage timings go into fixed-bucket histograms (one bisect and a few integer
+increments per observation, under a lock). Values are kept per process, so
+with several Gunicorn workers each scrape reflects the worker that served it.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers sub-millisecond stages up to slow full-frame inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram of observed values"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters, gauges and histograms keyed by metric name and label set.
+
+    Labels are passed as keyword arguments, e.g. inc('requests_total',
+    endpoint='detect', status=200).
+    """
+
+    def __init__(self, namespace='thermal'):
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+        self._buckets = {}
+
+    def describe(self, name, help_text, buckets=None):
+        """Set a metric's HELP text and, for histograms, its bucket bounds"""
+        self._help[name] = help_text
+        if buckets is not None:
+            self._buckets[name] = tuple(buckets)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram(self._buckets.get(name, DEFAULT_BUCKETS))
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, stage, timings=None):
+        """Time a block into the stage_duration_seconds histogram.
+
+        If a timings list is given, (stage, seconds) is appended to it so the
+        caller can report per-request durations (e.g. Server-Timing).
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('stage_duration_seconds', elapsed, stage=stage)
+            if timings is not None:
+                timings.append((stage, elapsed))
+
+    def render(self, samples=()):
+        """Prometheus text exposition of everything recorded so far.
+
+        samples is an iterable of (name, kind, labels_dict, value) read at
+        scrape time from other components, e.g. cache counters or model load
+        times; kind is 'counter' or 'gauge'.
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = sorted((key, (list(h.buckets), list(h.counts), h.sum, h.count))
+                                for key, h in self._histograms.items())
+        for name, kind, labels, value in samples:
+            target = counters if kind == 'counter' else gauges
+            target[(name, tuple(sorted(labels.items())))] = value
+
+        lines = []
+        typed = set()
+
+        def header(name, kind):
+            full = f'{self.namespace}_{name}'
+            if full not in typed:
+                typed.add(full)
+                if name in self._help:
+                    lines.append(f'# HELP {full} {self._help[name]}')
+                lines.append(f'# TYPE {full} {kind}')
+            return full
+
+        for (name, labels), value in sorted(counters.items(), key=lambda item: item[0]):
+            full = header(name, 'counter')
+            lines.append(f'{full}{_label_str(labels)} {value}')
+        for (name, labels), value in sorted(gauges.items(), key=lambda item: item[0]):
+            full = header(name, 'gauge')
+            lines.append(f'{full}{_label_str(labels)} {value}')
+        for (name, labels), (buckets, counts, total, count) in histograms:
+            full = header(name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{full}_bucket{_label_str(labels + (("le", repr(float(bound))),))} {cumulative}')
+            lines.append(f'{full}_bucket{_label_str(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{full}_sum{_label_str(labels)} {total}')
+            lines.append(f'{full}_count{_label_str(labels)} {count}')
+        return '\n'.join(lines) + '\n'
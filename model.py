@@ -1,122 +1,546 @@
+import os
+import json
+import time
+import logging
+import threading
+import importlib.metadata
+import importlib.util
 from pathlib import Path
 import numpy as np
 import cv2
-import traceback
 
-try:
+# ultralytics (and torch behind it) is imported only once a .pt/.onnx model
+# is actually loaded through it; checking for it here costs no import
+_HAS_ULTRALYTICS = importlib.util.find_spec('ultralytics') is not None
+
+from onnx_engine import OnnxEngine, _HAS_ONNXRUNTIME, import_onnxruntime
+from blob_engine import BlobDetector
+from detections import Detections
+from ops import nms, tile_origins
+from quantize import AUTO_BUILD, PRECISIONS, build_artifacts, find_artifact
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def _import_yolo():
     from ultralytics import YOLO
-    _HAS_ULTRALYTICS = True
-except Exception:
-    _HAS_ULTRALYTICS = False
+    return YOLO
+
+
+def _stat_stamp(path):
+    """[size, mtime_ns] of path, or None if it does not exist"""
+    try:
+        st = Path(path).stat()
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
 
 
 class ModelWrapper:
-    """Tries to load a YOLO model (Ultralytics .pt) if present. If not, falls back
-    to a simple thermal-blob detector that finds bright regions after CLAHE.
+    """Tries to load a YOLO model (Ultralytics .pt) if present. ONNX weights are
+    run natively through onnxruntime when it is installed. If neither works,
+    falls back to a simple thermal-blob detector that finds bright regions after CLAHE.
+
+    The engine can be forced with engine= or the MODEL_ENGINE environment
+    variable: 'auto' (default), 'yolo', 'onnx' or 'blob'.
+
+    The weights found by scanning the search paths are recorded in a
+    manifest (MODEL_MANIFEST, default <models_dir>/.model_manifest.json; set
+    it empty to disable) together with the size/mtime of every file and
+    directory involved, so later starts skip the scan while nothing changed.
+
+    MODEL_PRECISION selects an optimized or INT8 variant of the weights from
+    the artifact cache (see quantize.py): 'fp32' (default), 'optimized',
+    'int8-dynamic' or 'int8-static'. Missing 'optimized'/'int8-dynamic'
+    artifacts of .onnx weights are built on first load; 'int8-static' and
+    anything derived from .pt weights must be built with quantize.py. Without
+    an artifact the FP32 weights are served.
 
     Methods:
-    - predict(image_ndarray) -> list of {label, score, box(x1,y1,x2,y2)}
+    - predict(image_ndarray) -> Detections (boxes x1,y1,x2,y2, scores, labels;
+      also iterable as {label, score, box} dicts)
+    - predict_batch([image_ndarray, ...]) -> one Detections per image, in order
+    - predict_tiled(image_ndarray) -> detections from overlapping tiles, merged
+    - predict_cascade(image_ndarray, prefilter) -> the model run only on hot
+      regions found by a cascade.HotRegionFilter
     """
 
-    def __init__(self, models_dir: Path = Path('models')):
+    # Minimum confidence for YOLO/ONNX detections
+    CONF_THRESHOLD = float(os.environ.get('MODEL_CONF_THRESHOLD', 0.25))
+
+    def __init__(self, models_dir: Path = Path('models'), engine: str = None, model_path: Path = None,
+                 lazy_sessions: bool = False):
         self.models_dir = Path(models_dir)
+        # Defer building onnxruntime sessions to first use in each process
+        # (a preloading Gunicorn master never runs inference itself)
+        self.lazy_sessions = lazy_sessions
+        # An explicit weights file skips discovery (used by the model registry)
+        self.requested_path = Path(model_path) if model_path else None
+        self.engine_preference = (engine or os.environ.get('MODEL_ENGINE', 'auto')).lower()
+        self.precision_preference = os.environ.get('MODEL_PRECISION', 'fp32').lower()
+        if self.precision_preference not in PRECISIONS:
+            logger.warning("Unknown MODEL_PRECISION '%s'; using fp32", self.precision_preference)
+            self.precision_preference = 'fp32'
+        # Precision actually served, and the weights an artifact was derived from
+        self.precision = 'fp32'
+        self.source_path = None
         self.model = None
+        # An Ultralytics YOLO object keeps per-call predictor state, so
+        # concurrent predict() calls on one model must not interleave
+        self._yolo_lock = threading.Lock()
+        self.engine = None
         self.mode = 'stub'
+        self.blob = BlobDetector(pyramid_max_side=int(os.environ.get('BLOB_PYRAMID_MAX_SIDE', 0)))
+        # Trust callers that say their input is already CLAHE-enhanced
+        self.skip_duplicate_clahe = os.environ.get('BLOB_SKIP_DUPLICATE_CLAHE', '1') == '1'
+        manifest = os.environ.get('MODEL_MANIFEST', str(self.models_dir / '.model_manifest.json'))
+        self.manifest_path = Path(manifest) if manifest else None
+        # Seconds spent loading weights and in warm_up(), reported by /metrics;
+        # discovery and engine imports are broken out for /model-info
+        self.warmup_seconds = None
+        self.discovery = None
+        self.discovery_seconds = 0.0
+        self.engine_import_seconds = 0.0
+        start = time.perf_counter()
         self._load()
+        self.load_seconds = time.perf_counter() - start
+        self._settings = json.dumps(self.settings(), sort_keys=True)
 
-    def _load(self):
-        # Search common locations for model files: provided models_dir, cwd, and package dir
-        search_paths = [self.models_dir, Path.cwd(), Path(__file__).parent]
-        pts = []
-        onnxs = []
-        for p in search_paths:
+    def _search_key(self, search_paths):
+        return os.pathsep.join(str(p) for p in search_paths)
+
+    def _read_manifest(self, search_paths):
+        """The manifest entry for search_paths, or None if missing or stale"""
+        if self.manifest_path is None:
+            return None
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+            entry = manifest['entries'][self._search_key(search_paths)]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if manifest.get('version') != MANIFEST_VERSION:
+            return None
+        # Adding or removing a file changes its directory's mtime
+        for path, stamp in entry['stamps'].items():
+            if _stat_stamp(path) != stamp:
+                return None
+        return entry
+
+    def _choice_settings(self):
+        """Everything besides the weights that decides which engine _select picks"""
+        return {'engine': self.engine_preference, 'precision': self.precision_preference,
+                'onnxruntime': _HAS_ONNXRUNTIME, 'ultralytics': _HAS_ULTRALYTICS}
+
+    def _write_manifest(self, search_paths, pts, onnxs):
+        """Record the scan result and the resolved model choice"""
+        if self.manifest_path is None:
+            return
+        chosen = getattr(self, 'model_path', None) if self.mode != 'blob' else None
+        try:
             try:
-                if p and p.exists():
-                    pts += sorted(p.glob('*.pt'))
-                    onnxs += sorted(p.glob('*.onnx'))
-            except Exception:
-                continue
+                manifest = json.loads(self.manifest_path.read_text())
+                if manifest.get('version') != MANIFEST_VERSION:
+                    raise ValueError
+            except (OSError, ValueError):
+                manifest = {'version': MANIFEST_VERSION, 'entries': {}}
+            # Create the file before stamping the directories and then rewrite it
+            # in place, so writing the manifest does not itself invalidate it
+            self.manifest_path.touch()
+            # Stamp the weights and the directories holding them, not every
+            # search path: models_dir defaults to the working directory, which
+            # the server also writes state to. With no weights at all, any
+            # change to a search path may be new weights.
+            weights = [Path(p) for p in pts + onnxs]
+            holding = [p for p in search_paths if any(w.parent == p for w in weights)] or search_paths
+            paths = [str(p) for p in holding] + [str(p) for p in weights]
+            manifest['entries'][self._search_key(search_paths)] = {
+                'pts': [str(p) for p in pts],
+                'onnxs': [str(p) for p in onnxs],
+                'stamps': {path: _stat_stamp(path) for path in paths},
+                'chosen': {'path': str(chosen) if chosen else None, 'mode': self.mode,
+                           'precision': self.precision,
+                           'source': str(self.source_path) if self.source_path else None,
+                           'settings': self._choice_settings(),
+                           'stamp': _stat_stamp(chosen) if chosen else None},
+            }
+            with open(self.manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=1)
+        except OSError as e:
+            logger.debug('Could not write model manifest %s: %s', self.manifest_path, e)
+
+    def _discover(self, search_paths):
+        """(pts, onnxs, manifest entry or None) for the weights files in
+        search_paths, from the manifest when still valid"""
+        start = time.perf_counter()
+        entry = self._read_manifest(search_paths)
+        if entry is not None:
+            self.discovery = 'manifest'
+            pts, onnxs = [Path(p) for p in entry['pts']], [Path(p) for p in entry['onnxs']]
+        else:
+            self.discovery = 'scan'
+            pts, onnxs = [], []
+            for p in search_paths:
+                try:
+                    if p and p.exists():
+                        pts += sorted(p.glob('*.pt'))
+                        onnxs += sorted(p.glob('*.onnx'))
+                except Exception:
+                    continue
+        self.discovery_seconds = time.perf_counter() - start
+        return pts, onnxs, entry
+
+    def _load_chosen(self, chosen):
+        """Load the model a previous _select picked, skipping its probing;
+        False if the choice no longer applies"""
+        if not chosen or chosen.get('settings') != self._choice_settings():
+            return False
+        path = chosen.get('path')
+        if path is None or _stat_stamp(path) != chosen.get('stamp'):
+            return False
+        if chosen['mode'] == 'onnx':
+            loaded = _HAS_ONNXRUNTIME and self._load_onnx(path)
+        elif chosen['mode'] == 'yolo':
+            loaded = _HAS_ULTRALYTICS and self._load_yolo(path)
+        else:
+            loaded = False
+        if loaded:
+            self.precision = chosen.get('precision', 'fp32')
+            self.source_path = Path(chosen['source']) if chosen.get('source') else None
+        return loaded
+
+    def _import_engine(self, importer):
+        start = time.perf_counter()
+        try:
+            return importer()
+        finally:
+            self.engine_import_seconds += time.perf_counter() - start
+
+    def _load(self):
+        pref = self.engine_preference
+        if self.requested_path is not None:
+            # An explicit file skips discovery
+            if not self.requested_path.is_file():
+                raise FileNotFoundError(f"Model file not found: {self.requested_path}")
+            self.discovery = 'explicit'
+            pts, onnxs = [], []
+            if self.requested_path.suffix == '.pt':
+                pts = [self.requested_path]
+            elif self.requested_path.suffix == '.onnx':
+                onnxs = [self.requested_path]
+            else:
+                raise ValueError(f"Unsupported model file: {self.requested_path}")
+            self._select(pts, onnxs)
+        elif pref == 'blob':
+            self.discovery = 'skipped'
+            self._select([], [])
+        else:
+            # Search common locations for model files: provided models_dir, cwd, and package dir
+            search_paths = [self.models_dir, Path.cwd(), Path(__file__).parent]
+            pts, onnxs, entry = self._discover(search_paths)
+            if entry is None or not self._load_chosen(entry.get('chosen')):
+                self._select(pts, onnxs)
+                self._write_manifest(search_paths, pts, onnxs)
+
+    def _precision_artifact(self, weights):
+        """Cached artifact of weights at the configured precision, built if cheap; None if unavailable"""
+        precision = self.precision_preference
+        try:
+            artifact = find_artifact(weights, precision)
+            if artifact is None and precision in AUTO_BUILD and Path(weights).suffix == '.onnx':
+                start = time.perf_counter()
+                artifact = build_artifacts(weights, [precision])[precision]
+                logger.info("Built %s artifact of %s in %.1fs: %s", precision, weights,
+                            time.perf_counter() - start, artifact)
+            return artifact
+        except Exception:
+            logger.exception('Failed to build %s artifact of %s', precision, weights)
+            return None
+
+    def _load_onnx(self, path):
+        """Load path with onnxruntime; False if that fails"""
+        try:
+            self._import_engine(import_onnxruntime)
+            self.engine = OnnxEngine(
+                path,
+                intra_op_threads=int(os.environ.get('ONNX_INTRA_OP_THREADS', 0)),
+                inter_op_threads=int(os.environ.get('ONNX_INTER_OP_THREADS', 0)),
+                conf=self.CONF_THRESHOLD,
+                lazy=self.lazy_sessions,
+            )
+        except Exception:
+            logger.exception('Failed to load ONNX model with onnxruntime')
+            return False
+        self.mode = 'onnx'
+        self.model_path = Path(path)
+        logger.info("Loaded ONNX model with onnxruntime: %s", path)
+        return True
+
+    def _load_yolo(self, path):
+        """Load path (.pt or .onnx) with Ultralytics; False if that fails"""
+        try:
+            self.model = self._import_engine(_import_yolo)(str(path))
+        except Exception:
+            logger.exception('Failed to load %s with ultralytics', path)
+            return False
+        self.mode = 'yolo'
+        self.model_path = Path(path)
+        logger.info("Loaded Ultralytics YOLO model: %s", path)
+        return True
+
+    def _select(self, pts, onnxs):
+        pref = self.engine_preference
+
+        # An optimized/quantized variant runs on onnxruntime, whatever the source weights
+        if self.precision_preference != 'fp32' and pref in ('auto', 'onnx') and _HAS_ONNXRUNTIME:
+            for chosen in pts[-1:] + onnxs[-1:]:
+                artifact = self._precision_artifact(chosen)
+                if artifact is not None and self._load_onnx(artifact):
+                    self.precision = self.precision_preference
+                    self.source_path = Path(chosen)
+                    return
+            if pts or onnxs:
+                logger.warning("No %s artifact for the model weights (build it with quantize.py); serving fp32",
+                               self.precision_preference)
 
         # Prefer .pt if ultralytics is available
-        if pts:
+        if pts and pref in ('auto', 'yolo'):
             chosen = pts[-1]
             if _HAS_ULTRALYTICS:
-                try:
-                    self.model = YOLO(str(chosen))
-                    self.mode = 'yolo'
-                    self.model_path = Path(chosen)
-                    print(f"Loaded Ultralytics YOLO model: {chosen}")
+                if self._load_yolo(chosen):
                     return
-                except Exception:
-                    print('Failed to load ultralytics .pt model:')
-                    traceback.print_exc()
             else:
                 # ulralytics not installed; store path and notify
                 self.model_path = Path(chosen)
-                print(f"Found .pt model at {chosen} but 'ultralytics' is not installed. Install it to use the .pt model.")
+                logger.warning("Found .pt model at %s but 'ultralytics' is not installed. Install it to use the .pt model.", chosen)
+
+        # Run ONNX natively when onnxruntime is available
+        if onnxs and pref in ('auto', 'onnx') and _HAS_ONNXRUNTIME:
+            if self._load_onnx(onnxs[-1]):
+                return
 
-        # Try ONNX if available and ultralytics can handle it
-        if onnxs:
+        # Otherwise try ONNX through ultralytics
+        if onnxs and pref in ('auto', 'yolo'):
             chosen = onnxs[-1]
             if _HAS_ULTRALYTICS:
-                try:
-                    self.model = YOLO(str(chosen))
-                    self.mode = 'yolo'
-                    self.model_path = Path(chosen)
-                    print(f"Loaded Ultralytics model from ONNX: {chosen}")
+                if self._load_yolo(chosen):
                     return
-                except Exception:
-                    print('Failed to load ultralytics ONNX model:')
-                    traceback.print_exc()
             else:
-                # leave for possible onnxruntime support in future
+                # onnxruntime missing or failed; store path and notify
                 self.model_path = Path(chosen)
-                print(f"Found ONNX model at {chosen} but 'ultralytics' is not installed. Consider installing ultralytics or adding ONNX runtime support.")
+                logger.warning("Found ONNX model at %s but neither 'onnxruntime' nor 'ultralytics' could load it.", chosen)
 
         # fallback stub detector
         self.mode = 'blob'
-        print('No usable YOLO weights found or ultralytics not available; using blob detector fallback.')
+        self.engine = None
+        logger.info('No usable YOLO weights found or ultralytics not available; using blob detector fallback.')
 
-    def predict(self, image: np.ndarray):
+    def predict(self, image: np.ndarray, enhanced: bool = False, input_size: int = None):
         # image expected BGR 3-channel numpy array
+        return self.predict_batch([image], enhanced=enhanced, input_size=input_size)[0]
+
+    def predict_batch(self, images, batch_size: int = 16, enhanced: bool = False, input_size: int = None):
+        """Run detection over a list of images as real batches.
+
+        Returns one detection list per input image, in input order.
+        Images may be BGR or single-channel; each engine converts only if it
+        has to (blob and ONNX work on grayscale directly).
+        enhanced=True tells the blob engine the images were already
+        CLAHE-enhanced (imaging.preprocess_thermal_image) so it skips its own pass.
+        input_size: run inference at this (smaller) size instead of the
+        model's, where supports_input_size(); boxes are still in frame pixels.
+        """
+        images = list(images)
+        if not images:
+            return []
         if self.mode == 'yolo' and self.model is not None:
-            # Ultralytics model returns results; call with numpy image
-            preds = self.model.predict(source=[image], conf=0.25, device='cpu')
-            # preds is list with Results for each image
-            out = []
-            if preds:
-                res = preds[0]
-                boxes = getattr(res, 'boxes', None)
-                if boxes is not None:
-                    # boxes.xyxy, boxes.conf, boxes.cls
-                    xyxy = boxes.xyxy.cpu().numpy() if hasattr(boxes.xyxy, 'cpu') else boxes.xyxy.numpy()
-                    conf = boxes.conf.cpu().numpy() if hasattr(boxes.conf, 'cpu') else boxes.conf.numpy()
-                    cls = boxes.cls.cpu().numpy() if hasattr(boxes.cls, 'cpu') else boxes.cls.numpy()
-                    for b, c, cl in zip(xyxy, conf, cls):
-                        x1, y1, x2, y2 = map(float, b)
-                        out.append({'label': str(int(cl)), 'score': float(c), 'box': [x1, y1, x2, y2]})
-            return out
-        else:
-            # simple blob detector: threshold on CLAHE-enhanced grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
-            clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(gray)
-            # adaptive threshold
-            m, s = enhanced.mean(), enhanced.std()
-            th = min(240, int(m + max(30, 1.2 * s)))
-            _, bw = cv2.threshold(enhanced, th, 255, cv2.THRESH_BINARY)
-            # morphological clean
-            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5,5))
-            bw = cv2.morphologyEx(bw, cv2.MORPH_OPEN, kernel, iterations=1)
-            contours, _ = cv2.findContours(bw, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            # Ultralytics expects 3-channel BGR arrays
+            images = [cv2.cvtColor(img, cv2.COLOR_GRAY2BGR) if img.ndim == 2 else img for img in images]
             out = []
-            h, w = enhanced.shape[:2]
-            for cnt in contours:
-                x, y, ww, hh = cv2.boundingRect(cnt)
-                area = ww*hh
-                if area < 100:  # skip tiny
-                    continue
-                x1, y1, x2, y2 = x, y, x+ww, y+hh
-                score = min(0.99, float(area) / (w*h))
-                out.append({'label': 'Person', 'score': float(score), 'box': [x1, y1, x2, y2]})
+            for start in range(0, len(images), batch_size):
+                chunk = images[start:start + batch_size]
+                # Ultralytics stacks a list source into a single forward pass
+                kwargs = {'imgsz': int(input_size)} if input_size else {}
+                with self._yolo_lock:
+                    preds = self.model.predict(source=chunk, conf=self.CONF_THRESHOLD, device='cpu', **kwargs)
+                results = list(preds) if preds else []
+                for i in range(len(chunk)):
+                    out.append(self._results_to_detections(results[i]) if i < len(results) else Detections())
             return out
+        if self.mode == 'onnx' and self.engine is not None:
+            return self.engine.predict_batch(images, batch_size=batch_size, input_size=input_size)
+        return self.blob.detect_batch(images, enhanced=enhanced and self.skip_duplicate_clahe,
+                                      max_side=input_size or 0)
+
+    def supports_input_size(self):
+        """Whether predict(input_size=...) actually runs a smaller inference"""
+        if self.mode == 'onnx' and self.engine is not None:
+            return self.engine.supports_input_size()
+        return True
+
+    def predict_fallback(self, image: np.ndarray, enhanced: bool = False):
+        """The blob engine on image whatever model is loaded (a cheap fallback under overload)"""
+        return self.blob.detect(image, enhanced=enhanced and self.skip_duplicate_clahe)
+
+    def predict_tiled(self, image: np.ndarray, tile_size: int = 640, overlap: float = 0.2,
+                      max_tiles_per_batch: int = 16, merge_threshold: float = 0.6, enhanced: bool = False):
+        """Detect on overlapping tiles of a large frame at native resolution.
+
+        Tiles are views into the frame and run through predict_batch in
+        batches of max_tiles_per_batch. Boxes are shifted back to frame
+        coordinates and duplicates across seams are merged with class-aware
+        NMS using intersection-over-smaller-area.
+        """
+        h, w = image.shape[:2]
+        if h <= tile_size and w <= tile_size:
+            return self.predict(image, enhanced=enhanced)
+        origins = [(x, y) for y in tile_origins(h, tile_size, overlap) for x in tile_origins(w, tile_size, overlap)]
+        tiles = [image[y:y + tile_size, x:x + tile_size] for x, y in origins]
+
+        tile_detections = []
+        for start in range(0, len(tiles), max_tiles_per_batch):
+            chunk = tiles[start:start + max_tiles_per_batch]
+            tile_detections += self.predict_batch(chunk, batch_size=len(chunk), enhanced=enhanced)
+
+        counts = [len(dets) for dets in tile_detections]
+        if not sum(counts):
+            return Detections()
+        flat = Detections.concatenate(tile_detections)
+        boxes = flat.boxes.astype(np.float32)
+        boxes += np.repeat(np.array(origins, dtype=np.float32), counts, axis=0)[:, [0, 1, 0, 1]]
+        scores = flat.scores.astype(np.float32)
+        _, classes = np.unique(flat.labels.astype(str), return_inverse=True)
+
+        keep = nms(boxes, scores, merge_threshold, classes=classes, max_det=len(flat), metric='ios')
+        return Detections(boxes[keep], scores[keep], flat.labels[keep])
+
+    def predict_cascade(self, image: np.ndarray, prefilter, enhanced: bool = False, sensitivity: float = None):
+        return self.predict_cascade_batch([image], prefilter, enhanced=enhanced, sensitivity=sensitivity)[0]
+
+    def predict_cascade_batch(self, images, prefilter, batch_size: int = 16, enhanced: bool = False,
+                              sensitivity: float = None):
+        """Two-stage detection: the full model only sees what prefilter lets through.
+
+        Frames without candidate hot regions get no detections and no
+        inference. The others contribute crops around their candidates (or
+        the whole frame), and the crops of all images run through
+        predict_batch together. Crops never overlap, so their detections
+        are shifted back to frame coordinates without any merging.
+        In blob mode this is plain predict_batch: the blob engine is no more
+        expensive than the pre-filter.
+        """
+        images = list(images)
+        if self.mode == 'blob':
+            return self.predict_batch(images, batch_size=batch_size, enhanced=enhanced)
+        owners, origins, inputs = [], [], []
+        for i, image in enumerate(images):
+            crops = prefilter.plan(image, sensitivity)
+            if crops is None:
+                crops = [(0, 0, image.shape[1], image.shape[0])]
+            for x1, y1, x2, y2 in crops:
+                owners.append(i)
+                origins.append((x1, y1))
+                inputs.append(image[y1:y2, x1:x2])
+        parts = [[] for _ in images]
+        if inputs:
+            for i, (x, y), dets in zip(owners, origins, self.predict_batch(inputs, batch_size=batch_size, enhanced=enhanced)):
+                if len(dets) and (x or y):
+                    dets = Detections(dets.boxes + np.array([x, y, x, y], dtype=np.float64), dets.scores, dets.labels)
+                parts[i].append(dets)
+        return [Detections.concatenate(p) for p in parts]
+
+    def warm_up(self, shape=(512, 640, 3)):
+        """Run one inference on a synthetic frame so lazy allocations happen now"""
+        frame = np.zeros(shape, dtype=np.uint8)
+        frame[shape[0] // 3: shape[0] // 2, shape[1] // 3: shape[1] // 2] = 255
+        start = time.perf_counter()
+        self.predict(frame)
+        self.warmup_seconds = time.perf_counter() - start
+
+    def after_fork(self):
+        """Re-create per-process state that must not be shared across fork().
+
+        Ultralytics/torch weights are left alone so workers share them
+        copy-on-write with the parent; an onnxruntime session inherited from
+        the parent is dropped and the worker builds its own on first use.
+        """
+        if self.mode == 'onnx' and self.engine is not None:
+            self.engine.reload()
+
+    def settings(self):
+        """Every setting besides the weights that changes the detections"""
+        package = {'onnx': 'onnxruntime', 'yolo': 'ultralytics'}.get(self.mode)
+        try:
+            engine_version = importlib.metadata.version(package) if package else None
+        except importlib.metadata.PackageNotFoundError:
+            engine_version = None
+        return {
+            'conf': self.CONF_THRESHOLD,
+            'precision': self.precision,
+            'engine_version': engine_version,
+            'opencv': cv2.__version__,
+            'blob_min_box_area': self.blob.min_box_area,
+            'blob_pyramid_max_side': self.blob.pyramid_max_side,
+            'blob_skip_duplicate_clahe': self.skip_duplicate_clahe,
+        }
+
+    def identity(self):
+        """String identifying the loaded weights and settings (for result caching)"""
+        path = getattr(self, 'model_path', None) if self.mode != 'blob' else None
+        stamp = ''
+        if path is not None:
+            try:
+                st = Path(path).stat()
+                stamp = f'{st.st_size}:{st.st_mtime_ns}'
+            except OSError:
+                pass
+        return f'{self.mode}:{path}:{stamp}:{self._settings}'
+
+    def memory_bytes(self):
+        """Approximate memory held by the weights (parameters + buffers, or ONNX file size)"""
+        if self.mode == 'yolo' and self.model is not None:
+            try:
+                net = self.model.model
+                tensors = list(net.parameters()) + list(net.buffers())
+                return int(sum(t.numel() * t.element_size() for t in tensors))
+            except Exception:
+                pass
+        if self.mode in ('yolo', 'onnx') and getattr(self, 'model_path', None) is not None:
+            try:
+                return Path(self.model_path).stat().st_size
+            except OSError:
+                pass
+        return 0
+
+    def startup_info(self):
+        """Cold-start breakdown of this model (seconds) for /model-info"""
+        return {
+            'discovery': self.discovery,
+            'discovery_seconds': self.discovery_seconds,
+            'engine_import_seconds': self.engine_import_seconds,
+            'load_seconds': self.load_seconds,
+            'warmup_seconds': self.warmup_seconds,
+        }
+
+    def engine_info(self):
+        """Describe the active inference engine and its options"""
+        if self.mode == 'onnx' and self.engine is not None:
+            return {'engine': 'onnxruntime', 'precision': self.precision,
+                    'source_path': str(self.source_path) if self.source_path else None,
+                    'session_options': self.engine.session_info()}
+        if self.mode == 'yolo' and self.model is not None:
+            return {'engine': 'ultralytics', 'precision': self.precision,
+                    'session_options': {'device': 'cpu', 'conf': self.CONF_THRESHOLD}}
+        return {'engine': 'blob', 'session_options': {}}
+
+    @staticmethod
+    def _results_to_detections(res):
+        boxes = getattr(res, 'boxes', None)
+        if boxes is None:
+            return Detections()
+        # boxes.xyxy, boxes.conf, boxes.cls
+        xyxy = boxes.xyxy.cpu().numpy() if hasattr(boxes.xyxy, 'cpu') else boxes.xyxy.numpy()
+        conf = boxes.conf.cpu().numpy() if hasattr(boxes.conf, 'cpu') else boxes.conf.numpy()
+        cls = boxes.cls.cpu().numpy() if hasattr(boxes.cls, 'cpu') else boxes.cls.numpy()
+        return Detections(xyxy, conf, [str(int(c)) for c in cls.tolist()])
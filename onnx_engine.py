@@ -0,0 +1,189 @@
+"""
+Native ONNX Runtime engine for YOLOv8-style exported models.
+Runs without ultralytics/torch: letterbox preprocessing, output decoding and
+non-max suppression are done here with NumPy.
+"""
+
+import importlib.util
+import os
+import threading
+from pathlib import Path
+import numpy as np
+
+from detections import Detections
+from ops import letterbox, xywh2xyxy, nms
+
+# onnxruntime is imported on first use, so processes that end up in blob or
+# ultralytics mode never pay for loading it
+_HAS_ONNXRUNTIME = importlib.util.find_spec('onnxruntime') is not None
+ort = None
+
+
+def import_onnxruntime():
+    """Import onnxruntime once and return the module"""
+    global ort
+    if ort is None:
+        import onnxruntime
+        ort = onnxruntime
+    return ort
+
+
+class OnnxEngine:
+    """Wraps an onnxruntime InferenceSession for a YOLOv8 detection head.
+
+    The model output is expected as (batch, 4 + num_classes, anchors) with
+    boxes in center-x, center-y, width, height of the letterboxed input.
+    """
+
+    def __init__(self, model_path, intra_op_threads=0, inter_op_threads=0,
+                 conf=0.25, iou=0.45, max_det=300, lazy=False):
+        if not _HAS_ONNXRUNTIME:
+            raise RuntimeError("onnxruntime is not installed")
+        import_onnxruntime()
+        self.model_path = Path(model_path)
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = int(intra_op_threads)
+        if inter_op_threads:
+            options.inter_op_num_threads = int(inter_op_threads)
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session_options = options
+
+        # Filled in from the session's input when it is created
+        self.input_name = None
+        self.fixed_batch = None
+        self.input_size = (640, 640)
+        self.dynamic_size = False
+
+        self._session = None
+        self._session_pid = None
+        self._session_lock = threading.Lock()
+        # lazy (a preloading Gunicorn master): only read the weights here, so
+        # workers share the bytes copy-on-write and each builds its own
+        # session on first use instead of the master holding an extra one
+        self._model_bytes = self.model_path.read_bytes() if lazy else None
+        if not lazy:
+            self._ensure_session()
+
+    @property
+    def session(self):
+        """This process's InferenceSession, created on first use"""
+        return self._ensure_session()
+
+    def _ensure_session(self):
+        # onnxruntime thread pools do not survive fork, so a session built
+        # in another process is never reused
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._session_lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self._create_session()
+                    self._session_pid = pid
+        return self._session
+
+    def _create_session(self):
+        source = self._model_bytes if self._model_bytes is not None else str(self.model_path)
+        session = ort.InferenceSession(source, sess_options=self.session_options,
+                                       providers=['CPUExecutionProvider'])
+        inp = session.get_inputs()[0]
+        self.input_name = inp.name
+        shape = inp.shape  # [N, 3, H, W], any dim may be symbolic
+        self.fixed_batch = shape[0] if isinstance(shape[0], int) else None
+        h = shape[2] if isinstance(shape[2], int) else 640
+        w = shape[3] if isinstance(shape[3], int) else 640
+        self.input_size = (h, w)
+        # exported with dynamic H/W: predict_batch can letterbox to a smaller size
+        self.dynamic_size = not (isinstance(shape[2], int) and isinstance(shape[3], int))
+        return session
+
+    def reload(self):
+        """Drop the session so the next use builds a fresh one, e.g. after fork()"""
+        with self._session_lock:
+            self._session = None
+
+    def supports_input_size(self):
+        """Whether the model was exported with dynamic H/W"""
+        self._ensure_session()
+        return self.dynamic_size
+
+    def session_info(self):
+        """Describe the session configuration for /model-info"""
+        options = self.session_options
+        session = self._ensure_session()
+        return {
+            'providers': session.get_providers(),
+            'intra_op_num_threads': options.intra_op_num_threads,
+            'inter_op_num_threads': options.inter_op_num_threads,
+            'execution_mode': str(options.execution_mode),
+            'graph_optimization_level': str(options.graph_optimization_level),
+            'input_name': self.input_name,
+            'input_size': list(self.input_size),
+            'dynamic_size': self.dynamic_size,
+            'fixed_batch': self.fixed_batch,
+        }
+
+    def _preprocess(self, image, input_size=None):
+        padded, ratio, pad = letterbox(image, input_size or self.input_size)
+        if padded.ndim == 2:
+            # grayscale: every RGB channel is the same plane, so scale it once
+            # and broadcast instead of expanding to 3 channels first
+            plane = padded.astype(np.float32)
+            plane /= 255.0
+            return np.broadcast_to(plane, (3,) + plane.shape), ratio, pad
+        # BGR HWC uint8 -> RGB CHW float32 in [0, 1]
+        tensor = padded[:, :, ::-1].transpose(2, 0, 1)
+        return np.ascontiguousarray(tensor, dtype=np.float32) / 255.0, ratio, pad
+
+    def _decode(self, pred, ratio, pad, image_shape):
+        # pred: (4 + nc, anchors) -> (anchors, 4 + nc)
+        pred = pred.T
+        class_scores = pred[:, 4:]
+        cls = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(cls)), cls]
+        mask = scores > self.conf
+        if not mask.any():
+            return Detections()
+        boxes = xywh2xyxy(pred[mask, :4])
+        scores = scores[mask]
+        cls = cls[mask]
+
+        keep = nms(boxes, scores, self.iou, classes=cls, max_det=self.max_det)
+        boxes, scores, cls = boxes[keep], scores[keep], cls[keep]
+
+        # undo letterbox and clip to the original frame
+        h, w = image_shape[:2]
+        boxes[:, [0, 2]] = ((boxes[:, [0, 2]] - pad[0]) / ratio).clip(0, w)
+        boxes[:, [1, 3]] = ((boxes[:, [1, 3]] - pad[1]) / ratio).clip(0, h)
+        return Detections(boxes, scores, [str(c) for c in cls.tolist()])
+
+    def predict_batch(self, images, batch_size=16, input_size=None):
+        """Run the session over a list of images, returning detections per image.
+
+        input_size: with a dynamic-size model, letterbox to this (square)
+        size instead, rounded up to the stride of 32; ignored otherwise.
+        """
+        session = self._ensure_session()
+        if self.fixed_batch:
+            batch_size = self.fixed_batch
+        size = self.input_size
+        if input_size and self.dynamic_size:
+            side = -(-int(input_size) // 32) * 32
+            size = (min(side, self.input_size[0]), min(side, self.input_size[1]))
+        out = []
+        for start in range(0, len(images), batch_size):
+            chunk = images[start:start + batch_size]
+            prepared = [self._preprocess(img, size) for img in chunk]
+            blob = np.stack([p[0] for p in prepared])
+            if self.fixed_batch and len(chunk) < self.fixed_batch:
+                # pad a short final chunk up to the exported batch size
+                filler = np.zeros((self.fixed_batch - len(chunk),) + blob.shape[1:], dtype=blob.dtype)
+                blob = np.concatenate([blob, filler])
+            preds = session.run(None, {self.input_name: blob})[0]
+            for (_, ratio, pad), pred, img in zip(prepared, preds, chunk):
+                out.append(self._decode(pred, ratio, pad, img.shape))
+        return out
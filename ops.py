@@ -0,0 +1,108 @@
+"""
+Shared NumPy/OpenCV helpers for the detection engines:
+letterbox resizing, box format conversion, non-max suppression and the
+per-thread CLAHE object used for thermal contrast enhancement.
+"""
+
+import threading
+
+import numpy as np
+import cv2
+
+_local = threading.local()
+
+
+def thread_clahe():
+    """CLAHE (clip 3.0, 8x8 tiles) cached per thread; cv2 CLAHE objects are not thread-safe"""
+    clahe = getattr(_local, 'clahe', None)
+    if clahe is None:
+        clahe = _local.clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+    return clahe
+
+
+def letterbox(image, new_shape=(640, 640), color=(114, 114, 114)):
+    """Resize an image to new_shape keeping aspect ratio, padding the rest.
+
+    Returns (padded_image, ratio, (pad_x, pad_y)) so boxes can be mapped back
+    with (box - pad) / ratio.
+    """
+    h, w = image.shape[:2]
+    new_h, new_w = new_shape
+    ratio = min(new_h / h, new_w / w)
+    resized_w, resized_h = int(round(w * ratio)), int(round(h * ratio))
+    pad_x = (new_w - resized_w) / 2
+    pad_y = (new_h - resized_h) / 2
+
+    if (w, h) != (resized_w, resized_h):
+        image = cv2.resize(image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return padded, ratio, (left, top)
+
+
+def xywh2xyxy(boxes):
+    """Convert Nx4 center-x, center-y, width, height boxes to x1, y1, x2, y2"""
+    out = np.empty_like(boxes)
+    half_w = boxes[:, 2] / 2
+    half_h = boxes[:, 3] / 2
+    out[:, 0] = boxes[:, 0] - half_w
+    out[:, 1] = boxes[:, 1] - half_h
+    out[:, 2] = boxes[:, 0] + half_w
+    out[:, 3] = boxes[:, 1] + half_h
+    return out
+
+
+def box_iou(box, boxes, metric='iou'):
+    """Overlap between one x1,y1,x2,y2 box and an Nx4 array of boxes.
+
+    metric='iou' is intersection over union; 'ios' is intersection over the
+    smaller of the two areas, which also catches a partial box cut off at a
+    tile seam lying inside the full box.
+    """
+    xx1 = np.maximum(box[0], boxes[:, 0])
+    yy1 = np.maximum(box[1], boxes[:, 1])
+    xx2 = np.minimum(box[2], boxes[:, 2])
+    yy2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    if metric == 'ios':
+        return inter / np.maximum(np.minimum(area, areas), 1e-9)
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def nms(boxes, scores, iou_threshold=0.45, classes=None, max_det=300, metric='iou'):
+    """Greedy non-max suppression over Nx4 x1,y1,x2,y2 boxes.
+
+    If classes is given, suppression only happens within a class (boxes are
+    offset per class so different classes never overlap).
+    metric selects the overlap measure (see box_iou).
+    Returns the indices of the kept boxes, highest score first.
+    """
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int64)
+    boxes = np.asarray(boxes, dtype=np.float32)
+    if classes is not None:
+        offset = (np.asarray(classes, dtype=np.float32) * (boxes.max() + 1))[:, None]
+        boxes = boxes + offset
+    order = np.argsort(-np.asarray(scores))
+    keep = []
+    while order.size and len(keep) < max_det:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = box_iou(boxes[i], boxes[order[1:]], metric)
+        order = order[1:][ious <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def tile_origins(length, tile, overlap):
+    """Start offsets of tiles of size tile covering length with the given overlap fraction"""
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    starts = list(range(0, length - tile, stride))
+    starts.append(length - tile)
+    return starts
@@ -0,0 +1,138 @@
+"""
+Overload controller: trades response quality for latency under bursts.
+
+Each admitted request gets a quality tier from the current pressure, the
+largest of
+- in-flight requests / max_inflight (needs a threaded worker to exceed 1),
+- recent predict latency / target_latency (an EWMA that decays while idle),
+- time requests waited before reaching the app / target_queue: an EWMA
+  of the waits reported by the proxy (X-Request-Start), each clipped, so
+  one request's wait never sets the tier by itself.
+Pressure at or above thresholds[i] selects tier i + 1 of TIERS. Tiers go
+up as soon as pressure rises, and only come down once it has stayed lower
+for cooldown seconds, so the server does not flap between tiers.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Served quality, best first; every tier also applies the ones before it
+TIERS = ('full', 'no_annotation', 'reduced_resolution', 'blob', 'reject')
+REJECT = TIERS.index('reject')
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed at the reject tier"""
+
+
+class OverloadController:
+    """Chooses a TIERS index per request from in-flight count, latency and queue wait.
+
+    thresholds: pressures at which no_annotation, reduced_resolution, blob
+    and reject start (ascending).
+    alpha: weight of the newest predict latency or queue wait in its EWMA;
+    the EWMAs halve for every cooldown seconds without observations.
+    """
+
+    def __init__(self, max_inflight=4, target_latency=1.0, target_queue=2.0,
+                 thresholds=(1.0, 1.5, 2.0, 3.0), cooldown=5.0, alpha=0.2):
+        if len(thresholds) != len(TIERS) - 1 or list(thresholds) != sorted(thresholds):
+            raise ValueError(f"thresholds must be {len(TIERS) - 1} ascending values")
+        self.max_inflight = max(1, int(max_inflight))
+        self.target_latency = float(target_latency)
+        self.target_queue = float(target_queue)
+        self.thresholds = tuple(float(t) for t in thresholds)
+        self.cooldown = float(cooldown)
+        self.alpha = float(alpha)
+        self._lock = threading.Lock()
+        self.inflight = 0
+        self.latency = 0.0
+        self._latency_at = 0.0
+        self.queue_wait = 0.0
+        self._queue_at = 0.0
+        self.tier = 0
+        self._raised_at = 0.0
+        self.pressure = 0.0
+        self.served = [0] * len(TIERS)
+
+    def _decayed(self, value, at, now):
+        if not value or self.cooldown <= 0:
+            return value
+        return value * math.pow(0.5, (now - at) / self.cooldown)
+
+    def _decayed_latency(self, now):
+        return self._decayed(self.latency, self._latency_at, now)
+
+    def _decayed_queue_wait(self, now):
+        return self._decayed(self.queue_wait, self._queue_at, now)
+
+    def observe_latency(self, seconds):
+        """Feed one predict-stage duration"""
+        with self._lock:
+            now = time.monotonic()
+            current = self._decayed_latency(now)
+            self.latency = seconds if not current else (1 - self.alpha) * current + self.alpha * seconds
+            self._latency_at = now
+
+    def _observe_queue_wait(self, now, seconds):
+        # Clipped to one target_queue past the reject threshold: sustained
+        # waits can still reach it, but a single (possibly bogus) wait moves
+        # the pressure by at most alpha * (thresholds[-1] + 1), 0.8 by default
+        seconds = min(max(0.0, float(seconds)), (self.thresholds[-1] + 1) * self.target_queue)
+        self.queue_wait = (1 - self.alpha) * self._decayed_queue_wait(now) + self.alpha * seconds
+        self._queue_at = now
+
+    def choose(self, queue_wait=None):
+        """Tier for a new request (without admitting it)"""
+        with self._lock:
+            return self._choose(time.monotonic(), queue_wait)
+
+    def _choose(self, now, queue_wait):
+        if queue_wait is not None:
+            self._observe_queue_wait(now, queue_wait)
+        self.pressure = max(self.inflight / self.max_inflight,
+                            self._decayed_latency(now) / self.target_latency if self.target_latency > 0 else 0.0,
+                            self._decayed_queue_wait(now) / self.target_queue if self.target_queue > 0 else 0.0)
+        wanted = sum(self.pressure >= t for t in self.thresholds)
+        # _raised_at: last time pressure called for at least the current tier
+        if wanted >= self.tier:
+            self.tier = wanted
+            self._raised_at = now
+        elif now - self._raised_at >= self.cooldown:
+            self.tier = wanted
+            self._raised_at = now
+        return self.tier
+
+    @contextmanager
+    def admit(self, queue_wait=None):
+        """Hold an in-flight slot for a request, yielding its tier.
+
+        queue_wait: how long this request waited before reaching the app,
+        or None when that is unknown.
+        At the reject tier raises Overloaded instead, without taking a slot.
+        """
+        with self._lock:
+            tier = self._choose(time.monotonic(), queue_wait)
+            self.served[tier] += 1
+            if tier == REJECT:
+                raise Overloaded(f"Overloaded (pressure {self.pressure:.2f})")
+            self.inflight += 1
+        try:
+            yield tier
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            return {
+                'tier': TIERS[self.tier],
+                'pressure': self.pressure,
+                'inflight': self.inflight,
+                'predict_latency_seconds': self._decayed_latency(now),
+                'queue_wait_seconds': self._decayed_queue_wait(now),
+                'served': dict(zip(TIERS, self.served)),
+            }
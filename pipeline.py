@@ -0,0 +1,92 @@
+"""
+Bounded thread pool for the CPU-heavy OpenCV stages of a request
+(decode, CLAHE, drawing, PNG encoding). OpenCV releases the GIL in these
+calls, so running them on a pool lets one worker keep the model busy while
+other requests decode and encode.
+"""
+
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class PoolSaturated(Exception):
+    """Raised when a request cannot be admitted because the pipeline is full"""
+
+
+class StagePool:
+    """Runs pipeline stages on a bounded thread pool with request admission control.
+
+    max_workers=0 runs every stage inline on the calling thread and admits
+    every request, which is the plain synchronous behaviour.
+    max_inflight bounds how many requests may be inside the pipeline at once;
+    admit() raises PoolSaturated instead of letting a queue grow unbounded.
+    """
+
+    def __init__(self, max_workers=0, max_inflight=0):
+        self.max_workers = int(max_workers)
+        self.max_inflight = int(max_inflight) or max(1, self.max_workers) * 4
+        self._slots = threading.BoundedSemaphore(self.max_inflight)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self.inflight = 0
+        self.rejected = 0
+
+    @property
+    def threaded(self):
+        return self.max_workers > 0
+
+    def _get_executor(self):
+        # created lazily and per process so the pool is fork-safe
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='cpu-stage')
+            return self._executor
+
+    @contextmanager
+    def admit(self):
+        """Hold a pipeline slot for the duration of a request"""
+        if not self.threaded:
+            yield
+            return
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated(f"{self.max_inflight} requests already in the pipeline")
+        with self._lock:
+            self.inflight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+            self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule a stage; returns a Future"""
+        if not self.threaded:
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        return self._get_executor().submit(fn, *args, **kwargs)
+
+    def run(self, fn, *args, **kwargs):
+        """Run a stage and wait for its result"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'threaded': self.threaded,
+                'max_workers': self.max_workers,
+                'max_inflight': self.max_inflight,
+                'inflight': self.inflight,
+                'rejected': self.rejected,
+            }
@@ -0,0 +1,396 @@
+"""
+CPU-optimized model artifacts: graph-optimized and INT8-quantized ONNX.
+
+Converts a weights file once into the variants in PRECISIONS and caches
+them on disk under <cache dir>/<sha256 of the weights, 16 hex>/<precision>.onnx,
+so a changed weights file never reuses stale artifacts:
+
+- optimized: onnxruntime's extended graph optimizations saved offline
+- int8-dynamic: weights quantized to INT8, activations quantized at run time
+- int8-static: weights and activations quantized (QDQ), with activation
+  ranges calibrated on a folder of thermal frames preprocessed exactly as
+  the server does (grayscale, CLAHE, letterbox)
+
+The cache dir is MODEL_ARTIFACT_DIR, default .model_artifacts next to the
+weights; its digests.json remembers each weights file's hash by path, size
+and mtime, so unchanged weights are not re-read on every load.
+
+.pt weights are exported to ONNX first (needs ultralytics); the resulting
+artifacts then run on onnxruntime alone. ModelWrapper serves the variant
+named by MODEL_PRECISION (see model.py).
+
+    python quantize.py best.onnx --calibration-dir frames/ --report report.json
+
+The report compares every variant against FP32 on --eval-dir (default: the
+calibration frames): latency per frame and how well its detections match
+the FP32 ones (precision, recall, mean IoU, score error).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+from ops import box_iou, thread_clahe
+
+PRECISIONS = ('fp32', 'optimized', 'int8-dynamic', 'int8-static')
+# Variants that need nothing but the weights, so ModelWrapper may build them on demand
+AUTO_BUILD = ('optimized', 'int8-dynamic')
+
+
+# Digests by (path, size, mtime_ns), so each model load does not re-read the weights
+_digests = {}
+_digests_lock = threading.Lock()
+
+
+def _artifact_root(weights, cache_dir=None):
+    return Path(cache_dir or os.environ.get('MODEL_ARTIFACT_DIR') or Path(weights).parent / '.model_artifacts')
+
+
+def weights_hash(path, cache_dir=None):
+    """sha256 hex digest of a weights file.
+
+    Remembered by (path, size, mtime_ns) in this process and in digests.json
+    under the artifact cache root, so unchanged weights are hashed once.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_size, stat.st_mtime_ns)
+    with _digests_lock:
+        if key in _digests:
+            return _digests[key]
+    index_path = _artifact_root(path, cache_dir) / 'digests.json'
+    try:
+        index = json.loads(index_path.read_text())
+    except (OSError, ValueError):
+        index = {}
+    entry = index.get(key[0])
+    if entry and (entry.get('size'), entry.get('mtime_ns')) == key[1:]:
+        hexdigest = entry['sha256']
+    else:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        hexdigest = digest.hexdigest()
+        index[key[0]] = {'size': key[1], 'mtime_ns': key[2], 'sha256': hexdigest}
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(suffix='.json', dir=index_path.parent)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f, indent=2)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, index_path)
+        except OSError:
+            # read-only cache: the in-process entry still saves repeated hashing
+            pass
+    with _digests_lock:
+        _digests[key] = hexdigest
+    return hexdigest
+
+
+def artifact_dir(weights, cache_dir=None, digest=None):
+    return _artifact_root(weights, cache_dir) / (digest or weights_hash(weights, cache_dir))[:16]
+
+
+def find_artifact(weights, precision, cache_dir=None):
+    """Cached artifact of weights at precision, or None"""
+    path = artifact_dir(weights, cache_dir) / f'{precision}.onnx'
+    return path if path.is_file() else None
+
+
+def _replace_atomically(build, target):
+    """Run build(tmp_path) and move the result to target, so readers never see partial files"""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix='.onnx', dir=target.parent)
+    os.close(fd)
+    try:
+        build(Path(tmp))
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    return target
+
+
+def fp32_onnx(weights, directory):
+    """The FP32 ONNX graph of weights: the file itself, or a cached export of a .pt"""
+    weights = Path(weights)
+    if weights.suffix == '.onnx':
+        return weights
+    target = directory / 'fp32.onnx'
+    if not target.is_file():
+        from ultralytics import YOLO
+        exported = YOLO(str(weights)).export(format='onnx')
+        _replace_atomically(lambda tmp: shutil.copyfile(exported, tmp), target)
+    return target
+
+
+def build_optimized(source, target):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    # EXTENDED rather than ALL: the saved graph must not depend on this CPU's layout
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+
+    def build(tmp):
+        options.optimized_model_filepath = str(tmp)
+        ort.InferenceSession(str(source), sess_options=options, providers=['CPUExecutionProvider'])
+    return _replace_atomically(build, target)
+
+
+def _preprocessed_source(source, workdir):
+    """Shape-inferred copy of source as recommended before quantization (source itself if that fails)"""
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    out = Path(workdir) / 'preprocessed.onnx'
+    try:
+        quant_pre_process(str(source), str(out), skip_symbolic_shape=True)
+        return out
+    except Exception as e:
+        print(f"quantization pre-processing skipped: {e}", file=sys.stderr)
+        return Path(source)
+
+
+def build_dynamic(source, target):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    with tempfile.TemporaryDirectory() as workdir:
+        prepared = _preprocessed_source(source, workdir)
+        return _replace_atomically(
+            lambda tmp: quantize_dynamic(str(prepared), str(tmp), weight_type=QuantType.QInt8), target)
+
+
+def list_images(directory, count=None):
+    exts = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+    paths = sorted(p for p in Path(directory).rglob('*') if p.suffix.lower() in exts)
+    return paths[:count] if count else paths
+
+
+def load_frames(paths):
+    """Frames as the server feeds them to the model: grayscale + CLAHE"""
+    frames = []
+    for path in paths:
+        image = cv2.imread(str(path), cv2.IMREAD_GRAYSCALE)
+        if image is not None:
+            frames.append(thread_clahe().apply(image))
+    return frames
+
+
+def build_static(source, target, frames, method='minmax'):
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnx_engine import OnnxEngine
+
+    engine = OnnxEngine(source)
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self._frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self._frames, None)
+            if frame is None:
+                return None
+            tensor, _, _ = engine._preprocess(frame)
+            return {engine.input_name: np.ascontiguousarray(tensor[None], dtype=np.float32)}
+
+    methods = {'minmax': CalibrationMethod.MinMax, 'entropy': CalibrationMethod.Entropy,
+               'percentile': CalibrationMethod.Percentile}
+    with tempfile.TemporaryDirectory() as workdir:
+        prepared = _preprocessed_source(source, workdir)
+        # The YOLO output concatenates box pixels (0-640) and class scores (0-1):
+        # one 8-bit scale for both would round every score away, so the nodes
+        # writing the graph outputs stay in float
+        model = onnx.load(str(prepared))
+        for i, node in enumerate(model.graph.node):
+            node.name = node.name or f'{node.op_type}_{i}'
+        prepared = Path(workdir) / 'named.onnx'
+        onnx.save(model, str(prepared))
+        outputs = {o.name for o in model.graph.output}
+        exclude = [n.name for n in model.graph.node if outputs.intersection(n.output)]
+        return _replace_atomically(
+            lambda tmp: quantize_static(str(prepared), str(tmp), FrameReader(), quant_format=QuantFormat.QDQ,
+                                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                                        per_channel=True, calibrate_method=methods[method],
+                                        nodes_to_exclude=exclude), target)
+
+
+def build_artifacts(weights, precisions, calibration_frames=None, cache_dir=None, force=False,
+                    calibration_method='minmax'):
+    """Build (or reuse) the requested variants of weights; returns {precision: path}.
+
+    int8-static needs calibration_frames (preprocessed, see load_frames).
+    """
+    weights = Path(weights)
+    digest = weights_hash(weights, cache_dir)
+    directory = artifact_dir(weights, cache_dir, digest)
+    source = fp32_onnx(weights, directory)
+    builders = {
+        'optimized': lambda target: build_optimized(source, target),
+        'int8-dynamic': lambda target: build_dynamic(source, target),
+        'int8-static': lambda target: build_static(source, target, calibration_frames, calibration_method),
+    }
+    paths = {'fp32': source}
+    meta_path = directory / 'meta.json'
+    meta = json.loads(meta_path.read_text()) if meta_path.is_file() else {}
+    for precision in precisions:
+        if precision == 'fp32':
+            continue
+        target = directory / f'{precision}.onnx'
+        if force or not target.is_file():
+            if precision == 'int8-static' and not calibration_frames:
+                raise ValueError("int8-static needs calibration frames")
+            start = time.perf_counter()
+            builders[precision](target)
+            meta[precision] = {'built': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                               'seconds': time.perf_counter() - start,
+                               'calibration_frames': len(calibration_frames or ()) if precision == 'int8-static' else None}
+        paths[precision] = target
+    import onnxruntime
+    meta.update(source=str(weights), sha256=digest, onnxruntime=onnxruntime.__version__)
+    meta_path.write_text(json.dumps(meta, indent=2))
+    return paths
+
+
+def match_detections(reference, candidate, iou=0.5):
+    """Greedy same-label matching of candidate to reference boxes at IoU >= iou.
+
+    Returns (matches, mean IoU of the matches, mean |score difference|).
+    """
+    used = np.zeros(len(candidate), dtype=bool)
+    ious, score_errors = [], []
+    for i in np.argsort(-reference.scores):
+        if not len(candidate):
+            break
+        overlap = box_iou(reference.boxes[i], candidate.boxes)
+        # identical boxes match even when degenerate (clipped to a frame edge)
+        overlap[(candidate.boxes == reference.boxes[i]).all(axis=1)] = 1.0
+        overlap[used | (candidate.labels != reference.labels[i])] = 0
+        j = int(overlap.argmax())
+        if overlap[j] >= iou:
+            used[j] = True
+            ious.append(float(overlap[j]))
+            score_errors.append(abs(float(candidate.scores[j]) - float(reference.scores[i])))
+    return len(ious), float(np.mean(ious)) if ious else None, float(np.mean(score_errors)) if score_errors else None
+
+
+def evaluate(paths, frames, conf=0.25, threads=1, repeats=3):
+    """Latency and agreement with FP32 of every variant in paths ({precision: onnx path})"""
+    from onnx_engine import OnnxEngine
+
+    outputs, report = {}, []
+    for precision, path in paths.items():
+        engine = OnnxEngine(path, intra_op_threads=threads, conf=conf)
+        engine.predict_batch(frames[:1], batch_size=1)  # warm-up
+        latencies, outputs[precision] = [], []
+        for frame in frames:
+            best = None
+            for _ in range(repeats):
+                start = time.perf_counter()
+                detections = engine.predict_batch([frame], batch_size=1)[0]
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            latencies.append(best)
+            outputs[precision].append(detections)
+        ms = np.array(latencies) * 1000.0
+        report.append({'precision': precision, 'path': str(path), 'size_bytes': Path(path).stat().st_size,
+                       'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95))})
+
+    fp32 = outputs.get('fp32')
+    fp32_p50 = next((r['p50_ms'] for r in report if r['precision'] == 'fp32'), None)
+    for entry in report:
+        if fp32 is None:
+            break
+        reference_total = candidate_total = matched = 0
+        ious, errors = [], []
+        for ref, cand in zip(fp32, outputs[entry['precision']]):
+            n, mean_iou, score_error = match_detections(ref, cand)
+            reference_total += len(ref)
+            candidate_total += len(cand)
+            matched += n
+            if n:
+                ious.append(mean_iou * n)
+                errors.append(score_error * n)
+        entry.update({
+            'speedup': fp32_p50 / entry['p50_ms'] if entry['p50_ms'] else None,
+            'detections': candidate_total,
+            'recall_vs_fp32': matched / reference_total if reference_total else 1.0,
+            'precision_vs_fp32': matched / candidate_total if candidate_total else 1.0,
+            'mean_iou': sum(ious) / matched if matched else None,
+            'mean_score_error': sum(errors) / matched if matched else None,
+        })
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and compare CPU-optimized/quantized model artifacts")
+    parser.add_argument('weights', help=".onnx or .pt weights file")
+    parser.add_argument('--precisions', default=None,
+                        help="comma-separated from: " + ', '.join(PRECISIONS[1:]) +
+                             " (default: all that can be built)")
+    parser.add_argument('--calibration-dir', help="thermal frames for int8-static calibration")
+    parser.add_argument('--calibration-count', type=int, default=64, help="frames used for calibration")
+    parser.add_argument('--calibration-method', default='minmax', choices=('minmax', 'entropy', 'percentile'))
+    parser.add_argument('--eval-dir', help="frames for the report (default: the calibration frames)")
+    parser.add_argument('--eval-count', type=int, default=32)
+    parser.add_argument('--cache-dir', help="artifact cache (default MODEL_ARTIFACT_DIR or .model_artifacts next to the weights)")
+    parser.add_argument('--threads', type=int, default=1, help="intra-op threads when timing")
+    parser.add_argument('--force', action='store_true', help="rebuild artifacts that already exist")
+    parser.add_argument('--no-report', action='store_true', help="only build the artifacts")
+    parser.add_argument('--report', help="write the report JSON here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.precisions:
+        precisions = [p for p in args.precisions.split(',') if p]
+        unknown = set(precisions) - set(PRECISIONS)
+        if unknown:
+            parser.error(f"unknown precisions: {', '.join(sorted(unknown))}")
+    else:
+        precisions = list(AUTO_BUILD) + (['int8-static'] if args.calibration_dir else [])
+    if 'int8-static' in precisions and not args.calibration_dir:
+        parser.error("int8-static needs --calibration-dir")
+
+    calibration = load_frames(list_images(args.calibration_dir, args.calibration_count)) if args.calibration_dir else None
+    if args.calibration_dir and not calibration:
+        parser.error(f"no readable images in {args.calibration_dir}")
+    paths = build_artifacts(args.weights, precisions, calibration, args.cache_dir, args.force, args.calibration_method)
+    for precision, path in paths.items():
+        print(f"{precision:13s} {path}", file=sys.stderr)
+    if args.no_report:
+        return 0
+
+    eval_dir = args.eval_dir or args.calibration_dir
+    if eval_dir:
+        frames = load_frames(list_images(eval_dir, args.eval_count))
+    else:
+        from benchmark import synthetic_frame
+        print("no --eval-dir: reporting on synthetic frames", file=sys.stderr)
+        frames = [thread_clahe().apply(cv2.cvtColor(synthetic_frame(640, 512, 1 + i % 8, seed=i), cv2.COLOR_BGR2GRAY))
+                  for i in range(args.eval_count)]
+    from model import ModelWrapper
+    report = evaluate(paths, frames, conf=ModelWrapper.CONF_THRESHOLD, threads=args.threads)
+    for r in report:
+        recall = r.get('recall_vs_fp32')
+        print(f"{r['precision']:13s} p50={r['p50_ms']:.2f}ms x{r.get('speedup') or 0:.2f} "
+              f"size={r['size_bytes'] / 1e6:.1f}MB recall={recall if recall is not None else float('nan'):.3f} "
+              f"precision={r.get('precision_vs_fp32') or 0:.3f}", file=sys.stderr)
+
+    text = json.dumps({'weights': str(args.weights), 'frames': len(frames), 'results': report}, indent=2)
+    if args.report:
+        Path(args.report).write_text(text)
+    else:
+        sys.stdout.write(text + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""
+Registry of named, loaded models.
+
+Several ModelWrappers can be held at once and picked per request. New
+versions are loaded and warmed up in the background, then swapped in
+atomically: requests already running keep their reference to the old
+wrapper, new requests get the new one, so nothing is dropped.
+
+A registry only holds the models of its own process. Loads and unloads
+published with publish=True are also recorded in a shared state file, and
+sync() (called by every process, e.g. once per request) applies changes
+that other processes published, so all Gunicorn workers converge on the
+same models. Each worker loads the new version itself, so for the length
+of a load workers may still differ.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where there is no multi-worker server anyway
+    fcntl = None
+
+from model import ModelWrapper
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """Thread-safe name -> ModelWrapper mapping with background hot-swap.
+
+    on_swap(name, wrapper) is called after a model is (re)placed, e.g. so the
+    server can update its default model.
+    state_path: JSON file shared by the processes of one server; checked by
+    sync() at most every sync_interval seconds.
+    """
+
+    DEFAULT = 'default'
+
+    def __init__(self, on_swap=None, state_path=None, sync_interval=1.0):
+        self._models = {}
+        self._status = {}
+        self._lock = threading.Lock()
+        self.on_swap = on_swap
+        self.state_path = Path(state_path) if state_path else None
+        self.sync_interval = float(sync_interval)
+        # name -> version of the shared state entry this process has applied
+        self._applied = {}
+        self._state_stamp = None
+        self._next_sync = 0.0
+
+    def register(self, name, wrapper):
+        """Atomically install wrapper under name"""
+        with self._lock:
+            self._models[name] = wrapper
+            self._status[name] = {'state': 'ready', 'loaded_at': time.time(), 'error': None}
+        if self.on_swap is not None:
+            self.on_swap(name, wrapper)
+
+    def get(self, name=None):
+        """Return the wrapper for name (default model if None); KeyError if unknown"""
+        with self._lock:
+            return self._models[name or self.DEFAULT]
+
+    def names(self):
+        with self._lock:
+            return list(self._models)
+
+    def unload(self, name, publish=False):
+        """Drop a model; with publish, every process sharing the state drops it"""
+        if publish:
+            self._update_state(lambda models: models.pop(name, None))
+        with self._lock:
+            self._status.pop(name, None)
+            self._applied.pop(name, None)
+            return self._models.pop(name, None) is not None
+
+    def load(self, name, model_path=None, engine=None, models_dir=None, background=True, publish=False,
+             lazy_sessions=False):
+        """Load (or replace) a model, warm it up, then swap it in.
+
+        With background=True this returns immediately and the current model
+        under name (if any) keeps serving until the new one is ready. With
+        publish, the other processes sharing the state load it as well.
+        With lazy_sessions (preloading in the Gunicorn master) the warm-up is
+        left to each worker, which builds its own onnxruntime session.
+        """
+        with self._lock:
+            status = self._status.get(name)
+            if status is not None and status['state'] == 'loading':
+                raise RuntimeError(f"Model '{name}' is already loading")
+            self._status[name] = {'state': 'loading', 'started_at': time.time(), 'error': None,
+                                  'model_path': str(model_path) if model_path else None}
+        if publish and self.state_path is not None:
+            version = uuid.uuid4().hex
+            entry = {'path': str(model_path) if model_path else None, 'engine': engine,
+                     'models_dir': str(models_dir) if models_dir else None, 'version': version}
+            self._update_state(lambda models: models.__setitem__(name, entry))
+            with self._lock:
+                self._applied[name] = version
+
+        def work():
+            try:
+                wrapper = ModelWrapper(models_dir=Path(models_dir or Path.cwd()), engine=engine,
+                                       model_path=model_path, lazy_sessions=lazy_sessions)
+                if model_path is not None and wrapper.mode == 'blob':
+                    raise RuntimeError(f"Could not load {model_path} with any engine")
+                if not lazy_sessions:
+                    wrapper.warm_up()
+                self.register(name, wrapper)
+                logger.info("Model '%s' ready (mode %s)", name, wrapper.mode)
+            except Exception as e:
+                logger.exception("Error loading model '%s'", name)
+                with self._lock:
+                    self._status[name] = {'state': 'failed', 'error': str(e),
+                                          'model_path': str(model_path) if model_path else None}
+
+        if background:
+            threading.Thread(target=work, name=f'model-load-{name}', daemon=True).start()
+        else:
+            work()
+        return self.status(name)
+
+    def _read_state(self):
+        try:
+            return json.loads(self.state_path.read_text()).get('models', {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _update_state(self, change):
+        """Apply change(models dict) to the shared state under an exclusive lock"""
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(f'{self.state_path}.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            models = self._read_state()
+            change(models)
+            tmp = self.state_path.with_name(f'{self.state_path.name}.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps({'models': models}, indent=1))
+            os.replace(tmp, self.state_path)
+
+    def sync(self, background=True):
+        """Load or unload whatever other processes published since the last call"""
+        if self.state_path is None:
+            return
+        now = time.monotonic()
+        if now < self._next_sync:
+            return
+        self._next_sync = now + self.sync_interval
+        try:
+            st = self.state_path.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamp = None
+        if stamp == self._state_stamp:
+            return
+        models = self._read_state() if stamp is not None else {}
+        with self._lock:
+            applied = dict(self._applied)
+        pending = False
+        for name, entry in models.items():
+            if applied.get(name) == entry.get('version'):
+                continue
+            try:
+                self.load(name, entry.get('path'), entry.get('engine'), entry.get('models_dir'),
+                          background=background)
+            except RuntimeError:
+                pending = True  # an earlier version is still loading; retry on a later sync
+                continue
+            with self._lock:
+                self._applied[name] = entry.get('version')
+        for name in set(applied) - set(models):
+            logger.info("Model '%s' was unloaded by another process", name)
+            self.unload(name)
+        if not pending:
+            self._state_stamp = stamp
+
+    def status(self, name):
+        with self._lock:
+            return dict(self._status.get(name) or {'state': 'unknown'})
+
+    def describe(self):
+        """Every loaded model with its engine and approximate memory footprint"""
+        with self._lock:
+            models = dict(self._models)
+            statuses = {name: dict(status) for name, status in self._status.items()}
+        out = []
+        for name, wrapper in models.items():
+            out.append({
+                'name': name,
+                'mode': wrapper.mode,
+                'model_path': str(getattr(wrapper, 'model_path', '')) or None,
+                'memory_bytes': wrapper.memory_bytes(),
+                'load_seconds': wrapper.load_seconds,
+                'warmup_seconds': wrapper.warmup_seconds,
+                'status': statuses.get(name, {}).get('state', 'ready'),
+                **wrapper.engine_info(),
+            })
+        for name, status in statuses.items():
+            if name not in models:
+                out.append({'name': name, 'status': status['state'], 'error': status.get('error'),
+                            'model_path': status.get('model_path')})
+        return out
@@ -5,25 +5,68 @@ Runs the best.pt model for object detection on thermal images.
 
 import os
 import sys
+import time
+
+# Cold-start timeline of this process (seconds), reported by /model-info
+_IMPORT_START = time.perf_counter()
+startup_timings = {}
+
 import base64
-import traceback
+import json
+import logging
+import tempfile
+import tracemalloc
+from functools import wraps
 from pathlib import Path
-from io import BytesIO
-from flask import Flask, request, jsonify
+from flask import Flask, Request, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 import numpy as np
 import cv2
-from PIL import Image
+
+from batching import MicroBatcher
+from pipeline import StagePool, PoolSaturated
+from stream import iter_video_frames, process_stream
+from cache import ResultCache
+from radiometry import RadiometricInputError
+from registry import ModelRegistry
+from metrics import Metrics
+from buffers import BufferPool
+from jobs import JobQueue, JobRunner, JOB_STATES, read_lines
+import imaging
+from imaging import (RAW_DTYPES, IMAGE_FORMATS, process_image, check_raw_frame_size, decode_flags,
+                     decode_binary_upload, split_radiometric_frame, decode_source, preprocess_thermal_image,
+                     draw_detections, encode_image_to_base64, detection_columns, format_detections,
+                     detections_npz)
+from cascade import HotRegionFilter
+from overload import OverloadController, Overloaded, TIERS
+
+# Logging: LOG_LEVEL=DEBUG adds per-request detail (image shapes, detection counts)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s pid=%(process)d %(message)s')
+logger = logging.getLogger(__name__)
 
 # Try to import the ModelWrapper
 try:
     from model import ModelWrapper
     HAS_MODEL_WRAPPER = True
 except Exception as e:
-    print(f"Warning: Could not import ModelWrapper: {e}")
+    logger.warning("Could not import ModelWrapper: %s", e)
     HAS_MODEL_WRAPPER = False
 
+class DetectionRequest(Request):
+    """Request whose body limit depends on the endpoint: only POST /jobs
+    with a multipart or octet-stream body, which is spooled to disk, may
+    exceed MAX_UPLOAD_BYTES (up to JOB_MAX_UPLOAD_BYTES)"""
+    
+    @property
+    def max_content_length(self):
+        if self.endpoint == 'submit_job' and self.mimetype in ('multipart/form-data', 'application/octet-stream'):
+            return JOB_MAX_UPLOAD_BYTES
+        return MAX_UPLOAD_BYTES
+
 app = Flask(__name__)
+app.request_class = DetectionRequest
 
 # Configure CORS to accept requests from Render frontend
 cors_config = {
@@ -39,233 +82,938 @@ CORS(app, resources={r"/*": cors_config})
 
 # Initialize model
 model_wrapper = None
+# True once the model has finished its warm-up inference in this process
+model_ready = False
+
+# Upload limits: bodies over MAX_UPLOAD_BYTES are rejected with 413 before
+# they are buffered (Flask enforces this for form data via MAX_CONTENT_LENGTH).
+# Only multipart and octet-stream POST /jobs bodies, which are spooled to
+# disk, allow up to JOB_MAX_UPLOAD_BYTES (see DetectionRequest); JSON and
+# form base64 bodies are decoded in memory and keep MAX_UPLOAD_BYTES.
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 64 * 1024 * 1024))
+JOB_MAX_UPLOAD_BYTES = int(os.environ.get('JOB_MAX_UPLOAD_BYTES', 1024 * 1024 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Radiometric calibration (raw 16-bit counts -> Celsius). The temperature
+# above which a detection is reported as 'hot' (HOT_TEMPERATURE_C) and
+# GRAYSCALE_DECODE are read by imaging.py, which bulk.py shares.
+RADIOMETRIC_GAIN = float(os.environ.get('RADIOMETRIC_GAIN', 0.01))
+RADIOMETRIC_OFFSET = float(os.environ.get('RADIOMETRIC_OFFSET', -273.15))
+
+# Tiled inference for large frames (enabled per request with ?tiled=1)
+TILE_SIZE = int(os.environ.get('TILE_SIZE', 640))
+TILE_OVERLAP = float(os.environ.get('TILE_OVERLAP', 0.2))
+TILE_MAX_BATCH = int(os.environ.get('TILE_MAX_BATCH', 16))
+
+# Two-stage cascade (enabled per request with ?cascade=1, or for every
+# request with CASCADE_ENABLED=1): a cheap hot-region pre-filter runs first,
+# frames without candidates skip the model and the rest are cropped to the
+# candidates. Higher CASCADE_SENSITIVITY finds more candidates (fewer misses,
+# less work skipped). Outcomes are counted in /metrics. The filter's other
+# CASCADE_* settings are read by HotRegionFilter.from_env().
+CASCADE_ENABLED = os.environ.get('CASCADE_ENABLED', '0') == '1'
+CASCADE_SENSITIVITY = float(os.environ.get('CASCADE_SENSITIVITY', 1.0))
+cascade_filter = HotRegionFilter.from_env()
+
+# Batch detection limits
+MAX_BATCH_IMAGES = int(os.environ.get('MAX_BATCH_IMAGES', 256))
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 16))
+
+# Cross-request micro-batching for /detect. Only useful when a worker serves
+# several requests at once (e.g. Gunicorn gthread workers).
+MICROBATCH_ENABLED = os.environ.get('MICROBATCH_ENABLED', '0') == '1'
+MICROBATCH_MAX_SIZE = int(os.environ.get('MICROBATCH_MAX_SIZE', 8))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get('MICROBATCH_MAX_WAIT_MS', 5))
+# How long a request waits for its batched result before failing
+MICROBATCH_TIMEOUT_SECONDS = float(os.environ.get('MICROBATCH_TIMEOUT_SECONDS', 60))
+
+def _batched_predict(frames):
+    return model_wrapper.predict_batch(frames, batch_size=MICROBATCH_MAX_SIZE, enhanced=True)
+
+micro_batcher = MicroBatcher(_batched_predict, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT_MS,
+                             timeout=MICROBATCH_TIMEOUT_SECONDS) if MICROBATCH_ENABLED else None
+
+# Result cache for repeated uploads. RESULT_CACHE_MAX_BYTES=0 disables it;
+# RESULT_CACHE_DIR adds an on-disk tier that survives restarts.
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR')
+RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get('RESULT_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024))
+
+result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MAX_BYTES) if RESULT_CACHE_MAX_BYTES > 0 else None
+
+# Serving mode: 'sync' runs every stage on the request thread; 'threaded'
+# moves decode, CLAHE, drawing and encoding onto a bounded thread pool so
+# they overlap with inference of other requests. That needs concurrent
+# requests in the process: run Gunicorn with GUNICORN_THREADS > 1 (the sync
+# worker serves one request at a time, so 'threaded' gains nothing there).
+SERVING_MODE = os.environ.get('SERVING_MODE', 'sync').lower()
+CPU_POOL_WORKERS = int(os.environ.get('CPU_POOL_WORKERS', os.cpu_count() or 2))
+CPU_POOL_MAX_INFLIGHT = int(os.environ.get('CPU_POOL_MAX_INFLIGHT', 0))
+RETRY_AFTER_SECONDS = int(os.environ.get('RETRY_AFTER_SECONDS', 1))
+
+cpu_pool = StagePool(CPU_POOL_WORKERS if SERVING_MODE == 'threaded' else 0, CPU_POOL_MAX_INFLIGHT)
+
+# Overload control for /detect (OVERLOAD_CONTROL=1): under pressure requests
+# are served at lower quality tiers (no annotated images, then inference at
+# an OVERLOAD_REDUCED_INPUT_SIZE model input, then the blob engine) and
+# finally rejected with OVERLOAD_REJECT_STATUS. OVERLOAD_THRESHOLDS are the
+# pressures at which each tier starts; see overload.py for how pressure is
+# measured. The tier served is reported in X-Quality-Tier and the JSON
+# 'quality_tier' field; models with a fixed input size (ONNX exported
+# without dynamic axes) serve the reduced tier as no_annotation.
+# Queue wait is read from X-Request-Start only when the proxy setting it is
+# trusted: TRUST_REQUEST_START=1, or the request comes from one of the
+# comma-separated OVERLOAD_TRUSTED_PROXIES addresses. Waits longer than
+# OVERLOAD_MAX_QUEUE_SECONDS (default GUNICORN_TIMEOUT) are ignored.
+OVERLOAD_CONTROL = os.environ.get('OVERLOAD_CONTROL', '0') == '1'
+OVERLOAD_REDUCED_INPUT_SIZE = int(os.environ.get('OVERLOAD_REDUCED_INPUT_SIZE', 320))
+OVERLOAD_REJECT_STATUS = int(os.environ.get('OVERLOAD_REJECT_STATUS', 503))
+TRUST_REQUEST_START = os.environ.get('TRUST_REQUEST_START', '0') == '1'
+OVERLOAD_TRUSTED_PROXIES = {a.strip() for a in os.environ.get('OVERLOAD_TRUSTED_PROXIES', '').split(',') if a.strip()}
+OVERLOAD_MAX_QUEUE_SECONDS = float(os.environ.get('OVERLOAD_MAX_QUEUE_SECONDS',
+                                                  os.environ.get('GUNICORN_TIMEOUT', 120)))
+overload = OverloadController(
+    max_inflight=int(os.environ.get('OVERLOAD_MAX_INFLIGHT', 4)),
+    target_latency=float(os.environ.get('OVERLOAD_TARGET_LATENCY_MS', 1000)) / 1000,
+    target_queue=float(os.environ.get('OVERLOAD_TARGET_QUEUE_MS', 2000)) / 1000,
+    thresholds=[float(t) for t in os.environ.get('OVERLOAD_THRESHOLDS', '1,1.5,2,3').split(',')],
+    cooldown=float(os.environ.get('OVERLOAD_COOLDOWN_SECONDS', 5)),
+) if OVERLOAD_CONTROL else None
+
+# Named models, selected per request with ?model=<name>. 'default' is the
+# discovered model. EXTRA_MODELS preloads more as "name=path,name=path";
+# POST /models/<name> loads (or replaces) one at runtime from MODEL_DIRS.
+# Runtime loads are published in MODEL_STATE_FILE, which every worker
+# process (and the job worker) checks every MODEL_STATE_SYNC_SECONDS, so
+# they all swap; gunicorn.conf.py clears it when the server starts. Set it
+# empty to keep swaps local to the process that handles the request.
+EXTRA_MODELS = os.environ.get('EXTRA_MODELS', '')
+MODEL_DIRS = [Path(p).resolve() for p in os.environ.get('MODEL_DIRS', str(Path.cwd())).split(os.pathsep) if p]
+MODEL_STATE_FILE = os.environ.get('MODEL_STATE_FILE', str(Path.cwd() / '.model_state.json'))
+MODEL_STATE_SYNC_SECONDS = float(os.environ.get('MODEL_STATE_SYNC_SECONDS', 1))
+
+def _on_model_swap(name, wrapper):
+    """Keep model_wrapper pointing at the registry's default model"""
+    global model_wrapper
+    if name == ModelRegistry.DEFAULT:
+        model_wrapper = wrapper
+
+model_registry = ModelRegistry(on_swap=_on_model_swap, state_path=MODEL_STATE_FILE or None,
+                               sync_interval=MODEL_STATE_SYNC_SECONDS)
 
-def init_model():
-    """Initialize the YOLO model wrapper"""
+# Per-stage timings and request counters, served at /metrics.
+# SERVER_TIMING=1 also reports each request's stage timings in a
+# Server-Timing response header.
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+metrics = Metrics()
+metrics.describe('requests_total', 'HTTP requests by endpoint and status')
+metrics.describe('request_duration_seconds', 'Request latency by endpoint')
+metrics.describe('stage_duration_seconds', 'Latency of each pipeline stage')
+metrics.describe('detections_total', 'Detections returned')
+
+def output_settings():
+    """
+    Server settings that change /detect results besides the request options
+    and the model's own (ModelWrapper.identity()). Part of every result
+    cache key, so the disk cache never serves results computed under
+    another configuration after a restart.
+    """
+    return json.dumps({
+        'hot_temperature_c': imaging.HOT_TEMPERATURE_C,
+        'grayscale_decode': imaging.GRAYSCALE_DECODE,
+        'cascade': cascade_filter.settings(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+    }, sort_keys=True)
+
+# Preprocessing output buffers are leased from a pool and reused across requests
+frame_buffers = BufferPool(int(os.environ.get('FRAME_BUFFER_POOL_SIZE', 4)))
+
+# TRACE_ALLOCATIONS=1 reports the bytes allocated while serving each request
+# (traced peak above the starting level) in an X-Allocated-Bytes header and
+# in /metrics. tracemalloc slows everything down and is process-wide, so use
+# it for measurements with one request at a time, not in production.
+TRACE_ALLOCATIONS = os.environ.get('TRACE_ALLOCATIONS', '0') == '1'
+if TRACE_ALLOCATIONS:
+    tracemalloc.start()
+    metrics.describe('request_allocated_bytes', 'Bytes allocated while serving a request',
+                     buckets=[2 ** i for i in range(16, 31, 2)])
+
+# Background jobs (POST /jobs): a durable SQLite queue under JOBS_DIR, so
+# large surveys run outside the request/timeout cycle. The web workers only
+# queue jobs; a separate process (python worker.py, the Procfile 'worker')
+# runs them with JOB_WORKERS threads, so they do not compete with /detect
+# for the web workers' CPU. JOB_RUNNER_IN_WEB=1 runs them inside every web
+# worker process instead (python server.py always does).
+JOBS_DIR = Path(os.environ.get('JOBS_DIR', Path.cwd() / 'jobs'))
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+JOB_RUNNER_IN_WEB = os.environ.get('JOB_RUNNER_IN_WEB', '0') == '1'
+JOB_MAX_IMAGES = int(os.environ.get('JOB_MAX_IMAGES', 10000))
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 300))
+JOB_RETENTION_SECONDS = float(os.environ.get('JOB_RETENTION_SECONDS', 7 * 24 * 3600))
+
+job_queue = JobQueue(JOBS_DIR, lease_seconds=JOB_LEASE_SECONDS)
+
+def init_model(preload=False):
+    """Initialize the YOLO model wrapper.
+
+    preload: running in the Gunicorn master before fork, so onnxruntime
+    sessions and warm-up are left to each worker (see prepare_worker).
+    """
     global model_wrapper
     try:
         if HAS_MODEL_WRAPPER:
-            model_wrapper = ModelWrapper(models_dir=Path.cwd())
-            print(f"Model initialized. Mode: {model_wrapper.mode}")
+            model_registry.register(ModelRegistry.DEFAULT,
+                                    ModelWrapper(models_dir=Path.cwd(), lazy_sessions=preload))
+            logger.info("Model initialized. Mode: %s (%.2fs, discovery: %s)",
+                        model_wrapper.mode, model_wrapper.load_seconds, model_wrapper.discovery)
+            for entry in filter(None, EXTRA_MODELS.split(',')):
+                name, _, path = entry.partition('=')
+                model_registry.load(name.strip(), Path(path.strip()), background=False,
+                                    lazy_sessions=preload)
         else:
-            print("ModelWrapper not available")
+            logger.error("ModelWrapper not available")
             model_wrapper = None
     except Exception as e:
-        print(f"Error initializing model: {e}")
-        traceback.print_exc()
+        logger.exception("Error initializing model: %s", e)
         model_wrapper = None
 
+def warm_up_model():
+    """Run a warm-up inference and mark this process ready to serve"""
+    global model_ready
+    if model_wrapper is None:
+        return
+    try:
+        model_wrapper.warm_up()
+        model_ready = True
+        # From the start of the server import (in the Gunicorn master with --preload)
+        startup_timings['ready_seconds'] = time.perf_counter() - _IMPORT_START
+        logger.info("Model warm-up complete (%.3fs)", model_wrapper.warmup_seconds)
+    except Exception as e:
+        logger.exception("Error warming up model: %s", e)
+
+def prepare_worker():
+    """
+    Called in each Gunicorn worker right after fork.
+    Loads the model if the master did not preload it, re-creates state that
+    is not fork-safe, then warms up before the worker accepts requests.
+    """
+    if model_wrapper is None:
+        init_model()
+    else:
+        for name in model_registry.names():
+            wrapper = model_registry.get(name)
+            wrapper.after_fork()
+            if name != ModelRegistry.DEFAULT:
+                # preloaded without a warm-up; the default is warmed below
+                wrapper.warm_up()
+    warm_up_model()
+    if JOB_RUNNER_IN_WEB:
+        job_runner.start()
+
+@app.before_request
+def start_timer():
+    """Start the request clock and collect this request's stage timings"""
+    g.request_start = time.perf_counter()
+    g.timings = []
+    if TRACE_ALLOCATIONS:
+        tracemalloc.reset_peak()
+        g.traced_start = tracemalloc.get_traced_memory()[0]
+
+@app.after_request
+def record_request(response):
+    """Count the request, observe its latency and add Server-Timing if enabled"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    endpoint = request.endpoint or 'unknown'
+    elapsed = time.perf_counter() - start
+    metrics.inc('requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.observe('request_duration_seconds', elapsed, endpoint=endpoint)
+    if TRACE_ALLOCATIONS:
+        allocated = max(0, tracemalloc.get_traced_memory()[1] - g.traced_start)
+        metrics.observe('request_allocated_bytes', allocated, endpoint=endpoint)
+        response.headers['X-Allocated-Bytes'] = str(allocated)
+    if 'quality_tier' in g:
+        response.headers['X-Quality-Tier'] = TIERS[g.quality_tier]
+    if SERVER_TIMING:
+        totals = {}
+        for stage, seconds in g.timings:
+            totals[stage] = totals.get(stage, 0.0) + seconds
+        entries = [f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in totals.items()]
+        entries.append(f'total;dur={elapsed * 1000:.2f}')
+        response.headers['Server-Timing'] = ', '.join(entries)
+    return response
+
+@app.before_request
+def limit_upload_size():
+    """Reject oversized uploads from their Content-Length alone"""
+    limit = request.max_content_length
+    if request.content_length is not None and request.content_length > limit:
+        return jsonify({
+            'success': False,
+            'error': f'Upload too large: {request.content_length} bytes (max {limit})'
+        }), 413
+
 @app.before_request
 def startup():
     """Initialize model on first request"""
     global model_wrapper
+    # /health and /metrics report state and must not trigger a load themselves
+    if request.endpoint in ('health', 'metrics_endpoint'):
+        return
     if model_wrapper is None:
-        print("Initializing model on first request...")
+        logger.info("Initializing model on first request...")
         init_model()
+    if model_wrapper is not None and not model_ready:
+        warm_up_model()
+    model_registry.sync()
+    if JOB_RUNNER_IN_WEB:
+        job_runner.start()
+
+class UploadTooLarge(ValueError):
+    """Raised when a streamed body without Content-Length exceeds the limit"""
 
-def process_image(image_data):
+def read_request_body():
     """
-    Convert image data to numpy array (BGR format for OpenCV)
-    Supports: File upload, base64 string, PIL Image
+    Read the raw request body into a single preallocated buffer.
+    With a Content-Length the stream is read straight into a bytearray of
+    that size, so no intermediate bytes objects are created.
     """
-    try:
-        # If it's a file from form
-        if hasattr(image_data, 'read'):
-            image_bytes = image_data.read()
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        # If it's base64
-        elif isinstance(image_data, str):
-            # Remove data URL prefix if present
-            if image_data.startswith('data:image'):
-                image_data = image_data.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        # If it's bytes
-        elif isinstance(image_data, bytes):
-            nparr = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        else:
-            raise ValueError(f"Unsupported image data type: {type(image_data)}")
-        
-        if img is None:
-            raise ValueError("Failed to decode image")
-        
-        return img
-    except Exception as e:
-        print(f"Error processing image: {e}")
-        traceback.print_exc()
-        raise
+    stream = request.stream
+    length = request.content_length
+    if length is not None:
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        received = 0
+        while received < length:
+            n = stream.readinto(view[received:])
+            if not n:
+                break
+            received += n
+        return view[:received]
+    
+    # Chunked transfer: grow the buffer but stop at the upload limit
+    buffer = bytearray()
+    chunk = bytearray(64 * 1024)
+    while True:
+        n = stream.readinto(chunk)
+        if not n:
+            break
+        buffer += memoryview(chunk)[:n]
+        if len(buffer) > MAX_UPLOAD_BYTES:
+            raise UploadTooLarge(f'Upload too large (max {MAX_UPLOAD_BYTES} bytes)')
+    return memoryview(buffer)
 
-def preprocess_thermal_image(image):
+def get_raw_frame_params():
     """
-    Preprocess thermal image similar to the notebook:
-    - Convert to grayscale if needed
-    - Apply CLAHE enhancement
-    - Convert back to 3-channel for consistency
+    Shape of a raw thermal array upload, from the query string or headers:
+    width / X-Frame-Width, height / X-Frame-Height, dtype / X-Frame-Dtype
+    (uint8 or uint16, little-endian). Returns None for encoded images.
     """
-    try:
-        # Ensure grayscale
-        if image.ndim == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = image
-        
-        # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(gray)
-        
-        # Convert back to 3-channel
-        enhanced_3ch = cv2.cvtColor(enhanced, cv2.COLOR_GRAY2BGR)
-        
-        return enhanced_3ch
-    except Exception as e:
-        print(f"Error preprocessing image: {e}")
-        return image  # Return original if preprocessing fails
+    width = request.args.get('width') or request.headers.get('X-Frame-Width')
+    height = request.args.get('height') or request.headers.get('X-Frame-Height')
+    if width is None and height is None:
+        return None
+    dtype = (request.args.get('dtype') or request.headers.get('X-Frame-Dtype') or 'uint8').lower()
+    if dtype not in RAW_DTYPES:
+        raise ValueError(f"Unsupported raw dtype '{dtype}', expected uint8 or uint16")
+    if width is None or height is None:
+        raise ValueError("Raw frames need both width and height")
+    return {'width': int(width), 'height': int(height), 'dtype': dtype}
+
+# Response modes: which images are encoded into the response
+RESPONSE_MODES = ('full', 'annotated', 'detections')
+
+# Detection layouts: a list of objects, parallel arrays (columnar JSON), or a
+# binary NumPy .npz body (detections only)
+DETECTION_LAYOUTS = ('objects', 'columnar', 'npz')
+NPZ_MIMETYPE = 'application/x-npz'
 
-def draw_detections(image, detections):
+def get_request_options():
     """
-    Draw bounding boxes and labels on the image
+    Read request options from the query string or headers:
+    - response / X-Response-Mode: full (default), annotated or detections
+    - image_format / X-Image-Format: png (default), jpeg or webp
+    - quality / X-Image-Quality: 1-100 for jpeg/webp
+    - radiometric / X-Radiometric: 1 to keep 16-bit input and report
+      temperatures, with optional gain / offset calibration overrides
+    - tiled / X-Tiled: 1 to run overlapping tiles at native resolution,
+      with optional tile_size / tile_overlap overrides
+    - cascade / X-Cascade: 1 to run the model only on hot regions found by
+      the pre-filter (0 to turn off CASCADE_ENABLED), with an optional
+      cascade_sensitivity override; ignored for tiled requests
+    - layout / X-Detections-Layout: objects (default), columnar or npz
+      (npz implies and requires response=detections)
+    Raises ValueError for unknown values.
     """
+    layout = (request.args.get('layout') or request.headers.get('X-Detections-Layout') or 'objects').lower()
+    if layout not in DETECTION_LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', expected one of {', '.join(DETECTION_LAYOUTS)}")
+    default_mode = 'detections' if layout == 'npz' else 'full'
+    mode = (request.args.get('response') or request.headers.get('X-Response-Mode') or default_mode).lower()
+    if layout == 'npz' and mode != 'detections':
+        raise ValueError("layout=npz only supports response=detections")
+    image_format = (request.args.get('image_format') or request.headers.get('X-Image-Format') or 'png').lower()
+    quality = request.args.get('quality') or request.headers.get('X-Image-Quality')
+    if image_format == 'jpg':
+        image_format = 'jpeg'
+    if mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown response mode '{mode}', expected one of {', '.join(RESPONSE_MODES)}")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format '{image_format}', expected one of {', '.join(IMAGE_FORMATS)}")
+    if quality is not None:
+        quality = int(quality)
+        if not 1 <= quality <= 100:
+            raise ValueError("quality must be between 1 and 100")
+    tile_size = int(request.args.get('tile_size', TILE_SIZE))
+    tile_overlap = float(request.args.get('tile_overlap', TILE_OVERLAP))
+    if tile_size < 32 or not 0 <= tile_overlap < 1:
+        raise ValueError("tile_size must be >= 32 and tile_overlap in [0, 1)")
+    radiometric = (request.args.get('radiometric') or request.headers.get('X-Radiometric') or '0').lower()
+    cascade = (request.args.get('cascade') or request.headers.get('X-Cascade') or str(int(CASCADE_ENABLED))).lower()
+    cascade_sensitivity = float(request.args.get('cascade_sensitivity', CASCADE_SENSITIVITY))
+    if cascade_sensitivity <= 0:
+        raise ValueError("cascade_sensitivity must be > 0")
+    return {
+        'mode': mode,
+        'image_format': image_format,
+        'quality': quality,
+        'radiometric': radiometric in ('1', 'true', 'yes'),
+        'gain': float(request.args.get('gain', RADIOMETRIC_GAIN)),
+        'offset': float(request.args.get('offset', RADIOMETRIC_OFFSET)),
+        'tiled': (request.args.get('tiled') or request.headers.get('X-Tiled') or '0').lower() in ('1', 'true', 'yes'),
+        'tile_size': tile_size,
+        'tile_overlap': tile_overlap,
+        'cascade': cascade in ('1', 'true', 'yes'),
+        'cascade_sensitivity': cascade_sensitivity,
+        'layout': layout,
+    }
+
+def build_detection_result(image, detections, options=None, celsius=None, timings=None):
+    """Draw, encode and format the detections for a single image"""
+    options = options or {'mode': 'full', 'image_format': 'png', 'quality': None}
+    mode = options['mode']
+    with metrics.timer('format', timings):
+        formatted_detections = format_detections(detections, image.shape, celsius, options.get('layout', 'objects'))
+    result = {}
+    
+    # Encode images to base64, skipping whatever the client did not ask for
+    if mode == 'full':
+        with metrics.timer('encode', timings):
+            result['input_image'] = encode_image_to_base64(image, options['image_format'], options['quality'])
+    if mode in ('full', 'annotated'):
+        # Draw detections on image
+        with metrics.timer('draw', timings):
+            # the input image is not encoded in 'annotated' mode, so draw on it directly
+            output_image = draw_detections(image, detections, in_place=mode == 'annotated')
+        with metrics.timer('encode', timings):
+            result['output_image'] = encode_image_to_base64(output_image, options['image_format'], options['quality'])
+    
+    result['detections'] = formatted_detections
+    result['detection_count'] = len(detections)
+    return result
+
+def predict_tiled(model, image, options):
+    """Tiled inference with the request's tile settings"""
+    return model.predict_tiled(image, options['tile_size'], options['tile_overlap'],
+                               TILE_MAX_BATCH, enhanced=True)
+
+def predict_cascade(model, frames, options):
+    """Cascade inference over preprocessed frames with the request's sensitivity"""
+    return model.predict_cascade_batch(frames, cascade_filter, batch_size=BATCH_SIZE, enhanced=True,
+                                       sensitivity=options.get('cascade_sensitivity'))
+
+class UnknownModel(KeyError):
+    """Raised when a request names a model that is not loaded"""
+
+def get_request_model():
+    """
+    The model chosen with ?model= / X-Model, or the default model.
+    The reference is taken once, so a concurrent hot-swap never changes the
+    model halfway through a request.
+    """
+    name = request.args.get('model') or request.headers.get('X-Model')
+    if not name:
+        return model_wrapper
     try:
-        result_image = image.copy()
-        
-        for detection in detections:
-            label = detection['label']
-            score = detection['score']
-            box = detection['box']  # [x1, y1, x2, y2]
-            
-            x1, y1, x2, y2 = map(int, box)
-            
-            # Draw bounding box
-            color = (0, 255, 0)  # Green for YOLO detections
-            thickness = 2
-            cv2.rectangle(result_image, (x1, y1), (x2, y2), color, thickness)
-            
-            # Draw label with confidence
-            label_text = f"{label}: {score:.2f}"
-            font = cv2.FONT_HERSHEY_SIMPLEX
-            font_scale = 0.6
-            font_thickness = 1
-            text_size = cv2.getTextSize(label_text, font, font_scale, font_thickness)[0]
-            
-            # Background for text
-            cv2.rectangle(result_image, 
-                         (x1, y1 - text_size[1] - 4),
-                         (x1 + text_size[0], y1),
-                         color, -1)
-            
-            # Text
-            cv2.putText(result_image, label_text, 
-                       (x1, y1 - 2),
-                       font, font_scale, (255, 255, 255), font_thickness)
-        
-        return result_image
-    except Exception as e:
-        print(f"Error drawing detections: {e}")
-        return image
+        return model_registry.get(name)
+    except KeyError:
+        raise UnknownModel(name)
+
+@app.errorhandler(UnknownModel)
+def unknown_model(e):
+    return jsonify({'success': False, 'error': f"Unknown model '{e.args[0]}'",
+                    'models': model_registry.names()}), 404
 
-def encode_image_to_base64(image):
-    """Convert numpy image array to base64 string"""
+def run_job_items(job, indexes, payloads):
+    """JobRunner handler: detect on a chunk of a job's spooled images"""
+    options = job['options']
+    # models hot-swapped through POST /models are published to this process too
+    model_registry.sync(background=False)
     try:
-        _, buffer = cv2.imencode('.png', image)
-        image_base64 = base64.b64encode(buffer).decode('utf-8')
-        return f"data:image/png;base64,{image_base64}"
-    except Exception as e:
-        print(f"Error encoding image: {e}")
+        model = model_registry.get(job['model']) if job['model'] else model_wrapper
+    except KeyError:
+        raise RuntimeError(f"Model '{job['model']}' is not loaded")
+    if model is None:
+        raise RuntimeError('Model not initialized')
+    images, celsius_maps, errors = {}, {}, {}
+    for i, payload in zip(indexes, payloads):
+        try:
+            if options.get('raw'):
+                frame = decode_binary_upload(payload, options['raw'], decode_flags(options))
+                images[i], celsius_maps[i] = split_radiometric_frame(frame, options)
+            else:
+                images[i], celsius_maps[i] = decode_source(payload, options)
+        except Exception as e:
+            errors[i] = str(e)
+    
+    valid = [i for i in indexes if i in images]
+    preprocessed = [preprocess_thermal_image(images[i]) for i in valid]
+    with metrics.timer('job_predict'):
+        if options['tiled']:
+            batch_detections = [predict_tiled(model, frame, options) for frame in preprocessed]
+        elif options.get('cascade'):
+            batch_detections = predict_cascade(model, preprocessed, options)
+        else:
+            batch_detections = model.predict_batch(preprocessed, batch_size=BATCH_SIZE, enhanced=True)
+    detections_by_index = dict(zip(valid, batch_detections))
+    
+    results = []
+    for i in indexes:
+        if i in errors:
+            results.append({'index': i, 'success': False, 'error': errors[i]})
+            continue
+        results.append({
+            'index': i,
+            'success': True,
+            **build_detection_result(images[i], detections_by_index[i], options, celsius_maps[i]),
+            'model_mode': model.mode
+        })
+    metrics.inc('job_images_total', len(indexes))
+    return results
+
+job_runner = JobRunner(job_queue, run_job_items, workers=JOB_WORKERS, chunk_size=BATCH_SIZE,
+                       retention_seconds=JOB_RETENTION_SECONDS)
+
+def pipeline_admission(view):
+    """Reserve a pipeline slot for the request, or reject it with 503 when full"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        with cpu_pool.admit():
+            return view(*args, **kwargs)
+    return wrapper
+
+@app.errorhandler(PoolSaturated)
+def pipeline_saturated(e):
+    """Backpressure: tell the client to retry instead of queueing unboundedly"""
+    response = jsonify({'success': False, 'error': 'Server busy, retry later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+def request_queue_seconds():
+    """How long the request waited before reaching the app, from an X-Request-Start
+    header ("t=<epoch>" in s, ms or us, as set by nginx/Heroku-style proxies).
+    None when the header is missing, not from a trusted proxy, or implausible."""
+    value = request.headers.get('X-Request-Start')
+    if not value or not (TRUST_REQUEST_START or request.remote_addr in OVERLOAD_TRUSTED_PROXIES):
+        return None
+    try:
+        start = float(value[2:] if value.startswith('t=') else value)
+    except ValueError:
+        return None
+    while start > 1e11:  # ms or us since the epoch
+        start /= 1000.0
+    wait = time.time() - start
+    # clock skew between hosts can make it slightly negative
+    if not -1.0 <= wait <= OVERLOAD_MAX_QUEUE_SECONDS:
         return None
+    return max(0.0, wait)
+
+def overload_admission(view):
+    """Pick the request's quality tier (g.quality_tier), or shed it when overloaded"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if overload is None:
+            return view(*args, **kwargs)
+        with overload.admit(request_queue_seconds()) as tier:
+            g.quality_tier = tier
+            metrics.inc('quality_tier_total', tier=TIERS[tier])
+            return view(*args, **kwargs)
+    return wrapper
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    """Load shedding: fail fast instead of queueing into the worker timeout"""
+    g.quality_tier = TIERS.index('reject')
+    metrics.inc('quality_tier_total', tier='reject')
+    response = jsonify({'success': False, 'error': 'Server overloaded, retry later', 'quality_tier': 'reject'})
+    response.status_code = OVERLOAD_REJECT_STATUS
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
 
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({
         'status': 'ok',
+        'ready': model_ready,
         'model_loaded': model_wrapper is not None,
-        'model_mode': model_wrapper.mode if model_wrapper else 'none'
+        'model_mode': model_wrapper.mode if model_wrapper else 'none',
+        'batching': micro_batcher.stats() if micro_batcher else None,
+        'pipeline': cpu_pool.stats(),
+        'cache': result_cache.stats() if result_cache else None,
+        'frame_buffers': frame_buffers.stats(),
+        'jobs': job_queue.counts(),
+        'overload': overload.stats() if overload else None
     })
 
 @app.route('/detect', methods=['POST'])
+@overload_admission
+@pipeline_admission
 def detect():
     """
     Main detection endpoint
-    Accepts image file or base64 image data
+    Accepts image file or base64 image data, or a raw application/octet-stream
+    body (encoded image bytes, or a raw 8/16-bit array with width/height/dtype)
     Returns detections with input and output images
+    See get_request_options() for lean response modes and image formats
+    With overload control on, degraded tiers drop the images, detect at
+    a smaller model input size or with the blob engine (see OVERLOAD_CONTROL).
     """
+    try:
+        options = get_request_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     try:
         # Get image from request
         image = None
+        read_flags = decode_flags(options)
         
-        # Try to get from files first
-        if 'image' in request.files:
-            image = process_image(request.files['image'])
+        # Uploaded bytes (or base64 text); also what the result cache hashes
+        payload = None
+        raw_params = None
+        binary = request.mimetype == 'application/octet-stream'
+        
+        # Raw binary body: image file bytes or a raw thermal array
+        if binary:
+            try:
+                raw_params = get_raw_frame_params()
+                body = read_request_body()
+                if raw_params is not None:
+                    check_raw_frame_size(len(body), raw_params)
+            except UploadTooLarge as e:
+                return jsonify({'success': False, 'error': str(e)}), 413
+            except ValueError as e:
+                return jsonify({'success': False, 'error': str(e)}), 400
+            if len(body):
+                payload = body
+        # Try to get from files
+        elif 'image' in request.files:
+            payload = request.files['image'].read()
         # Try from form data (base64)
         elif 'image' in request.form:
-            image = process_image(request.form['image'])
+            payload = request.form['image']
         # Try from JSON (base64)
         elif request.is_json:
             data = request.get_json()
             if 'image' in data:
-                image = process_image(data['image'])
+                payload = data['image']
         
-        if image is None:
+        if payload is None:
             return jsonify({'error': 'No image provided'}), 400
         
-        print(f"Received image shape: {image.shape}")
+        model = get_request_model()
+        if model is None:
+            return jsonify({'error': 'Model not initialized'}), 500
+        
+        # Repeated uploads are answered straight from the result cache
+        timings = g.timings
+        cache_key = None
+        if result_cache is not None:
+            with metrics.timer('cache', timings):
+                cache_key = result_cache.key(payload, model.identity(), output_settings(), sorted(options.items()),
+                                             raw_params)
+                cached = result_cache.get(cache_key)
+            if cached is not None:
+                # only full-quality results are cached
+                if 'quality_tier' in g:
+                    g.quality_tier = 0
+                mimetype = NPZ_MIMETYPE if options['layout'] == 'npz' else 'application/json'
+                return Response(cached, mimetype=mimetype, headers={'X-Cache': 'HIT'})
+        
+        tier = g.get('quality_tier', 0)
+        if tier == TIERS.index('reduced_resolution') and not model.supports_input_size():
+            # a fixed-size model would letterbox a smaller frame back up: no saving
+            tier = g.quality_tier = TIERS.index('no_annotation')
+        if tier >= TIERS.index('no_annotation') and options['mode'] != 'detections':
+            options = {**options, 'mode': 'detections'}
+        
+        with metrics.timer('decode', timings):
+            if binary:
+                image = cpu_pool.run(decode_binary_upload, payload, raw_params, read_flags)
+            else:
+                image = cpu_pool.run(process_image, payload, read_flags)
+        
+        # Radiometric mode: keep a Celsius map, detect on an 8-bit rendering
+        try:
+            image, celsius = cpu_pool.run(split_radiometric_frame, image, options)
+        except RadiometricInputError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        logger.debug("Received image shape: %s", image.shape)
+        
+        served_mode = 'blob' if tier >= TIERS.index('blob') else model.mode
         
         # Preprocess the image
-        preprocessed = preprocess_thermal_image(image)
+        buffer = frame_buffers.acquire(image.shape[:2])
+        try:
+            with metrics.timer('preprocess', timings):
+                preprocessed = cpu_pool.run(preprocess_thermal_image, image, buffer)
+            
+            # Get detections from model
+            # (the micro-batcher only ever serves the default model)
+            predict_start = time.perf_counter()
+            with metrics.timer('predict', timings):
+                if tier >= TIERS.index('blob'):
+                    detections = model.predict_fallback(preprocessed, enhanced=True)
+                elif tier == TIERS.index('reduced_resolution'):
+                    # smaller model input; skips tiling, the cascade and the batcher
+                    detections = model.predict(preprocessed, enhanced=True, input_size=OVERLOAD_REDUCED_INPUT_SIZE)
+                elif options['tiled']:
+                    detections = predict_tiled(model, preprocessed, options)
+                elif options['cascade']:
+                    detections = predict_cascade(model, [preprocessed], options)[0]
+                elif micro_batcher is not None and model is model_wrapper:
+                    detections = micro_batcher.predict(preprocessed)
+                else:
+                    detections = model.predict(preprocessed, enhanced=True)
+            if overload is not None:
+                overload.observe_latency(time.perf_counter() - predict_start)
+        finally:
+            frame_buffers.release(buffer)
         
-        # Get detections from model
-        if model_wrapper is not None:
-            detections = model_wrapper.predict(preprocessed)
+        logger.debug("Found %d detections", len(detections))
+        metrics.inc('detections_total', len(detections), mode=served_mode)
+        
+        if options['layout'] == 'npz':
+            with metrics.timer('format', timings):
+                columns = detection_columns(detections, image.shape, celsius)
+                body = detections_npz([columns], extra={'model_mode': np.array(served_mode)})
+            response = Response(body, mimetype=NPZ_MIMETYPE)
         else:
+            result = {
+                'success': True,
+                **cpu_pool.run(build_detection_result, image, detections, options, celsius, timings),
+                'model_mode': served_mode
+            }
+            if overload is not None:
+                result['quality_tier'] = TIERS[tier]
+            response = jsonify(result)
+        if cache_key is not None and tier == 0:
+            result_cache.put(cache_key, response.get_data())
+            response.headers['X-Cache'] = 'MISS'
+        return response
+    
+    except UnknownModel:
+        raise
+    except Exception as e:
+        logger.exception("Error in detection: %s", e)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/detect/batch', methods=['POST'])
+@pipeline_admission
+def detect_batch():
+    """
+    Batch detection endpoint
+    Accepts multipart 'images' files or a JSON body {"images": [base64, ...]}
+    Runs the model over all images as batches and returns one result per
+    image, in input order
+    """
+    try:
+        options = get_request_options()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        sources = []
+        if 'images' in request.files:
+            sources = request.files.getlist('images')
+        elif 'images' in request.form:
+            sources = request.form.getlist('images')
+        elif request.is_json:
+            data = request.get_json()
+            images = data.get('images') if isinstance(data, dict) else None
+            if isinstance(images, list):
+                sources = images
+        
+        if not sources:
+            return jsonify({'error': 'No images provided'}), 400
+        if len(sources) > MAX_BATCH_IMAGES:
+            return jsonify({'error': f'Too many images: {len(sources)} (max {MAX_BATCH_IMAGES})'}), 413
+        
+        model = get_request_model()
+        if model is None:
             return jsonify({'error': 'Model not initialized'}), 500
         
-        print(f"Found {len(detections)} detections")
+        # Decode everything first; a bad image only fails its own slot
+        timings = g.timings
+        images = [None] * len(sources)
+        celsius_maps = [None] * len(sources)
+        errors = {}
+        with metrics.timer('decode', timings):
+            decode_futures = [cpu_pool.submit(decode_source, src, options) for src in sources]
+            for i, future in enumerate(decode_futures):
+                try:
+                    images[i], celsius_maps[i] = future.result()
+                except Exception as e:
+                    errors[i] = str(e)
         
-        # Draw detections on image
-        output_image = draw_detections(image, detections)
+        valid = [i for i in range(len(sources)) if images[i] is not None]
+        logger.debug("Received batch of %d images (%d decoded)", len(sources), len(valid))
         
-        # Encode images to base64
-        input_image_b64 = encode_image_to_base64(image)
-        output_image_b64 = encode_image_to_base64(output_image)
+        buffers = [frame_buffers.acquire(images[i].shape[:2]) for i in valid]
+        try:
+            with metrics.timer('preprocess', timings):
+                preprocess_futures = [cpu_pool.submit(preprocess_thermal_image, images[i], buffer)
+                                      for i, buffer in zip(valid, buffers)]
+                preprocessed = [future.result() for future in preprocess_futures]
+            with metrics.timer('predict', timings):
+                if options['tiled']:
+                    batch_detections = [predict_tiled(model, frame, options) for frame in preprocessed]
+                elif options['cascade']:
+                    batch_detections = predict_cascade(model, preprocessed, options)
+                else:
+                    batch_detections = model.predict_batch(preprocessed, batch_size=BATCH_SIZE, enhanced=True)
+        finally:
+            for buffer in buffers:
+                frame_buffers.release(buffer)
+        detections_by_index = dict(zip(valid, batch_detections))
+        metrics.inc('detections_total', sum(map(len, batch_detections)), mode=model.mode)
         
-        # Format detections for response
-        formatted_detections = []
-        for det in detections:
-            x1, y1, x2, y2 = det['box']
-            h, w = image.shape[:2]
-            
-            formatted_detections.append({
-                'label': det['label'],
-                'confidence': float(det['score']),
-                'bbox': {
-                    'x': float(x1 / w * 100),  # Convert to percentage
-                    'y': float(y1 / h * 100),
-                    'width': float((x2 - x1) / w * 100),
-                    'height': float((y2 - y1) / h * 100)
-                },
-                'temperature': 'hot' if det['score'] > 0.7 else 'warm'
+        if options['layout'] == 'npz':
+            with metrics.timer('format', timings):
+                columns = [detection_columns(detections_by_index[i], images[i].shape, celsius_maps[i]) for i in valid]
+                body = detections_npz(columns, valid, extra={
+                    'error_index': np.array(sorted(errors), dtype=np.int32),
+                    'model_mode': np.array(model.mode),
+                })
+            return Response(body, mimetype=NPZ_MIMETYPE)
+        
+        result_futures = {i: cpu_pool.submit(build_detection_result, images[i], detections_by_index[i], options,
+                                             celsius_maps[i], timings)
+                          for i in valid}
+        results = []
+        for i in range(len(sources)):
+            if i in errors:
+                results.append({'index': i, 'success': False, 'error': errors[i]})
+                continue
+            results.append({
+                'index': i,
+                'success': True,
+                **result_futures[i].result()
             })
         
         return jsonify({
             'success': True,
-            'input_image': input_image_b64,
-            'output_image': output_image_b64,
-            'detections': formatted_detections,
-            'detection_count': len(formatted_detections),
-            'model_mode': model_wrapper.mode if model_wrapper else 'unknown'
+            'results': results,
+            'image_count': len(results),
+            'model_mode': model.mode
         })
     
+    except UnknownModel:
+        raise
     except Exception as e:
-        print(f"Error in detection: {e}")
-        traceback.print_exc()
+        logger.exception("Error in batch detection: %s", e)
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+@app.route('/detect/stream', methods=['POST'])
+def detect_stream():
+    """
+    Video detection endpoint
+    Accepts a multipart 'video' file or a raw video body, spools it to a
+    temporary file and streams back NDJSON, one line per decoded frame.
+    Query params: every (run the model on every Nth frame, default 5) and
+    motion (also run it when the mean frame difference exceeds this).
+    Frames between inferences report tracked boxes with a track_id.
+    """
+    try:
+        every_n = int(request.args.get('every', 5))
+        motion = request.args.get('motion')
+        motion = float(motion) if motion is not None else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    wrapper = get_request_model()
+    if wrapper is None:
+        return jsonify({'error': 'Model not initialized'}), 500
+    
+    spool = None
+    try:
+        upload = request.files.get('video')
+        suffix = Path(upload.filename).suffix if upload is not None and upload.filename else '.mp4'
+        spool = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        if upload is not None:
+            upload.save(spool)
+        else:
+            # Chunked bodies have no Content-Length to check up front
+            received = 0
+            while True:
+                chunk = request.stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge(f'Upload too large (max {MAX_UPLOAD_BYTES} bytes)')
+                spool.write(chunk)
+        spool.close()
+        if os.path.getsize(spool.name) == 0:
+            os.unlink(spool.name)
+            return jsonify({'error': 'No video provided'}), 400
+    except (UploadTooLarge, RequestEntityTooLarge) as e:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except Exception as e:
+        if spool is not None:
+            spool.close()
+            os.unlink(spool.name)
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    def generate():
+        try:
+            frames = iter_video_frames(spool.name)
+            for record in process_stream(wrapper, frames, every_n, motion, preprocess_thermal_image):
+                tracks = record['tracks']
+                detections = format_detections(tracks, record['shape'])
+                for det, track in zip(detections, tracks):
+                    det['track_id'] = track['track_id']
+                yield json.dumps({
+                    'frame': record['frame'],
+                    'timestamp_ms': record['timestamp_ms'],
+                    'inferred': record['inferred'],
+                    'detections': detections,
+                    'detection_count': len(detections)
+                }) + '\n'
+        except Exception as e:
+            logger.exception("Error in stream detection: %s", e)
+            yield json.dumps({'success': False, 'error': str(e)}) + '\n'
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    # also runs when the client disconnects before the body is iterated
+    response.call_on_close(lambda: os.unlink(spool.name))
+    return response
+
 @app.route('/model-info', methods=['GET'])
 def model_info():
     """Get information about the loaded model"""
@@ -276,11 +1024,315 @@ def model_info():
         return jsonify({
             'mode': model_wrapper.mode,
             'model_path': str(model_wrapper.model_path) if hasattr(model_wrapper, 'model_path') else 'unknown',
-            'has_ultralytics_model': model_wrapper.model is not None
+            'has_ultralytics_model': model_wrapper.model is not None,
+            **model_wrapper.engine_info(),
+            'startup': {**startup_timings, **model_wrapper.startup_info()},
+            'models': model_registry.describe()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _scrape_samples():
+    """Metrics read from the models, cache and pools at scrape time"""
+    samples = []
+    for name in model_registry.names():
+        try:
+            model = model_registry.get(name)
+        except KeyError:
+            continue
+        labels = {'model': name, 'mode': model.mode}
+        samples.append(('model_load_seconds', 'gauge', labels, model.load_seconds))
+        if model.warmup_seconds is not None:
+            samples.append(('model_warmup_seconds', 'gauge', labels, model.warmup_seconds))
+        samples.append(('model_memory_bytes', 'gauge', labels, model.memory_bytes()))
+    samples.append(('model_ready', 'gauge', {}, int(model_ready)))
+    if overload is not None:
+        state = overload.stats()
+        samples.append(('overload_pressure', 'gauge', {}, state['pressure']))
+        samples.append(('overload_tier', 'gauge', {}, TIERS.index(state['tier'])))
+        samples.append(('overload_predict_latency_seconds', 'gauge', {}, state['predict_latency_seconds']))
+        samples.append(('overload_queue_wait_seconds', 'gauge', {}, state['queue_wait_seconds']))
+    for phase, seconds in startup_timings.items():
+        samples.append(('startup_seconds', 'gauge', {'phase': phase.replace('_seconds', '')}, seconds))
+    cascade = cascade_filter.stats()
+    for outcome in ('skipped', 'cropped', 'full'):
+        samples.append(('cascade_frames_total', 'counter', {'outcome': outcome}, cascade[f'frames_{outcome}']))
+    samples.append(('cascade_regions_total', 'counter', {}, cascade['regions']))
+    samples.append(('cascade_crops_total', 'counter', {}, cascade['crops']))
+    samples.append(('cascade_pixels_total', 'counter', {}, cascade['pixels']))
+    samples.append(('cascade_pixels_inferred_total', 'counter', {}, cascade['pixels_inferred']))
+    pool = cpu_pool.stats()
+    samples.append(('pipeline_inflight', 'gauge', {}, pool['inflight']))
+    samples.append(('pipeline_rejected_total', 'counter', {}, pool['rejected']))
+    if result_cache is not None:
+        cache = result_cache.stats()
+        for key in ('hits', 'misses', 'evictions'):
+            samples.append((f'cache_{key}_total', 'counter', {}, cache[key]))
+        samples.append(('cache_entries', 'gauge', {}, cache['entries']))
+        samples.append(('cache_bytes', 'gauge', {}, cache['bytes']))
+    for status, n in job_queue.counts().items():
+        samples.append(('jobs', 'gauge', {'status': status}, n))
+    if micro_batcher is not None:
+        batching = micro_batcher.stats()
+        samples.append(('batching_queue_depth', 'gauge', {}, batching['queue_depth']))
+        samples.append(('batching_mean_batch_size', 'gauge', {}, batching['mean_batch_size']))
+    return samples
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics for this worker process"""
+    return Response(metrics.render(_scrape_samples()), mimetype='text/plain; version=0.0.4')
+
+def resolve_model_file(path):
+    """Resolve a requested weights path, only allowing files under MODEL_DIRS"""
+    candidate = Path(path)
+    for root in MODEL_DIRS:
+        resolved = (root / candidate).resolve()
+        if resolved.is_relative_to(root) and resolved.is_file():
+            return resolved
+    raise ValueError(f"Model file '{path}' not found in {', '.join(map(str, MODEL_DIRS))}")
+
+def spool_job_inputs(inputs_dir):
+    """
+    Write the request's images to inputs_dir as 000000, 000001, ...
+    Accepts the same bodies as /detect/batch (multipart 'images' or 'image',
+    form/JSON base64) or a single application/octet-stream image. Multipart
+    and octet-stream uploads are streamed to disk; base64 bodies are decoded
+    in memory, which is why they are capped at MAX_UPLOAD_BYTES (see
+    DetectionRequest). Returns the number of images.
+    """
+    count = 0
+    
+    def target():
+        nonlocal count
+        if count >= JOB_MAX_IMAGES:
+            raise ValueError(f'Too many images (max {JOB_MAX_IMAGES})')
+        path = inputs_dir / f'{count:06d}'
+        count += 1
+        return path
+    
+    if request.mimetype == 'application/octet-stream':
+        received = 0
+        with open(target(), 'wb') as f:
+            while True:
+                chunk = request.stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > JOB_MAX_UPLOAD_BYTES:
+                    raise UploadTooLarge(f'Upload too large (max {JOB_MAX_UPLOAD_BYTES} bytes)')
+                f.write(chunk)
+        return count if received else 0
+    if request.files:
+        for upload in request.files.getlist('images') + request.files.getlist('image'):
+            upload.save(target())
+        return count
+    if 'images' in request.form or 'image' in request.form:
+        encoded = request.form.getlist('images') + request.form.getlist('image')
+    elif request.is_json:
+        data = request.get_json(silent=True) or {}
+        encoded = data.get('images') or ([data['image']] if data.get('image') else [])
+    else:
+        encoded = []
+    for item in encoded:
+        if item.startswith('data:image'):
+            item = item.split(',', 1)[1]
+        target().write_bytes(base64.b64decode(item))
+    return count
+
+def describe_job(job):
+    """Public view of a job row"""
+    return {
+        'id': job['id'],
+        'status': job['status'],
+        'priority': job['priority'],
+        'model': job['model'] or ModelRegistry.DEFAULT,
+        'item_count': job['item_count'],
+        'done_count': job['done_count'],
+        'created': job['created'],
+        'started': job['started'],
+        'finished': job['finished'],
+        'attempts': job['attempts'],
+        'error': job['error'],
+        'results_url': f"/jobs/{job['id']}/results",
+    }
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a detection job and return its id immediately (202).
+    Takes the same images and options as /detect/batch (see
+    get_request_options), plus model=<name> and priority=<int> (higher runs
+    first). Poll GET /jobs/<id>, or stream GET /jobs/<id>/results.
+    """
+    try:
+        options = get_request_options()
+        priority = int(request.args.get('priority', 0))
+        raw_params = get_raw_frame_params() if request.mimetype == 'application/octet-stream' else None
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    if options['layout'] == 'npz':
+        return jsonify({'success': False, 'error': 'Jobs store NDJSON results; use layout=objects or columnar'}), 400
+    if raw_params is not None:
+        options['raw'] = raw_params
+    model_name = request.args.get('model') or request.headers.get('X-Model')
+    if model_name and model_name not in model_registry.names():
+        raise UnknownModel(model_name)
+    
+    job_id, inputs_dir = job_queue.new_job_dir()
+    try:
+        count = spool_job_inputs(inputs_dir)
+    except (UploadTooLarge, RequestEntityTooLarge) as e:
+        job_queue.discard(job_id)
+        return jsonify({'success': False, 'error': str(e)}), 413
+    except (ValueError, TypeError, AttributeError) as e:
+        job_queue.discard(job_id)
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception:
+        job_queue.discard(job_id)
+        raise
+    if count == 0:
+        job_queue.discard(job_id)
+        return jsonify({'success': False, 'error': 'No images provided'}), 400
+    
+    job_queue.submit(job_id, count, options, model_name, priority)
+    job_runner.notify()
+    metrics.inc('jobs_submitted_total')
+    logger.info("Queued job %s (%d images, priority %d)", job_id, count, priority)
+    return jsonify({'success': True, **describe_job(job_queue.get(job_id))}), 202
+
+@app.route('/jobs', methods=['GET'])
+def list_jobs():
+    """Most recent jobs, optionally filtered with ?status="""
+    status = request.args.get('status')
+    if status and status not in JOB_STATES:
+        return jsonify({'error': f"Unknown status '{status}'"}), 400
+    try:
+        limit = min(max(1, int(request.args.get('limit', 50))), 1000)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'jobs': [describe_job(job) for job in job_queue.list(limit, status)],
+                    'counts': job_queue.counts()})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Job status. With ?results=1 also one page of the results written so far:
+    offset (default 0) and limit (default 100, at most 1000) lines, plus
+    next_offset while there may be more. Stream all of them from
+    GET /jobs/<id>/results instead.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job '{job_id}'"}), 404
+    body = describe_job(job)
+    if request.args.get('results', '0').lower() in ('1', 'true', 'yes'):
+        try:
+            offset = max(0, int(request.args.get('offset', 0)))
+            limit = min(max(1, int(request.args.get('limit', 100))), 1000)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        body['results'] = read_lines(job_queue.results_path(job_id), offset, limit)
+        more = len(body['results']) == limit or job['status'] in ('queued', 'running')
+        body['next_offset'] = offset + len(body['results']) if more else None
+    return jsonify(body)
+
+@app.route('/jobs/<job_id>/results', methods=['GET'])
+def stream_job_results(job_id):
+    """
+    Results as NDJSON, one line per image in input order, from ?offset=
+    (default 0). With ?follow=1 the response stays open and streams new
+    results until the job ends; otherwise it returns whatever has been
+    written so far.
+    """
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': f"Unknown job '{job_id}'"}), 404
+    follow = request.args.get('follow', '0').lower() in ('1', 'true', 'yes')
+    try:
+        skip = max(0, int(request.args.get('offset', 0)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    path = job_queue.results_path(job_id)
+    
+    def generate():
+        nonlocal skip
+        position = 0
+        while True:
+            # check the state before reading so lines written just before the end are not missed
+            job = job_queue.get(job_id)
+            finished = job is None or job['status'] not in ('queued', 'running')
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(position)
+                    data = f.read()
+            except FileNotFoundError:
+                data = b''
+            end = data.rfind(b'\n') + 1
+            start = 0
+            while skip and start < end:
+                start = data.index(b'\n', start) + 1
+                skip -= 1
+            if end:
+                position += end
+                if start < end:
+                    yield data[start:end]
+            if finished or not follow:
+                return
+            time.sleep(0.5)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    """Cancel a queued/running job, or delete a finished one and its files"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown job '{job_id}'"}), 404
+    if job_queue.cancel(job_id):
+        return jsonify({'success': True, 'id': job_id, 'status': 'cancelled'})
+    job_queue.delete(job_id)
+    return jsonify({'success': True, 'id': job_id, 'status': 'deleted'})
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    """List loaded models and any loads in progress"""
+    return jsonify({'models': model_registry.describe()})
+
+@app.route('/models/<name>', methods=['POST'])
+def load_model(name):
+    """
+    Load a model under name, or replace it with a new version.
+    JSON body: {"path": "<weights file under MODEL_DIRS>", "engine": optional,
+    "background": true}. The model is warmed up before it is swapped in;
+    until then requests keep using the previous version. Other worker
+    processes pick the change up from MODEL_STATE_FILE and load it
+    themselves, so for the length of a load they may still serve the
+    previous version.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        path = resolve_model_file(data.get('path') or '')
+        background = bool(data.get('background', True))
+        status = model_registry.load(name, path, engine=data.get('engine'), background=background, publish=True)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    if status['state'] == 'failed':
+        return jsonify({'success': False, 'name': name, **status}), 500
+    return jsonify({'success': True, 'name': name, **status}), 202 if background else 200
+
+@app.route('/models/<name>', methods=['DELETE'])
+def unload_model(name):
+    """Unload a named model (the default model cannot be unloaded)"""
+    if name == ModelRegistry.DEFAULT:
+        return jsonify({'success': False, 'error': 'The default model cannot be unloaded'}), 400
+    if not model_registry.unload(name, publish=True):
+        return jsonify({'success': False, 'error': f"Unknown model '{name}'"}), 404
+    return jsonify({'success': True, 'name': name})
+
+startup_timings['server_import_seconds'] = time.perf_counter() - _IMPORT_START
+
 if __name__ == '__main__':
     # Note: Model is initialized on first request, not at startup
     # This prevents timeout issues in production environments like Render
@@ -289,9 +1341,19 @@ if __name__ == '__main__':
     print("Available endpoints:")
     print("  GET  /health - Health check")
     print("  GET  /model-info - Model information")
+    print("  GET  /metrics - Prometheus metrics")
+    print("  GET  /models - Loaded models")
+    print("  POST /models/<name> - Load or hot-swap a model")
     print("  POST /detect - Detect objects in image")
+    print("  POST /detect/batch - Detect objects in many images")
+    print("  POST /detect/stream - Detect and track objects in a video (NDJSON)")
+    print("  POST /jobs - Queue a background detection job")
+    print("  GET  /jobs/<id> - Job status and results")
     print("Model will be loaded on first request...")
     
+    # A single development process also runs the queued jobs
+    job_runner.start()
+    
     # Get environment variables
     is_production = os.environ.get('FLASK_ENV') == 'production'
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,237 @@
+"""
+Streaming video ingestion: decode frames from a video file or stream,
+run the detector on every Nth frame (or when motion is detected), and
+carry detections between inferred frames with a lightweight IoU +
+constant-velocity Kalman tracker.
+
+Usable offline on local files:
+    python stream.py capture.mp4 --every 5 --motion 6 > tracks.ndjson
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+from detections import Detections
+
+
+def iter_video_frames(source):
+    """Yield (index, timestamp_ms, frame) from a video file, URL or device index"""
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    cap = cv2.VideoCapture(source if isinstance(source, int) else str(source))
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video source: {source}")
+    try:
+        index = 0
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield index, float(cap.get(cv2.CAP_PROP_POS_MSEC)), frame
+            index += 1
+    finally:
+        cap.release()
+
+
+class MotionTrigger:
+    """Fires when a frame differs enough from the last frame that was inferred.
+
+    Frames are compared as small grayscale thumbnails; threshold is the mean
+    absolute difference in 8-bit gray levels.
+    """
+
+    def __init__(self, threshold=6.0, size=(64, 48)):
+        self.threshold = float(threshold)
+        self.size = size
+        self._reference = None
+
+    def _thumbnail(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        return cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+
+    def check(self, frame):
+        """True if the frame moved past the threshold (or is the first one)"""
+        thumb = self._thumbnail(frame)
+        if self._reference is None:
+            return True
+        return float(cv2.absdiff(thumb, self._reference).mean()) >= self.threshold
+
+    def reset(self, frame):
+        """Make this frame the new reference"""
+        self._reference = self._thumbnail(frame)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between Nx4 and Mx4 x1,y1,x2,y2 boxes"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    xx1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    yy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    xx2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    yy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+class _Track:
+    """Constant-velocity Kalman filter over (cx, cy, w, h)"""
+
+    _F = np.eye(8)
+    _F[:4, 4:] = np.eye(4)
+    _H = np.eye(4, 8)
+    _Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.5, 0.5, 0.25, 0.25])
+    _R = np.diag([4.0, 4.0, 9.0, 9.0])
+
+    def __init__(self, track_id, det):
+        self.id = track_id
+        self.label = det['label']
+        self.score = det['score']
+        self.x = np.zeros(8)
+        self.x[:4] = self._to_cxcywh(det['box'])
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 100.0, 100.0, 100.0, 100.0])
+        self.hits = 1
+        self.misses = 0
+
+    @staticmethod
+    def _to_cxcywh(box):
+        x1, y1, x2, y2 = box
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+    @property
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        w, h = max(w, 1.0), max(h, 1.0)
+        return [cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2]
+
+    def predict(self):
+        self.x = self._F @ self.x
+        self.P = self._F @ self.P @ self._F.T + self._Q
+
+    def update(self, det):
+        z = self._to_cxcywh(det['box'])
+        y = z - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(8) - K @ self._H) @ self.P
+        self.label = det['label']
+        self.score = det['score']
+        self.hits += 1
+        self.misses = 0
+
+
+class IoUTracker:
+    """Associates detections across inferred frames by IoU and predicts
+    track positions on frames where the model was skipped.
+
+    max_misses: inferred frames a track may go unmatched before it is dropped.
+    """
+
+    def __init__(self, iou_threshold=0.2, max_misses=2):
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.tracks = []
+        self._next_id = 1
+
+    def predict(self):
+        """Advance every track by one frame"""
+        for track in self.tracks:
+            track.predict()
+
+    def update(self, detections):
+        """Match this frame's detections to the (already predicted) tracks"""
+        detections = Detections.from_dicts(detections)
+        matched_tracks, matched_dets = set(), set()
+        if self.tracks and detections:
+            ious = iou_matrix([t.box for t in self.tracks], detections.boxes)
+            # greedy assignment, best IoU first
+            for flat in np.argsort(-ious, axis=None):
+                ti, di = np.unravel_index(flat, ious.shape)
+                if ious[ti, di] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or di in matched_dets:
+                    continue
+                self.tracks[ti].update(detections[di])
+                matched_tracks.add(ti)
+                matched_dets.add(di)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+        for di, det in enumerate(detections):
+            if di not in matched_dets:
+                self.tracks.append(_Track(self._next_id, det))
+                self._next_id += 1
+
+    def active(self):
+        """Current tracks as detection dicts with a track_id"""
+        return [{'track_id': t.id, 'label': t.label, 'score': float(t.score), 'box': [float(v) for v in t.box]}
+                for t in self.tracks if t.misses == 0 or t.hits > 1]
+
+
+def process_stream(model_wrapper, frames, every_n=5, motion_threshold=None, preprocess=None, tracker=None):
+    """
+    Run detection over an iterable of (index, timestamp_ms, frame).
+
+    The model runs on every Nth frame, and additionally on any frame whose
+    motion score passes motion_threshold (if given). Every frame yields
+    {'frame', 'timestamp_ms', 'inferred', 'shape', 'tracks'}; skipped frames
+    report the tracker's predicted boxes.
+    """
+    tracker = tracker or IoUTracker()
+    motion = MotionTrigger(motion_threshold) if motion_threshold is not None else None
+    every_n = max(1, int(every_n))
+    since_inference = every_n
+
+    for index, timestamp_ms, frame in frames:
+        tracker.predict()
+        due = since_inference >= every_n
+        moved = motion is not None and motion.check(frame)
+        inferred = due or moved
+        if inferred:
+            # preprocess is expected to apply the usual CLAHE enhancement
+            model_input = preprocess(frame) if preprocess else frame
+            tracker.update(model_wrapper.predict(model_input, enhanced=preprocess is not None))
+            since_inference = 0
+            if motion is not None:
+                motion.reset(frame)
+        since_inference += 1
+        yield {
+            'frame': index,
+            'timestamp_ms': timestamp_ms,
+            'inferred': inferred,
+            'shape': list(frame.shape[:2]),
+            'tracks': tracker.active(),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run thermal detection over a video file or stream")
+    parser.add_argument('source', help="video file, stream URL or camera index")
+    parser.add_argument('--every', type=int, default=5, help="run the model on every Nth frame")
+    parser.add_argument('--motion', type=float, default=None,
+                        help="also run the model when mean frame difference exceeds this")
+    parser.add_argument('--models-dir', default=str(Path.cwd()))
+    args = parser.parse_args(argv)
+
+    from model import ModelWrapper
+    from imaging import preprocess_thermal_image
+
+    model_wrapper = ModelWrapper(models_dir=Path(args.models_dir))
+    frames = iter_video_frames(args.source)
+    for record in process_stream(model_wrapper, frames, args.every, args.motion, preprocess_thermal_image):
+        sys.stdout.write(json.dumps(record) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
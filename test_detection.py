@@ -112,6 +112,43 @@ def test_detection():
         traceback.print_exc()
         return False
 
+def test_batch_detection():
+    """Test batch detection with several synthetic thermal images"""
+    try:
+        import cv2
+        import numpy as np
+        
+        print("\n→ Creating test thermal batch...")
+        files = []
+        for k in range(3):
+            img = np.zeros((480, 640), dtype=np.uint8)
+            cv2.circle(img, (100 + 150 * k, 240), 40, 255, -1)
+            _, buffer = cv2.imencode('.png', img)
+            files.append(('images', (f'frame_{k}.png', buffer.tobytes(), 'image/png')))
+        
+        print("→ Sending batch to detection server...")
+        response = requests.post('http://localhost:5000/detect/batch',
+                                 files=files, timeout=60)
+        
+        if response.status_code == 200:
+            data = response.json()
+            results = data.get('results', [])
+            print("✓ Batch detection successful!")
+            print(f"  Images processed: {data.get('image_count', 0)}")
+            for res in results:
+                print(f"    - image {res['index']}: {res.get('detection_count', 0)} objects")
+            return [res['index'] for res in results] == list(range(len(files)))
+        else:
+            print(f"✗ Batch detection failed with status {response.status_code}")
+            return False
+    
+    except ImportError:
+        print("⚠ OpenCV not installed, skipping batch detection test")
+        return None
+    except Exception as e:
+        print(f"✗ Batch detection test failed: {e}")
+        return False
+
 def main():
     print("=" * 50)
     print("Thermal Detection System - Test Suite")
@@ -121,6 +158,7 @@ def main():
         ("Server Connectivity", test_server),
         ("Model Information", test_model_info),
         ("Detection Capability", test_detection),
+        ("Batch Detection", test_batch_detection),
     ]
     
     results = {}
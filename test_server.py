@@ -0,0 +1,964 @@
+"""
+In-process tests for the detection server and its helpers.
+
+Unlike test_detection.py these need no running server and no model weights:
+requests go through the Flask test client and the default model is the
+blob detector. Run with:
+
+    python -m unittest test_server
+"""
+
+import base64
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import cv2
+
+_TMP = tempfile.mkdtemp(prefix='thermal-test-')
+os.environ.update({
+    'LOG_LEVEL': 'ERROR',
+    'MODEL_ENGINE': 'blob',
+    'MODEL_MANIFEST': '',
+    'RESULT_CACHE_MAX_BYTES': '0',
+    'JOBS_DIR': os.path.join(_TMP, 'jobs'),
+    'MODEL_STATE_FILE': os.path.join(_TMP, 'model_state.json'),
+})
+
+import server  # noqa: E402  (configured through the environment above)
+from registry import ModelRegistry  # noqa: E402
+
+
+def thermal_frame(width=320, height=256, spots=((80, 90, 14), (220, 160, 20))):
+    """Dark grayscale frame with bright discs (x, y, radius) for the blob detector"""
+    frame = np.full((height, width), 40, np.uint8)
+    for x, y, r in spots:
+        cv2.circle(frame, (x, y), r, 250, -1)
+    return frame
+
+
+def png(image):
+    return cv2.imencode('.png', image)[1].tobytes()
+
+
+class ServerTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        if server.model_wrapper is None:
+            server.init_model()
+        if not server.model_ready:
+            server.warm_up_model()
+
+    def setUp(self):
+        self.client = server.app.test_client()
+
+    def detect(self, body, query='', **kwargs):
+        return self.client.post(f'/detect{query}', data=body, content_type='application/octet-stream', **kwargs)
+
+
+class BatchDetectTest(ServerTestCase):
+    """/detect/batch runs one batch and answers in input order"""
+
+    def test_results_in_input_order_with_per_image_errors(self):
+        frames = [thermal_frame(spots=((60, 60, 12),)), thermal_frame(), thermal_frame(spots=())]
+        files = [(io.BytesIO(png(frame)), f'{i}.png') for i, frame in enumerate(frames)]
+        files.insert(1, (io.BytesIO(b'not an image'), 'bad.png'))
+        body = self.client.post('/detect/batch', data={'images': files}).get_json()
+        self.assertTrue(body['success'])
+        self.assertEqual([r['index'] for r in body['results']], [0, 1, 2, 3])
+        self.assertEqual([r['success'] for r in body['results']], [True, False, True, True])
+        for result, frame in zip([body['results'][i] for i in (0, 2, 3)], frames):
+            single = self.detect(png(frame)).get_json()
+            self.assertEqual(result['detections'], single['detections'])
+
+    def test_model_batches_whole_request(self):
+        model = server.model_wrapper
+        files = [(io.BytesIO(png(thermal_frame())), f'{i}.png') for i in range(3)]
+        with mock.patch.object(model, 'predict_batch', wraps=model.predict_batch) as predict_batch:
+            self.client.post('/detect/batch', data={'images': files})
+        self.assertEqual(predict_batch.call_count, 1)
+        self.assertEqual(len(predict_batch.call_args.args[0]), 3)
+
+    def test_too_many_images(self):
+        files = [(io.BytesIO(png(thermal_frame())), f'{i}.png') for i in range(3)]
+        with mock.patch.object(server, 'MAX_BATCH_IMAGES', 2):
+            response = self.client.post('/detect/batch', data={'images': files})
+        self.assertEqual(response.status_code, 413)
+
+
+def yolo_onnx(path, boxes, dynamic=True):
+    """Tiny ONNX model with a YOLOv8 head shape whose output is always boxes
+    ((cx, cy, w, h, score) in input pixels), whatever the input"""
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+    size = ['h', 'w'] if dynamic else [640, 640]
+    pred = np.array(boxes, np.float32).T[None]  # (1, 4 + 1 class, anchors)
+    graph = helper.make_graph(
+        [helper.make_node('ReduceMax', ['images'], ['m'], keepdims=0),
+         helper.make_node('Mul', ['m', 'zero'], ['z']),
+         helper.make_node('Add', ['pred', 'z'], ['output0'])],
+        'yolo', [helper.make_tensor_value_info('images', TensorProto.FLOAT, [1, 3] + size)],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, None)],
+        [numpy_helper.from_array(pred, 'pred'), numpy_helper.from_array(np.zeros(1, np.float32), 'zero')])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, path)
+    return path
+
+
+def has_onnxruntime():
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+@unittest.skipUnless(has_onnxruntime(), "needs onnx and onnxruntime")
+class OnnxEngineTest(unittest.TestCase):
+    """The onnxruntime engine decodes YOLOv8 output back to frame pixels"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(dir=_TMP)
+
+    def test_boxes_are_mapped_back_through_the_letterbox(self):
+        from model import ModelWrapper
+        weights = yolo_onnx(os.path.join(self.dir, 'best.onnx'), [(320, 320, 64, 64, 0.9), (100, 100, 20, 20, 0.1)])
+        model = ModelWrapper(models_dir=self.dir, engine='onnx')
+        self.assertEqual(str(model.model_path), weights)
+        self.assertEqual(model.mode, 'onnx')
+        # 1280x640 frame: letterboxed at ratio 0.5 with 160 px of padding above and below
+        detections = model.predict(np.zeros((640, 1280, 3), np.uint8))
+        self.assertEqual(len(detections), 1)
+        np.testing.assert_allclose(detections.boxes[0], [576, 256, 704, 384], atol=1e-3)
+        self.assertAlmostEqual(float(detections.scores[0]), 0.9, places=5)
+
+    def test_lazy_sessions_are_built_once_per_process(self):
+        from model import ModelWrapper
+        yolo_onnx(os.path.join(self.dir, 'best.onnx'), [(320, 320, 64, 64, 0.9)])
+        model = ModelWrapper(models_dir=self.dir, engine='onnx', lazy_sessions=True)
+        self.assertEqual(model.mode, 'onnx')
+        self.assertIsNone(model.engine._session)
+        self.assertEqual(len(model.predict(np.zeros((640, 640, 3), np.uint8))), 1)
+        session = model.engine.session
+        self.assertIs(model.engine.session, session)
+        # a forked worker never reuses the parent's session
+        with mock.patch('onnx_engine.os.getpid', return_value=os.getpid() + 1):
+            self.assertIsNot(model.engine.session, session)
+            self.assertEqual(len(model.predict(np.zeros((640, 640, 3), np.uint8))), 1)
+
+
+class ReadinessTest(ServerTestCase):
+    """Workers load and warm up before serving; /health never loads the model"""
+
+    def test_health_reports_readiness_without_loading(self):
+        registry = ModelRegistry(on_swap=server._on_model_swap)
+        with mock.patch.object(server, 'model_registry', registry), \
+                mock.patch.object(server, 'model_wrapper', None), mock.patch.object(server, 'model_ready', False):
+            health = self.client.get('/health').get_json()
+            self.assertEqual((health['ready'], health['model_loaded']), (False, False))
+            self.assertIsNone(server.model_wrapper)
+
+            server.prepare_worker()
+            health = self.client.get('/health').get_json()
+            self.assertEqual((health['ready'], health['model_loaded']), (True, True))
+            self.assertIsNotNone(server.model_wrapper.warmup_seconds)
+
+
+class MicroBatchTest(ServerTestCase):
+    """Concurrent /detect requests share one batched inference"""
+
+    def test_concurrent_requests_are_batched(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from batching import MicroBatcher
+        frames = [thermal_frame(spots=((40 + 30 * i, 60, 10),)) for i in range(4)]
+        expected = [self.detect(png(frame)).get_json()['detections'] for frame in frames]
+        # a long wait so all four requests land in the first batch
+        batcher = MicroBatcher(server._batched_predict, max_batch_size=4, max_wait_ms=2000)
+        with mock.patch.object(server, 'micro_batcher', batcher):
+            def send(frame):
+                body = {'image': (io.BytesIO(png(frame)), 'frame.png')}
+                return server.app.test_client().post('/detect', data=body).get_json()
+            with ThreadPoolExecutor(4) as pool:
+                results = list(pool.map(send, frames))
+            health = self.client.get('/health').get_json()
+        self.assertEqual([r['detections'] for r in results], expected)
+        self.assertEqual(health['batching']['batch_size_histogram'], {'4': 1})
+
+    def test_missing_results_and_timeouts_fail_the_caller(self):
+        import threading
+        from batching import MicroBatcher
+        short = MicroBatcher(lambda frames: frames[:1], max_batch_size=2, max_wait_ms=2000)
+        first, second = short.submit(1), short.submit(2)
+        self.assertEqual(first.result(timeout=5), 1)
+        self.assertIsInstance(second.exception(timeout=5), RuntimeError)
+
+        release = threading.Event()
+        stuck = MicroBatcher(lambda frames: release.wait() and frames, max_batch_size=1, max_wait_ms=0, timeout=0.05)
+        try:
+            with self.assertRaises(TimeoutError):
+                stuck.predict(1)
+        finally:
+            release.set()
+
+
+class ThreadedServingTest(ServerTestCase):
+    """Threaded mode runs CPU stages on a bounded pool with backpressure"""
+
+    def test_threaded_matches_sync_and_rejects_when_full(self):
+        body = png(thermal_frame())
+        sync = self.detect(body).get_json()
+        pool = server.StagePool(max_workers=2, max_inflight=1)
+        with mock.patch.object(server, 'cpu_pool', pool):
+            threaded = self.detect(body).get_json()
+            self.assertEqual(threaded, sync)
+            with pool.admit():
+                busy = self.detect(body)
+        self.assertEqual(busy.status_code, 503)
+        self.assertEqual(busy.headers['Retry-After'], str(server.RETRY_AFTER_SECONDS))
+        self.assertEqual(pool.stats()['rejected'], 1)
+
+    def test_yolo_predictions_do_not_interleave(self):
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        from model import ModelWrapper
+        active, overlaps = [], []
+
+        class FakeYolo:
+            def predict(self, source, **kwargs):
+                active.append(1)
+                overlaps.append(len(active))
+                time.sleep(0.02)
+                active.pop()
+                return []
+
+        model = ModelWrapper(models_dir=_TMP, engine='blob')
+        model.mode, model.model = 'yolo', FakeYolo()
+        frame = thermal_frame()
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(lambda _: model.predict(frame), range(4)))
+        self.assertEqual(max(overlaps), 1)
+
+
+class ResponseModeTest(ServerTestCase):
+    """Lean response modes and image formats"""
+
+    def test_modes_skip_images(self):
+        body = png(thermal_frame())
+        images = {}
+        for mode in server.RESPONSE_MODES:
+            result = self.detect(body, f'?response={mode}').get_json()
+            images[mode] = {key for key in ('input_image', 'output_image') if key in result}
+        self.assertEqual(images, {'full': {'input_image', 'output_image'}, 'annotated': {'output_image'},
+                                  'detections': set()})
+        header = self.detect(body, headers={'X-Response-Mode': 'detections'}).get_json()
+        self.assertNotIn('input_image', header)
+
+    def test_image_formats(self):
+        result = self.detect(png(thermal_frame()), '?response=annotated&image_format=jpg&quality=60').get_json()
+        self.assertTrue(result['output_image'].startswith('data:image/jpeg;base64,'))
+        self.assertEqual(self.detect(b'', '?response=everything').status_code, 400)
+        self.assertEqual(self.detect(b'', '?image_format=gif').status_code, 400)
+        self.assertEqual(self.detect(b'', '?image_format=jpeg&quality=0').status_code, 400)
+
+
+class BinaryUploadTest(ServerTestCase):
+    """Raw octet-stream bodies and upload limits"""
+
+    def test_encoded_and_raw_bodies_match_multipart(self):
+        frame = thermal_frame()
+        multipart = self.client.post('/detect?response=detections',
+                                     data={'image': (io.BytesIO(png(frame)), 'frame.png')}).get_json()
+        encoded = self.detect(png(frame), '?response=detections').get_json()
+        raw = self.detect(frame.tobytes(), f'?response=detections&width={frame.shape[1]}&height={frame.shape[0]}').get_json()
+        self.assertTrue(multipart['success'])
+        self.assertGreater(multipart['detection_count'], 0)
+        self.assertEqual(encoded['detections'], multipart['detections'])
+        self.assertEqual(raw['detections'], multipart['detections'])
+
+    def test_raw_size_mismatch_is_rejected(self):
+        response = self.detect(b'\0' * 100, '?width=20&height=20')
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_limit_only_raised_for_jobs(self):
+        body = png(thermal_frame())
+        with mock.patch.object(server, 'MAX_UPLOAD_BYTES', len(body) - 1), \
+                mock.patch.object(server, 'JOB_MAX_UPLOAD_BYTES', len(body) * 2):
+            self.assertEqual(self.detect(body).status_code, 413)
+            multipart = self.client.post('/detect', data={'image': (io.BytesIO(body), 'frame.png')})
+            self.assertEqual(multipart.status_code, 413)
+            job = self.client.post('/jobs', data=body, content_type='application/octet-stream')
+            self.assertEqual(job.status_code, 202)
+            server.job_queue.cancel(job.get_json()['id'])
+            # base64 bodies are decoded in memory, so they keep the smaller limit
+            encoded = self.client.post('/jobs', json={'image': base64.b64encode(body).decode()})
+            self.assertEqual(encoded.status_code, 413)
+            self.assertFalse(encoded.get_json()['success'])
+
+    def test_chunked_video_upload_is_limited(self):
+        body = b'\0' * 4096
+        with mock.patch.object(server, 'MAX_UPLOAD_BYTES', 1024):
+            response = self.client.post('/detect/stream', input_stream=io.BytesIO(body),
+                                        content_type='application/octet-stream',
+                                        environ_overrides={'wsgi.input_terminated': True})
+        self.assertEqual(response.status_code, 413)
+
+
+class RadiometricTest(ServerTestCase):
+    """16-bit radiometric input reports per-detection temperatures"""
+
+    def raw_frame(self):
+        # counts * 0.01 - 273.15: 20 C background, 37 C discs
+        return np.where(thermal_frame() > 128, 31015, 29315).astype(np.uint16)
+
+    def test_raw_and_png_16_bit(self):
+        frame = self.raw_frame()
+        query = f'?response=detections&radiometric=1&dtype=uint16&width={frame.shape[1]}&height={frame.shape[0]}'
+        raw = self.detect(frame.astype('<u2').tobytes(), query).get_json()
+        encoded = self.detect(png(frame), '?response=detections&radiometric=1').get_json()
+        self.assertGreater(raw['detection_count'], 0)
+        self.assertEqual(encoded['detections'], raw['detections'])
+        for detection in raw['detections']:
+            self.assertAlmostEqual(detection['temperature_c']['max'], 37.0, places=3)
+            self.assertEqual(detection['temperature'], 'hot')
+        with mock.patch.object(server.imaging, 'HOT_TEMPERATURE_C', 40.0):
+            cooler = self.detect(png(frame), '?response=detections&radiometric=1').get_json()
+        self.assertEqual({d['temperature'] for d in cooler['detections']}, {'warm'})
+
+    def test_calibration_override_and_8_bit_rejected(self):
+        frame = self.raw_frame()
+        result = self.detect(png(frame), '?response=detections&radiometric=1&gain=0.02&offset=-600').get_json()
+        self.assertAlmostEqual(result['detections'][0]['temperature_c']['max'], 31015 * 0.02 - 600, places=2)
+        self.assertEqual(self.detect(png(thermal_frame()), '?radiometric=1').status_code, 400)
+        # a 16-bit BGRA PNG has no single radiometric plane
+        bgra = cv2.merge([frame] * 4)
+        response = self.detect(png(bgra), '?radiometric=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('channels', response.get_json()['error'])
+
+
+class VideoStreamTest(ServerTestCase):
+    """/detect/stream returns NDJSON per frame with frame skipping and tracks"""
+
+    def video(self, frames=10):
+        path = os.path.join(tempfile.mkdtemp(dir=_TMP), 'clip.avi')
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (320, 256))
+        for i in range(frames):
+            writer.write(cv2.cvtColor(thermal_frame(spots=((80 + i, 90, 14),)), cv2.COLOR_GRAY2BGR))
+        writer.release()
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_every_nth_frame_with_tracks(self):
+        response = self.client.post('/detect/stream?every=5',
+                                    data={'video': (io.BytesIO(self.video()), 'clip.avi')})
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        records = [json.loads(line) for line in response.get_data().splitlines()]
+        self.assertEqual([r['frame'] for r in records], list(range(10)))
+        self.assertEqual([r['frame'] for r in records if r['inferred']], [0, 5])
+        track_ids = {d['track_id'] for r in records for d in r['detections']}
+        self.assertEqual(len(track_ids), 1)
+        self.assertTrue(all(r['detection_count'] == 1 for r in records))
+
+    def test_empty_and_bad_parameters(self):
+        self.assertEqual(self.client.post('/detect/stream', data=b'', content_type='video/avi').status_code, 400)
+        self.assertEqual(self.client.post('/detect/stream?every=x').status_code, 400)
+
+    def test_spooled_upload_removed_when_client_disconnects(self):
+        spooled = []
+        named = tempfile.NamedTemporaryFile
+
+        def spool(*args, **kwargs):
+            f = named(*args, **kwargs)
+            spooled.append(f.name)
+            return f
+        body = {'video': (io.BytesIO(self.video(2)), 'clip.avi')}
+        with mock.patch.object(server.tempfile, 'NamedTemporaryFile', spool), \
+                server.app.test_request_context('/detect/stream', method='POST', data=body):
+            response = server.app.full_dispatch_request()
+            self.assertTrue(os.path.exists(spooled[0]))
+            # closed before a single record was read
+            response.close()
+        self.assertFalse(os.path.exists(spooled[0]))
+
+
+class ResultCacheTest(ServerTestCase):
+    """Repeated uploads are served from the cache, keyed by everything that changes the result"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = tempfile.mkdtemp(dir=_TMP)
+        patcher = mock.patch.object(server, 'result_cache', server.ResultCache(1 << 20, self.cache_dir))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.body = png(thermal_frame())
+
+    def test_repeated_upload_hits(self):
+        first = self.detect(self.body, '?response=detections')
+        second = self.detect(self.body, '?response=detections')
+        self.assertEqual(first.headers['X-Cache'], 'MISS')
+        self.assertEqual(second.headers['X-Cache'], 'HIT')
+        self.assertEqual(first.get_data(), second.get_data())
+        self.assertEqual(self.detect(self.body, '?response=annotated').headers['X-Cache'], 'MISS')
+
+    def test_settings_change_misses_after_restart(self):
+        self.detect(self.body, '?response=detections')
+        # a fresh process only has the disk tier
+        with mock.patch.object(server, 'result_cache', server.ResultCache(1 << 20, self.cache_dir)):
+            self.assertEqual(self.detect(self.body, '?response=detections').headers['X-Cache'], 'HIT')
+            with mock.patch.object(server.imaging, 'HOT_TEMPERATURE_C', 20.0):
+                self.assertEqual(self.detect(self.body, '?response=detections').headers['X-Cache'], 'MISS')
+            with mock.patch.object(server.model_wrapper, '_settings', '{"conf": 0.5}'):
+                self.assertEqual(self.detect(self.body, '?response=detections').headers['X-Cache'], 'MISS')
+
+    def test_model_identity_covers_settings(self):
+        from model import ModelWrapper
+        with mock.patch.dict(os.environ, {'BLOB_PYRAMID_MAX_SIDE': '320'}):
+            other = ModelWrapper(engine='blob')
+        self.assertNotEqual(other.identity(), ModelWrapper(engine='blob').identity())
+
+    def test_disk_errors_and_vanished_files_are_tolerated(self):
+        cache = server.ResultCache(0, self.cache_dir, disk_max_bytes=25)
+        for i in range(3):
+            cache.put(f'{i:02d}' * 16, b'x' * 10)
+        self.assertEqual(cache.stats()['disk_evictions'], 1)
+        # another worker removes an entry while this one scans for eviction
+        from pathlib import Path
+        stat = Path.stat
+
+        def vanish(path, *args, **kwargs):
+            if path.name.startswith('01'):
+                raise FileNotFoundError(path)
+            return stat(path, *args, **kwargs)
+        with mock.patch.object(Path, 'stat', vanish):
+            cache.put('03' * 16, b'x' * 10)
+        with mock.patch.object(cache, '_put_disk', side_effect=PermissionError('read-only')):
+            cache.put('04' * 16, b'x' * 10)
+        self.assertIsNone(cache.get('04' * 16))
+
+
+class BlobDetectorTest(unittest.TestCase):
+    """The vectorized blob fallback"""
+
+    def test_boxes_holes_and_batches(self):
+        from blob_engine import BlobDetector
+        detector = BlobDetector()
+        frame = thermal_frame()
+        detections = detector.detect(frame)
+        self.assertEqual(sorted(detections.boxes.tolist()), [[67, 76, 94, 105], [201, 140, 240, 181]])
+        self.assertEqual(set(detections.labels.tolist()), {'Person'})
+
+        # a blob inside another blob's hole is not reported (findContours RETR_EXTERNAL)
+        ring = np.full((256, 320), 40, np.uint8)
+        cv2.circle(ring, (160, 128), 80, 250, 12)
+        cv2.circle(ring, (160, 128), 20, 250, -1)
+        self.assertEqual(len(detector.detect(ring)), 1)
+
+        frames = [frame, ring, np.full((100, 120), 40, np.uint8)]
+        for batched, single in zip(detector.detect_batch(frames), [detector.detect(f) for f in frames]):
+            np.testing.assert_array_equal(batched.boxes, single.boxes)
+            np.testing.assert_array_equal(batched.scores, single.scores)
+
+
+class TiledDetectTest(ServerTestCase):
+    """Tiled inference at native resolution"""
+
+    def test_tiles_cover_the_frame_without_duplicates(self):
+        # one disc inside the tile overlap, two well inside single tiles
+        frame = thermal_frame(1600, 1200, spots=((560, 300, 30), (200, 900, 30), (1400, 1000, 30)))
+        model = server.model_wrapper
+        with mock.patch.object(model, 'predict_batch', wraps=model.predict_batch) as predict_batch:
+            result = self.detect(png(frame), '?response=detections&tiled=1&tile_size=640&tile_overlap=0.2').get_json()
+        self.assertGreater(len(predict_batch.call_args.args[0]), 1)
+        self.assertEqual(result['detection_count'], 3)
+        centres = sorted((round((d['bbox']['x'] + d['bbox']['width'] / 2) * 16),
+                          round((d['bbox']['y'] + d['bbox']['height'] / 2) * 12)) for d in result['detections'])
+        for (x, y), expected in zip(centres, [(200, 900), (560, 300), (1400, 1000)]):
+            self.assertLess(max(abs(x - expected[0]), abs(y - expected[1])), 4)
+
+    def test_tile_settings_are_validated(self):
+        self.assertEqual(self.detect(png(thermal_frame()), '?tiled=1&tile_size=16').status_code, 400)
+        self.assertEqual(self.detect(png(thermal_frame()), '?tiled=1&tile_overlap=1').status_code, 400)
+
+
+class FakeWrapper:
+    """Stands in for ModelWrapper where loading real weights is beside the point"""
+
+    def __init__(self, models_dir=None, engine=None, model_path=None, lazy_sessions=False):
+        self.model_path = model_path
+        self.mode = 'onnx'
+        self.load_seconds = 0.0
+        self.warmup_seconds = None
+
+    def warm_up(self):
+        self.warmup_seconds = 0.0
+
+    def memory_bytes(self):
+        return 0
+
+    def engine_info(self):
+        return {'engine': 'fake'}
+
+
+class ModelRegistryTest(ServerTestCase):
+    """Named models, hot-swap, and swaps reaching every worker process"""
+
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.mkdtemp(dir=_TMP)
+        self.weights = os.path.join(self.dir, 'v2.onnx')
+        open(self.weights, 'wb').close()
+        state = os.path.join(self.dir, 'state.json')
+        for patcher in (mock.patch('registry.ModelWrapper', FakeWrapper),
+                        mock.patch.object(server, 'MODEL_DIRS', [server.Path(self.dir).resolve()]),
+                        mock.patch.object(server, 'model_registry', ModelRegistry(state_path=state, sync_interval=0))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # another worker process of the same server
+        self.other = ModelRegistry(state_path=state, sync_interval=0)
+
+    def test_swap_reaches_other_workers(self):
+        response = self.client.post('/models/v2', json={'path': 'v2.onnx', 'background': False})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('v2', server.model_registry.names())
+        self.other.sync(background=False)
+        self.assertEqual(str(self.other.get('v2').model_path), str(server.Path(self.weights).resolve()))
+
+        self.assertEqual(self.client.delete('/models/v2').status_code, 200)
+        self.other.sync(background=False)
+        self.assertNotIn('v2', self.other.names())
+
+    def test_requested_model_and_unknown_model(self):
+        self.client.post('/models/v2', json={'path': 'v2.onnx', 'background': False})
+        self.assertEqual(self.client.get('/models').get_json()['models'][0]['name'], 'v2')
+        response = self.detect(png(thermal_frame()), '?model=missing')
+        self.assertEqual(response.status_code, 404)
+
+    def test_paths_outside_model_dirs_are_refused(self):
+        response = self.client.post('/models/v3', json={'path': '../../etc/passwd', 'background': False})
+        self.assertEqual(response.status_code, 400)
+
+
+class MetricsTest(ServerTestCase):
+    """Per-stage timings in /metrics and Server-Timing"""
+
+    def test_metrics_and_server_timing(self):
+        with mock.patch.object(server, 'SERVER_TIMING', True):
+            response = self.detect(png(thermal_frame()))
+        stages = [entry.split(';')[0] for entry in response.headers['Server-Timing'].split(', ')]
+        for stage in ('decode', 'preprocess', 'predict', 'encode', 'total'):
+            self.assertIn(stage, stages)
+        self.assertNotIn('Server-Timing', self.detect(png(thermal_frame())).headers)
+
+        text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertIn('requests_total{endpoint="detect",method="POST",status="200"}', text)
+        self.assertIn('stage_duration_seconds_count{stage="predict"}', text)
+        self.assertIn('model_ready 1', text)
+
+
+class BenchmarkTest(unittest.TestCase):
+    """Deterministic frames, per-stage results and the baseline check"""
+
+    def test_run_and_compare(self):
+        import contextlib
+        import benchmark
+        np.testing.assert_array_equal(benchmark.synthetic_frame(64, 48, 2, seed=3),
+                                      benchmark.synthetic_frame(64, 48, 2, seed=3))
+        registry = ModelRegistry(on_swap=server._on_model_swap)
+        with mock.patch.object(server, 'model_registry', registry), \
+                mock.patch.object(server, 'model_wrapper', server.model_wrapper), \
+                contextlib.redirect_stderr(io.StringIO()):
+            results, skipped = benchmark.run_benchmark(['blob'], ['predict', 'detect'], [(160, 128)], [2],
+                                                       iterations=2, warmup=1, models_dir=server.Path(_TMP))
+        self.assertEqual(skipped, [])
+        self.assertEqual([(r['stage'], r['resolution']) for r in results],
+                         [('predict', '160x128'), ('detect', '160x128')])
+
+        slower = [{**r, 'p50_ms': r['p50_ms'] * 2} for r in results]
+        regressions = benchmark.compare_to_baseline(slower, {'results': results}, threshold=0.2)
+        self.assertEqual([r['key'] for r in regressions], ['blob/predict/160x128/2', 'blob/detect/160x128/2'])
+        self.assertEqual(benchmark.compare_to_baseline(results, {'results': slower}, threshold=0.2), [])
+
+
+class ColourDecodeTest(ServerTestCase):
+    """Colour uploads keep their colour in the returned images"""
+
+    def decoded(self, data_url):
+        return cv2.imdecode(np.frombuffer(server.base64.b64decode(data_url.split(',', 1)[1]), np.uint8),
+                            cv2.IMREAD_UNCHANGED)
+
+    def test_colour_upload_returns_colour_images(self):
+        frame = cv2.applyColorMap(thermal_frame(), cv2.COLORMAP_INFERNO)
+        result = self.detect(png(frame)).get_json()
+        self.assertGreater(result['detection_count'], 0)
+        self.assertTrue(np.array_equal(self.decoded(result['input_image']), frame))
+        self.assertEqual(self.decoded(result['output_image']).ndim, 3)
+
+    def test_grayscale_decode_matches_colour_detections(self):
+        body = png(thermal_frame())
+        colour = self.detect(body, '?response=detections').get_json()
+        with mock.patch.object(server.imaging, 'GRAYSCALE_DECODE', True):
+            gray = self.detect(body, '?response=detections').get_json()
+        self.assertEqual(gray['detections'], colour['detections'])
+
+
+class JobTest(ServerTestCase):
+    """Queued jobs, paginated results and lease ownership"""
+
+    def setUp(self):
+        super().setUp()
+        self.queue = server.JobQueue(tempfile.mkdtemp(dir=_TMP), lease_seconds=60)
+        self.runner = server.JobRunner(self.queue, server.run_job_items, workers=0, chunk_size=2)
+        for patcher in (mock.patch.object(server, 'job_queue', self.queue),
+                        mock.patch.object(server, 'job_runner', self.runner)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, count):
+        body = png(thermal_frame())
+        response = self.client.post('/jobs', data={'images': [(io.BytesIO(body), f'{i}.png') for i in range(count)]})
+        self.assertEqual(response.status_code, 202)
+        return response.get_json()['id']
+
+    def test_results_match_detect_in_input_order(self):
+        job_id = self.submit(3)
+        self.assertEqual(self.client.get(f'/jobs/{job_id}').get_json()['status'], 'queued')
+        job = self.queue.claim('w')
+        self.runner.run(job, 'w')
+        status = self.client.get(f'/jobs/{job_id}?results=1').get_json()
+        self.assertEqual(status['status'], 'done')
+        expected = self.detect(png(thermal_frame()), '?response=detections').get_json()['detections']
+        self.assertEqual([r['detections'] for r in status['results']], [expected] * 3)
+
+        streamed = self.client.get(f'/jobs/{job_id}/results').get_data().splitlines()
+        self.assertEqual([json.loads(line)['index'] for line in streamed], [0, 1, 2])
+
+    def test_runner_not_started_in_web_workers(self):
+        self.assertFalse(server.JOB_RUNNER_IN_WEB)
+        self.client.get('/health')
+        self.detect(png(thermal_frame()))
+        self.assertFalse(server.job_runner._threads)
+
+    def test_status_only_by_default_and_paginated_results(self):
+        job_id = self.submit(5)
+        job = self.queue.claim('w')
+        self.runner.run(job, 'w')
+        status = self.client.get(f'/jobs/{job_id}').get_json()
+        self.assertEqual(status['status'], 'done')
+        self.assertNotIn('results', status)
+
+        page = self.client.get(f'/jobs/{job_id}?results=1&offset=1&limit=3').get_json()
+        self.assertEqual(len(page['results']), 3)
+        self.assertEqual(page['next_offset'], 4)
+        last = self.client.get(f'/jobs/{job_id}?results=1&offset=4&limit=3').get_json()
+        self.assertEqual(len(last['results']), 1)
+        self.assertIsNone(last['next_offset'])
+
+        streamed = self.client.get(f'/jobs/{job_id}/results?offset=3').get_data().splitlines()
+        self.assertEqual(len(streamed), 2)
+
+    def test_lost_lease_stops_writes(self):
+        job_id = self.submit(4)
+        job = self.queue.claim('old')
+
+        def handler(job, indexes, payloads):
+            # the lease expires mid-chunk and another runner takes the job over
+            self.queue._conn().execute("UPDATE jobs SET worker = 'new' WHERE id = ?", (job_id,))
+            return [{}] * len(indexes)
+        self.runner.handler = handler
+        self.runner.run(job, 'old')
+        self.assertFalse(self.queue.results_path(job_id).exists()
+                         and self.queue.results_path(job_id).read_bytes())
+        self.assertEqual(self.queue.get(job_id)['status'], 'running')
+
+    def test_release_requeues_without_counting_the_attempt(self):
+        job_id = self.submit(1)
+        self.queue.claim('w')
+        self.queue.release(job_id, 'w')
+        job = self.queue.get(job_id)
+        self.assertEqual((job['status'], job['attempts']), ('queued', 0))
+
+    def test_cancel_and_unknown_job(self):
+        job_id = self.submit(1)
+        self.assertEqual(self.client.delete(f'/jobs/{job_id}').get_json()['status'], 'cancelled')
+        self.assertIsNone(self.queue.claim('w'))
+        self.assertEqual(self.client.get('/jobs/missing').status_code, 404)
+        bad_limit = self.client.get('/jobs?limit=abc')
+        self.assertEqual(bad_limit.status_code, 400)
+        self.assertIn('error', bad_limit.get_json())
+
+
+class DetectionLayoutTest(ServerTestCase):
+    """Columnar JSON and compressed .npz detections"""
+
+    def test_columnar_and_npz_match_objects(self):
+        body = png(thermal_frame())
+        objects = self.detect(body, '?response=detections').get_json()['detections']
+        columns = self.detect(body, '?response=detections&layout=columnar').get_json()['detections']
+        self.assertEqual(columns['confidence'], [d['confidence'] for d in objects])
+
+        response = self.detect(body, '?layout=npz')
+        self.assertEqual(response.mimetype, server.NPZ_MIMETYPE)
+        arrays = np.load(io.BytesIO(response.get_data()))
+        self.assertEqual(list(arrays['image_index']), [0] * len(objects))
+        np.testing.assert_allclose(arrays['confidence'], columns['confidence'], rtol=1e-6)
+
+    def test_npz_is_compressed(self):
+        import zipfile
+        body = server.detections_npz([{'confidence': [0.5] * 500, 'label': ['person'] * 500}])
+        infos = zipfile.ZipFile(io.BytesIO(body)).infolist()
+        self.assertTrue(all(info.compress_type == zipfile.ZIP_DEFLATED for info in infos))
+
+    def test_npz_requires_detections_response(self):
+        self.assertEqual(self.detect(png(thermal_frame()), '?layout=npz&response=full').status_code, 400)
+
+
+class ColdStartTest(ServerTestCase):
+    """Lazy engine imports, cached discovery and startup timings"""
+
+    def test_importing_model_loads_no_engine(self):
+        script = ('import sys, model; '
+                  'assert not {"onnxruntime", "ultralytics", "torch"} & set(sys.modules), sorted(sys.modules)')
+        subprocess.run([sys.executable, '-c', script], check=True, capture_output=True,
+                       cwd=os.path.dirname(os.path.abspath(__file__)))
+
+    def test_discovery_manifest_until_the_weights_change(self):
+        from pathlib import Path
+        from model import ModelWrapper
+        models_dir, runtime_dir = tempfile.mkdtemp(dir=_TMP), tempfile.mkdtemp(dir=_TMP)
+        manifest = os.path.join(_TMP, 'manifest.json')
+
+        def load():
+            return ModelWrapper(models_dir=models_dir, engine='onnx')
+        with mock.patch.dict(os.environ, {'MODEL_MANIFEST': manifest}), \
+                mock.patch.object(Path, 'cwd', return_value=Path(runtime_dir)):
+            self.assertEqual(load().discovery, 'scan')
+            if has_onnxruntime():
+                yolo_onnx(os.path.join(models_dir, 'a.onnx'), [(320, 320, 64, 64, 0.9)])
+                self.assertEqual(load().discovery, 'scan')
+                # the recorded choice is loaded without probing the engines again
+                with mock.patch.object(ModelWrapper, '_select') as select:
+                    model = load()
+                select.assert_not_called()
+                self.assertEqual((model.discovery, model.mode, model.model_path.name), ('manifest', 'onnx', 'a.onnx'))
+                # state written next to the server, away from the weights, keeps the manifest valid
+                open(os.path.join(runtime_dir, '.model_state.json'), 'w').close()
+                os.utime(runtime_dir, ns=(0, os.stat(runtime_dir).st_mtime_ns + 10 ** 9))
+                self.assertEqual(load().discovery, 'manifest')
+                # new weights are picked up
+                yolo_onnx(os.path.join(models_dir, 'b.onnx'), [(320, 320, 64, 64, 0.9)])
+                os.utime(models_dir, ns=(0, os.stat(models_dir).st_mtime_ns + 10 ** 9))
+                model = load()
+                self.assertEqual((model.discovery, model.model_path.name), ('scan', 'b.onnx'))
+
+    def test_model_info_reports_startup(self):
+        info = self.client.get('/model-info').get_json()
+        self.assertEqual(info['mode'], 'blob')
+        for key in ('ready_seconds', 'discovery', 'load_seconds', 'warmup_seconds'):
+            self.assertIn(key, info['startup'])
+
+
+@unittest.skipUnless(has_onnxruntime(), "needs onnx and onnxruntime")
+class CascadeTest(ServerTestCase):
+    """The full model only runs on hot regions found by the pre-filter"""
+
+    def setUp(self):
+        super().setUp()
+        from model import ModelWrapper
+        self.dir = tempfile.mkdtemp(dir=_TMP)
+        weights = yolo_onnx(os.path.join(self.dir, 'best.onnx'), [(320, 320, 64, 64, 0.9)])
+        self.model = ModelWrapper(models_dir=self.dir, engine='onnx', model_path=weights)
+        self.prefilter = server.HotRegionFilter()
+
+    def test_cold_frames_skip_the_model(self):
+        with mock.patch.object(server, 'model_wrapper', self.model), \
+                mock.patch.object(server, 'cascade_filter', self.prefilter), \
+                mock.patch.object(self.model, 'predict_batch', wraps=self.model.predict_batch) as predict_batch:
+            result = self.detect(png(thermal_frame(spots=())), '?response=detections&cascade=1').get_json()
+            text = self.client.get('/metrics').get_data(as_text=True)
+        self.assertEqual(result['detection_count'], 0)
+        predict_batch.assert_not_called()
+        self.assertIn('cascade_frames_total{outcome="skipped"} 1', text)
+
+    def test_crops_are_mapped_back_to_the_frame(self):
+        frame = thermal_frame(1280, 1024, spots=((1000, 700, 20),))
+        with mock.patch.object(self.model, 'predict_batch', wraps=self.model.predict_batch) as predict_batch:
+            detections, = self.model.predict_cascade_batch([frame], self.prefilter, enhanced=True)
+        crop, = predict_batch.call_args.args[0]
+        self.assertEqual(crop.shape, (640, 640))
+        x1, y1, _, _ = self.prefilter.crops(frame.shape, self.prefilter.regions(frame))[0]
+        np.testing.assert_allclose(detections.boxes, [[x1 + 288, y1 + 288, x1 + 352, y1 + 352]], atol=1e-3)
+        self.assertEqual(self.prefilter.stats()['frames_cropped'], 1)
+
+    def test_sensitivity_is_validated(self):
+        self.assertEqual(self.detect(png(thermal_frame()), '?cascade=1&cascade_sensitivity=0').status_code, 400)
+
+
+class BulkTest(unittest.TestCase):
+    """Offline bulk detection matches /detect without importing the server"""
+
+    def test_bulk_run_matches_detect(self):
+        root = tempfile.mkdtemp(dir=_TMP)
+        frame = thermal_frame()
+        cv2.imwrite(os.path.join(root, 'frame.png'), frame)
+        output = os.path.join(root, 'out.jsonl')
+        script = ('import sys, bulk; code = bulk.main(sys.argv[1:]); '
+                  'assert "server" not in sys.modules and "flask" not in sys.modules; sys.exit(code)')
+        subprocess.run([sys.executable, '-c', script, root, '--output', output, '--workers', '1', '--engine', 'blob'],
+                       check=True, capture_output=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        with open(output) as f:
+            record = json.loads(f.readline())
+        expected = server.app.test_client().post('/detect?response=detections', data=png(frame),
+                                                 content_type='application/octet-stream').get_json()
+        self.assertEqual(record['detections'], expected['detections'])
+
+    def test_resume_without_output_starts_over(self):
+        import bulk
+        output = os.path.join(tempfile.mkdtemp(dir=_TMP), 'out.jsonl')
+        writer = bulk.ResultWriter(output, 'jsonl')
+        writer.write({'name': 'a.png', 'success': True})
+        writer.close()
+        os.remove(output)
+        with mock.patch('sys.stderr', io.StringIO()):
+            writer = bulk.ResultWriter(output, 'jsonl', resume=True)
+        self.assertEqual(writer.done, set())
+        writer.write({'name': 'b.png', 'success': True})
+        writer.close()
+        with open(output, 'rb') as f:
+            self.assertEqual(f.read(), b'{"name": "b.png", "success": true}\n')
+        self.assertEqual(bulk.read_checkpoint(bulk.Path(f'{output}.checkpoint'))[0], {'b.png'})
+
+
+class OverloadTest(ServerTestCase):
+    """Quality tiers, and queue waits only from trusted proxies"""
+
+    def controller(self, **kwargs):
+        controller = server.OverloadController(**kwargs)
+        patcher = mock.patch.object(server, 'overload', controller)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return controller
+
+    def queued(self, seconds):
+        return {'X-Request-Start': f't={server.time.time() - seconds:.3f}'}
+
+    def test_slow_predictions_drop_annotation(self):
+        controller = self.controller(thresholds=(0.5, 1.0, 5.0, 6.0))
+        controller.observe_latency(0.7)
+        response = self.detect(png(thermal_frame()))
+        self.assertEqual(response.headers['X-Quality-Tier'], 'no_annotation')
+        result = response.get_json()
+        self.assertGreater(result['detection_count'], 0)
+        self.assertNotIn('output_image', result)
+
+    def test_reject_tier(self):
+        controller = self.controller(thresholds=(0.1, 0.2, 0.3, 0.4))
+        controller.observe_latency(1.0)
+        response = self.detect(png(thermal_frame()))
+        self.assertEqual(response.status_code, server.OVERLOAD_REJECT_STATUS)
+        self.assertEqual(response.headers['X-Quality-Tier'], 'reject')
+
+    def test_request_start_needs_a_trusted_proxy(self):
+        controller = self.controller()
+        self.detect(png(thermal_frame()), headers=self.queued(1.0))
+        self.assertEqual(controller.queue_wait, 0.0)
+        with mock.patch.object(server, 'OVERLOAD_TRUSTED_PROXIES', {'127.0.0.1'}):
+            self.detect(png(thermal_frame()), headers=self.queued(1.0))
+        self.assertGreater(controller.queue_wait, 0.0)
+
+    def test_implausible_and_single_waits_do_not_raise_the_tier(self):
+        controller = self.controller()
+        with mock.patch.object(server, 'TRUST_REQUEST_START', True):
+            response = self.detect(png(thermal_frame()), headers=self.queued(10 * server.OVERLOAD_MAX_QUEUE_SECONDS))
+            self.assertEqual(controller.queue_wait, 0.0)
+            response = self.detect(png(thermal_frame()), headers=self.queued(server.OVERLOAD_MAX_QUEUE_SECONDS - 1))
+        self.assertEqual(response.headers['X-Quality-Tier'], 'full')
+        for _ in range(20):
+            controller.choose(server.OVERLOAD_MAX_QUEUE_SECONDS)
+        self.assertEqual(server.TIERS[controller.choose()], 'reject')
+
+    def test_reduced_tier_passes_a_smaller_input_size(self):
+        controller = self.controller(thresholds=(0.5, 1.0, 5.0, 6.0))
+        controller.observe_latency(1.2)
+        model = server.model_wrapper
+        with mock.patch.object(model, 'predict', wraps=model.predict) as predict:
+            response = self.detect(png(thermal_frame()))
+        self.assertEqual(response.headers['X-Quality-Tier'], 'reduced_resolution')
+        self.assertEqual(predict.call_args.kwargs['input_size'], server.OVERLOAD_REDUCED_INPUT_SIZE)
+        self.assertNotIn('output_image', response.get_json())
+        with mock.patch.object(model, 'supports_input_size', return_value=False):
+            response = self.detect(png(thermal_frame()))
+        self.assertEqual(response.headers['X-Quality-Tier'], 'no_annotation')
+
+    def test_blob_input_size_maps_boxes_back(self):
+        from blob_engine import BlobDetector
+        frame = cv2.resize(thermal_frame(), (1280, 1024), interpolation=cv2.INTER_NEAREST)
+        full = BlobDetector().detect(frame)
+        small = BlobDetector().detect(frame, max_side=320)
+        self.assertEqual(len(small), len(full))
+        np.testing.assert_allclose(small.boxes, full.boxes, atol=8)
+
+    @unittest.skipUnless(has_onnxruntime(), "needs onnx and onnxruntime")
+    def test_input_size_only_for_dynamic_models(self):
+        from onnx_engine import OnnxEngine
+        models_dir = tempfile.mkdtemp(dir=_TMP)
+        for dynamic in (True, False):
+            engine = OnnxEngine(yolo_onnx(os.path.join(models_dir, f'{dynamic}.onnx'), [(1, 1, 1, 1, 0.0)], dynamic))
+            self.assertEqual(engine.dynamic_size, dynamic)
+            shapes = []
+            run = engine.session.run
+            engine.session.run = lambda names, feed: shapes.append(feed['images'].shape) or run(names, feed)
+            engine.predict_batch([np.zeros((480, 640), np.uint8)], input_size=300)
+            self.assertEqual(shapes, [(1, 3, 320, 320) if dynamic else (1, 3, 640, 640)])
+
+
+class ArtifactCacheTest(unittest.TestCase):
+    """Artifacts are built once per weights content, hashed once per (path, size, mtime)"""
+
+    @unittest.skipUnless(has_onnxruntime(), "needs onnx and onnxruntime")
+    def test_artifacts_are_keyed_by_weights(self):
+        import quantize
+        root = tempfile.mkdtemp(dir=_TMP)
+        weights = yolo_onnx(os.path.join(root, 'model.onnx'), [(320, 320, 64, 64, 0.9)])
+        cache_dir = os.path.join(root, 'artifacts')
+        paths = quantize.build_artifacts(weights, ['optimized'], cache_dir=cache_dir)
+        self.assertEqual(quantize.find_artifact(weights, 'optimized', cache_dir), paths['optimized'])
+        with mock.patch.object(quantize, 'build_optimized') as build_optimized:
+            quantize.build_artifacts(weights, ['optimized'], cache_dir=cache_dir)
+        build_optimized.assert_not_called()
+
+        yolo_onnx(weights, [(100, 100, 20, 20, 0.9)])
+        os.utime(weights, ns=(0, os.stat(weights).st_mtime_ns + 1))
+        self.assertIsNone(quantize.find_artifact(weights, 'optimized', cache_dir))
+
+    def test_digest_is_cached_until_the_weights_change(self):
+        import quantize
+        root = tempfile.mkdtemp(dir=_TMP)
+        weights = os.path.join(root, 'model.onnx')
+        with open(weights, 'wb') as f:
+            f.write(b'weights v1')
+        cache_dir = os.path.join(root, 'artifacts')
+        with mock.patch.object(quantize.hashlib, 'sha256', wraps=quantize.hashlib.sha256) as sha256:
+            first = quantize.weights_hash(weights, cache_dir)
+            quantize.find_artifact(weights, 'int8-dynamic', cache_dir)
+            # a new process starts with an empty in-memory cache
+            with mock.patch.object(quantize, '_digests', {}):
+                self.assertEqual(quantize.weights_hash(weights, cache_dir), first)
+            self.assertEqual(sha256.call_count, 1)
+
+            with open(weights, 'wb') as f:
+                f.write(b'weights v2')
+            os.utime(weights, ns=(0, os.stat(weights).st_mtime_ns + 1))
+            self.assertNotEqual(quantize.weights_hash(weights, cache_dir), first)
+            self.assertEqual(sha256.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+"""
+Background job worker: runs the jobs queued through POST /jobs.
+
+The web workers only queue jobs; run this next to them (the Procfile
+'worker' process) on the same JOBS_DIR:
+
+    python worker.py
+    python worker.py --workers 2
+
+It loads the default model and the MODEL_MANIFEST like a web worker, picks
+up models hot-swapped through POST /models from MODEL_STATE_FILE, and on
+SIGTERM/Ctrl-C hands its running jobs back to the queue after their
+current chunk.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run queued detection jobs")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="jobs run at once (default JOB_WORKERS)")
+    args = parser.parse_args(argv)
+    if args.workers is not None:
+        if args.workers < 1:
+            parser.error("--workers must be >= 1")
+        os.environ['JOB_WORKERS'] = str(args.workers)
+
+    import server
+
+    server.init_model()
+    server.warm_up_model()
+    server.model_registry.sync(background=False)
+
+    stopping = threading.Event()
+    def stop(signum, frame):
+        stopping.set()
+    signal.signal(signal.SIGTERM, stop)
+
+    server.job_runner.start()
+    print(f"Job worker running {server.job_runner.workers} job(s) at a time from {server.JOBS_DIR}", file=sys.stderr)
+    try:
+        while not stopping.wait(1.0):
+            pass
+    except KeyboardInterrupt:
+        pass
+    print("Stopping; running jobs go back to the queue after their current chunk", file=sys.stderr)
+    server.job_runner.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
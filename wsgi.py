@@ -10,7 +10,12 @@ import sys
 sys.path.insert(0, os.path.dirname(__file__))
 
 # Import the Flask app
-from server import app
+from server import app, init_model
+
+# Load the model at import time. Under Gunicorn with preload_app this runs
+# once in the master, before workers are forked (see gunicorn.conf.py).
+if os.environ.get('PRELOAD_MODEL', '1') == '1':
+    init_model(preload=True)
 
 if __name__ == '__main__':
     app.run()